@@ -0,0 +1,198 @@
+"""
+end-to-end benchmarks for the converter over every project in testfiles/
+
+run with `python benchmarks/bench_converter.py` (see -h for options), or with pytest:
+`pytest benchmarks/bench_converter.py` (set BENCH_OUTPUT to keep the results and
+BENCH_BASELINE to fail on regressions against a previous run).
+
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from typing import List
+
+# so this can be run as a script from anywhere
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mmp_to_musicxml.converter import MMP_MusicXML_Converter
+from mmp_to_musicxml.utils.mmp_reader import open_mmp, read_mmp
+
+TESTFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'testfiles')
+
+DEFAULT_KEYS = ['c', 'd', 'gb', 'cs']
+
+# how much slower/bigger a result can be compared to the baseline before it's a regression, i.e. 0.1 = 10%
+DEFAULT_TIME_THRESHOLD = 0.1
+DEFAULT_MEMORY_THRESHOLD = 0.1
+
+def count_notes(filepath: str) -> int:
+	with open_mmp(filepath) as f:
+		return sum(1 for _ in read_mmp(f).iter('note'))
+
+def convert(filepath: str, key: str, check: bool):
+	opts = argparse.Namespace(check=check, key=key, master=None, title=None, instruments=None)
+	converter = MMP_MusicXML_Converter(key_signature=key, params={'opts': opts})
+	os.remove(converter.convert_file(filepath))
+
+def benchmark_file(filepath: str, key: str, check: bool, repeat=3) -> dict:
+	"""Convert a file a few times and record the fastest wall time and the peak memory
+
+	 Memory is measured in a separate run since tracemalloc slows everything down.
+	"""
+	result = {
+		'file': os.path.basename(filepath),
+		'key': key,
+		'check': check,
+		'notes': count_notes(filepath),
+	}
+
+	try:
+		times = []
+		for _ in range(repeat):
+			start = time.perf_counter()
+			convert(filepath, key, check)
+			times.append(time.perf_counter() - start)
+
+		tracemalloc.start()
+		try:
+			convert(filepath, key, check)
+			peak_memory = tracemalloc.get_traced_memory()[1]
+		finally:
+			tracemalloc.stop()
+	except Exception as e:
+		result['error'] = f"{type(e).__name__}: {e}"
+		return result
+
+	result['wall_time'] = min(times)
+	result['notes_per_second'] = result['notes'] / result['wall_time'] if result['wall_time'] > 0 else 0
+	result['peak_memory'] = peak_memory
+	return result
+
+def run_benchmarks(files: List[str], keys: List[str], repeat=3) -> dict:
+	"""Benchmark every file with every key, with note checking both off and on
+
+	 Output files are written to (and removed from) a temporary directory.
+
+	 Returns a dict that can be saved as json
+	"""
+	files = [os.path.abspath(f) for f in files]
+	results = []
+	cwd = os.getcwd()
+
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		os.chdir(tmp_dir)
+		try:
+			for filepath in files:
+				for key in keys:
+					for check in (False, True):
+						results.append(benchmark_file(filepath, key, check, repeat))
+		finally:
+			os.chdir(cwd)
+
+	return {
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'repeat': repeat,
+		'results': results,
+	}
+
+def compare(baseline: dict, current: dict, time_threshold=DEFAULT_TIME_THRESHOLD, memory_threshold=DEFAULT_MEMORY_THRESHOLD) -> List[str]:
+	"""Find results that got slower or used more memory than the baseline allows
+
+	 Results are matched up by file, key and check. Anything that failed in
+	 either run, or isn't in both runs, is skipped.
+
+	 Returns a list of descriptions of each regression
+	"""
+	def result_key(result):
+		return (result['file'], result['key'], result['check'])
+
+	baseline_results = {result_key(r): r for r in baseline['results'] if 'error' not in r}
+	regressions = []
+
+	for result in current['results']:
+		old = baseline_results.get(result_key(result))
+		if old is None or 'error' in result:
+			continue
+
+		name = f"{result['file']} (key={result['key']}, check={result['check']})"
+
+		if result['wall_time'] > old['wall_time'] * (1 + time_threshold):
+			regressions.append(f"{name}: wall time {old['wall_time']:.4f}s -> {result['wall_time']:.4f}s")
+
+		if result['peak_memory'] > old['peak_memory'] * (1 + memory_threshold):
+			regressions.append(f"{name}: peak memory {old['peak_memory']} -> {result['peak_memory']} bytes")
+
+	return regressions
+
+def format_results(report: dict) -> str:
+	lines = [f"{'file':48} {'key':4} {'check':6} {'notes':>7} {'time (s)':>10} {'notes/s':>10} {'peak mem (KiB)':>15}"]
+
+	for r in report['results']:
+		if 'error' in r:
+			lines.append(f"{r['file'][:48]:48} {r['key']:4} {str(r['check']):6} {r['notes']:>7} ERROR: {r['error']}")
+		else:
+			lines.append(
+				f"{r['file'][:48]:48} {r['key']:4} {str(r['check']):6} {r['notes']:>7} "
+				f"{r['wall_time']:>10.4f} {r['notes_per_second']:>10.0f} {r['peak_memory'] // 1024:>15}"
+			)
+
+	return "\n".join(lines)
+
+def default_files() -> List[str]:
+	return sorted(glob.glob(os.path.join(TESTFILES_DIR, '*.mmp')))
+
+def test_benchmarks():
+	report = run_benchmarks(default_files(), DEFAULT_KEYS, repeat=int(os.environ.get('BENCH_REPEAT', 1)))
+	print(format_results(report))
+
+	if os.environ.get('BENCH_OUTPUT'):
+		with open(os.environ['BENCH_OUTPUT'], 'w') as f:
+			json.dump(report, f, indent=2)
+
+	if os.environ.get('BENCH_BASELINE'):
+		with open(os.environ['BENCH_BASELINE']) as f:
+			baseline = json.load(f)
+
+		regressions = compare(
+			baseline,
+			report,
+			float(os.environ.get('BENCH_TIME_THRESHOLD', DEFAULT_TIME_THRESHOLD)),
+			float(os.environ.get('BENCH_MEMORY_THRESHOLD', DEFAULT_MEMORY_THRESHOLD)),
+		)
+		assert regressions == []
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Benchmark the .mmp to MusicXML converter')
+	parser.add_argument('files', nargs='*', help='.mmp files to benchmark (default is everything in testfiles/)')
+	parser.add_argument('-k', '--keys', default='+'.join(DEFAULT_KEYS), help='Key signatures to use, separated by +')
+	parser.add_argument('-r', '--repeat', type=int, default=3, help='Number of timed runs per file (the fastest one is kept)')
+	parser.add_argument('-o', '--output', help='Save the results as json to this file')
+	parser.add_argument('-b', '--baseline', help='Compare against the results saved from a previous run')
+	parser.add_argument('--time-threshold', type=float, default=DEFAULT_TIME_THRESHOLD, help='Allowed wall time increase over the baseline (0.1 = 10%%)')
+	parser.add_argument('--memory-threshold', type=float, default=DEFAULT_MEMORY_THRESHOLD, help='Allowed peak memory increase over the baseline (0.1 = 10%%)')
+	args = parser.parse_args()
+
+	report = run_benchmarks(args.files or default_files(), args.keys.split('+'), args.repeat)
+	print(format_results(report))
+
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(report, f, indent=2)
+
+	if args.baseline:
+		with open(args.baseline) as f:
+			regressions = compare(json.load(f), report, args.time_threshold, args.memory_threshold)
+
+		for regression in regressions:
+			print(f"REGRESSION: {regression}")
+
+		if regressions:
+			sys.exit(1)
@@ -0,0 +1,91 @@
+"""
+benchmark for converting the tracks of a project in parallel (the track_jobs param / --track-jobs)
+
+run with `python benchmarks/bench_track_jobs.py` (see -h for options). a large orchestral project
+is made up so the tracks have enough notes to be worth sending to other processes, then it's converted
+with each number of jobs. the first conversion with worker processes also starts them, so it's timed separately.
+
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# so this can be run as a script from anywhere
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mmp_to_musicxml.converter import MMP_MusicXML_Converter
+from mmp_to_musicxml.utils.note import Note
+from mmp_to_musicxml.utils.project import ParsedProject, ParsedTrack
+
+TRACK_NAMES = [
+	'violin', 'viola', 'cello', 'double bass', 'flute', 'piccolo', 'oboe', 'clarinet',
+	'bassoon', 'french horn', 'trumpet', 'trombone', 'tuba', 'timpani', 'harp', 'piano',
+]
+
+def make_project(num_tracks: int, notes_per_track: int, seed=1) -> ParsedProject:
+	"""Make up a project in 4/4 with runs of eighth and sixteenth notes and some chords"""
+	random.seed(seed)
+	tracks = []
+
+	for i in range(num_tracks):
+		notes = []
+		pos = 0
+		while len(notes) < notes_per_track:
+			length = random.choice([12, 24, 24, 48])
+			for _ in range(random.choice([1, 1, 1, 2, 3])):
+				notes.append(Note(pos, length, random.randint(48, 72), 100, pos // 192 + 1))
+			pos += length
+
+		name = TRACK_NAMES[i % len(TRACK_NAMES)]
+		tracks.append(ParsedTrack(name, False, True, {'pan': '0', 'vol': '100', 'pitch': '0'}, notes))
+
+	return ParsedProject('4', '4', 0, tracks)
+
+def time_conversions(project: ParsedProject, jobs: int, repeat: int) -> dict:
+	"""Convert a project a few times with the same converter
+
+	 Returns a dict with the wall time of the first conversion and the fastest of the others,
+	 and the cpu time used by this process for that one (the rest is done by the workers)
+	"""
+	converter = MMP_MusicXML_Converter(params={'track_jobs': jobs})
+
+	try:
+		start = time.perf_counter()
+		expected = converter.convert_project(project)
+		first = time.perf_counter() - start
+
+		times = []
+		for _ in range(repeat):
+			start = time.perf_counter()
+			cpu_start = time.process_time()
+			assert converter.convert_project(project) == expected
+			times.append((time.perf_counter() - start, time.process_time() - cpu_start))
+	finally:
+		converter.close()
+
+	wall_time, cpu_time = min(times)
+	return {'jobs': jobs, 'first': first, 'wall_time': wall_time, 'main_cpu_time': cpu_time, 'output': expected}
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Benchmark converting tracks in parallel')
+	parser.add_argument('-t', '--tracks', type=int, default=16, help='Number of tracks in the project (default is 16)')
+	parser.add_argument('-n', '--notes', type=int, default=5000, help='Number of notes in each track (default is 5000)')
+	parser.add_argument('-j', '--jobs', default='1+2+4', help='Numbers of jobs to try, separated by + (default is 1+2+4)')
+	parser.add_argument('-r', '--repeat', type=int, default=3, help='Number of timed runs after the first one (the fastest one is kept)')
+	args = parser.parse_args()
+
+	project = make_project(args.tracks, args.notes)
+	print(f"{args.tracks} tracks, {args.notes} notes each, {os.cpu_count()} cpus")
+	print(f"{'jobs':>4} {'first (s)':>10} {'time (s)':>10} {'main cpu (s)':>13} {'speedup':>8}")
+
+	baseline = None
+	for jobs in [int(jobs) for jobs in args.jobs.split('+')]:
+		result = time_conversions(project, jobs, args.repeat)
+
+		if baseline is None:
+			baseline = result
+		assert result['output'] == baseline['output'], f"output with {jobs} jobs is different"
+
+		print(f"{jobs:>4} {result['first']:>10.3f} {result['wall_time']:>10.3f} {result['main_cpu_time']:>13.3f} {baseline['wall_time'] / result['wall_time']:>7.2f}x")
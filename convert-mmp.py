@@ -1,55 +1,153 @@
-from mmp_to_musicxml.converter import MMP_MusicXML_Converter
+from mmp_to_musicxml.converter import MMP_MusicXML_Converter, split_key
+from mmp_to_musicxml.batch import expand_paths, convert_many, format_summary
+from mmp_to_musicxml.watch import watch
+from mmp_to_musicxml.server import run_server
+from mmp_to_musicxml.variants import parse_spec, convert_many_variants
+from mmp_to_musicxml.parts import convert_many_parts
+from mmp_to_musicxml.utils.project import parse_measure_range
 
 import argparse
+import json
+import logging
+import sys
 
 if __name__ == "__main__":
 
 	# allow user to pick a minor key for key signature
-	# thanks to @nicolai-rostov - https://github.com/syncopika/mmp-to-MusicXML/issues/7#issuecomment-2212604213
-	minor_to_major_map = {
-		"abm":  "cb",
-		"ebm":  "gb",
-		"bbm":  "db",
-		"fm":   "ab",
-		"cm":   "eb",
-		"gm":   "bb",
-		"dm":   "f",
-		"am":   "c",
-		"em":   "g",
-		"bm":   "d",
-		"fsm":  "a",
-		"csm":  "e",
-		"gsm":  "b",
-		"dsm":  "fs",
-		"asm":  "cs",
-	}
+	minor_to_major_map = MMP_MusicXML_Converter.MINOR_KEYS
 
 	parser = argparse.ArgumentParser(
 				prog='MMP to MusicXML',
-				description='Helps convert LMMS .mmp files to MusicXML')
+				description='Helps convert LMMS .mmp (or .mmpz) files to MusicXML')
 	
-	parser.add_argument('filename')
+	parser.add_argument('filename', nargs='*', help='.mmp/.mmpz file(s) to convert. Directories and glob patterns (e.g. "projects/*.mmp") can be used to convert many files at once. Use - to read from stdin and write to stdout.')
 	parser.add_argument('-c', '--check', help='Check if any instrument notes fall out of the expected range (if applicable).', default=False, action='store_true') # check notes if any instrument notes fall out of expected range
 	parser.add_argument('-k', '--key', help=f'Specify the key signature for the piece. Options are: c (default), g, d, a, e, b, f, bb, eb, ab, db, gb, cb, fs, cs. You can also pass in a minor key: {", ".join(minor_to_major_map.keys())}.', default=None) # specify key signature for piece (default is key of C Major)
 	parser.add_argument('-m', '--master', metavar='i', help='Set master pitch')
 	parser.add_argument('-t', '--title', metavar='str', help='Set piece title')
 	parser.add_argument('-i', '--instruments', metavar='str', help='Select instrument tracks using the plus sign (+) as list separator: violin+cello')
+	parser.add_argument('--measures', metavar='A-B', help='Only convert measures A to B (e.g. 9-16), for an excerpt of the piece. The measures keep their numbers from the piece unless --renumber is given.')
+	parser.add_argument('--renumber', help='With --measures, number the measures of the excerpt from 1', default=False, action='store_true')
+	parser.add_argument('--log-level', choices=['debug', 'info', 'warning', 'error'], default='warning', help='How much to log (default is warning, which includes a summary of any notes that are out of range or truncated when checking with -c)')
+	parser.add_argument('-v', '--verbose', help='Log everything (same as --log-level debug)', default=False, action='store_true')
+	parser.add_argument('--track-jobs', metavar='n', type=int, help='Number of worker processes to use for converting the tracks of a file in parallel (only used for large files, small ones are converted in this process). With --cache-dir, only the tracks that are not cached are sent to the workers')
+	parser.add_argument('--numpy', help='Use numpy to speed up processing tracks with lots of notes (numpy needs to be installed).', default=False, action='store_true')
+	parser.add_argument('--mxl', help='Write compressed MusicXML (.mxl) instead of .xml', default=False, action='store_true')
+	parser.add_argument('--profile', help='Record the time and memory used by each stage of the conversion (and each track) in a <name>.profile.json file next to the output (with --parts, one for the project, and with stdin input, the report is written to stderr).', default=False, action='store_true')
+	parser.add_argument('--cache-dir', metavar='dir', help='Keep converted files in this directory and reuse them when the same file is converted again with the same options')
+	parser.add_argument('--cache-size', metavar='MB', type=int, default=1024, help='Maximum size of the cache directory in megabytes (default is 1024). The least recently used files are removed first.')
+	parser.add_argument('-j', '--jobs', metavar='n', type=int, help='Number of worker processes to use when converting multiple files (default is the number of cpus, or 2 in watch mode)')
+	parser.add_argument('--variant', metavar='spec', action='append', help='Write another version of the project, i.e. --variant key=d,master=2,output=song-d.xml (fields are key, master, instruments, title and output; anything not given uses the other options). Can be given more than once, and the project is only read in once for all of them. Use -j to write them in parallel.')
+	parser.add_argument('--parts', help='Also write a separate file for every instrument part (e.g. song-violin.xml), for handing out to players. The project is only read in and converted once.', default=False, action='store_true')
+	parser.add_argument('--no-score', help='With --parts, only write the part files and not the full score', default=False, action='store_true')
+	parser.add_argument('-w', '--watch', help='Keep running and convert the given files (or the projects in the given directories) again whenever they change. Stop with Ctrl+C.', default=False, action='store_true')
+	parser.add_argument('--watch-interval', metavar='s', type=float, default=1.0, help='Number of seconds between checks for changes in watch mode (default is 1)')
+	parser.add_argument('--serve', metavar='address', help='Run a local conversion server instead of converting files. The address is a port, host:port, or unix:/path/to/socket. POST a project to /convert (options go in the query string, i.e. /convert?key=d&mxl=1) and GET /health for stats.')
+	parser.add_argument('--timeout', metavar='s', type=float, default=60.0, help='Number of seconds a conversion can take in server mode before giving up on it (default is 60)')
+	parser.add_argument('--max-queue', metavar='n', type=int, default=16, help='Max number of conversions running or waiting in server mode, anything more gets turned away (default is 16)')
 	
 	args = parser.parse_args()
 	
-	if args.key in minor_to_major_map:
-		minor = args.key
-		major = minor_to_major_map[minor]
+	logging.basicConfig(level=logging.DEBUG if args.verbose else getattr(logging, args.log_level.upper()))
+	
+	major, minor = split_key(args.key)
+	
+	measures = None
+	if args.measures:
+		try:
+			measures = parse_measure_range(args.measures)
+		except ValueError as e:
+			parser.error(str(e))
+	
+	params = {
+	  'opts': args,
+	  'minor': minor,
+	  'track_jobs': args.track_jobs,
+	  'numpy': args.numpy,
+	  'profile': args.profile,
+	  'mxl': args.mxl,
+	  'cache_dir': args.cache_dir,
+	  'cache_size': args.cache_size * 1024 * 1024,
+	  'measures': measures,
+	  'renumber': args.renumber,
+	}
+	
+	if args.serve:
+		# conversions run in -j worker processes which stay around between requests
+		if args.serve.startswith('unix:'):
+			address = {'unix_socket': args.serve[len('unix:'):]}
+		elif ':' in args.serve:
+			host, port = args.serve.rsplit(':', 1)
+			address = {'host': host, 'port': int(port)}
+		else:
+			address = {'port': int(args.serve)}
+		
+		print(f"serving on {args.serve} (press Ctrl+C to stop)", flush=True)
+		try:
+			run_server(workers=args.jobs or 2, max_queue=args.max_queue, timeout=args.timeout, **address)
+		except KeyboardInterrupt:
+			pass
+		sys.exit(0)
+	
+	if not args.filename:
+		parser.error("the following arguments are required: filename")
+	
+	if args.filename == ['-']:
+		# read the .mmp from stdin and write the MusicXML to stdout, no files involved
+		converter = MMP_MusicXML_Converter(key_signature=major, params=params)
+		converter.convert(sys.stdin.buffer, sys.stdout.buffer)
+		converter.close()
+		if converter.PROFILER.enabled:
+			# stdout has the MusicXML, so the report goes to stderr
+			json.dump(converter.PROFILER.report(), sys.stderr, indent=2)
+		sys.exit(0)
+	
+	if args.watch:
+		# new projects can show up in the watched directories later, so it's fine if there aren't any yet
+		print(f"watching {' '.join(args.filename)} for changes (press Ctrl+C to stop)", flush=True)
+		try:
+			watch(args.filename, key_signature=major, params=params, jobs=args.jobs or 2, interval=args.watch_interval)
+		except KeyboardInterrupt:
+			pass
+		sys.exit(0)
+	
+	filenames = expand_paths(args.filename)
+	
+	if not filenames:
+		parser.error(f"no .mmp files found in: {' '.join(args.filename)}")
+	
+	if args.variant:
+		# every file gets read in once and written out once per variant
+		try:
+			specs = [parse_spec(spec) for spec in args.variant]
+		except ValueError as e:
+			parser.error(str(e))
+		
+		results = convert_many_variants(filenames, specs, params=params, jobs=args.jobs)
+		print(format_summary(results))
+		
+		if any(result.error is not None for result in results):
+			sys.exit(1)
+		sys.exit(0)
+	
+	if args.parts:
+		# every file gets read in once, then written out as the full score and one file per part
+		results = convert_many_parts(filenames, key_signature=major, params=params, score=not args.no_score)
+		print(format_summary(results))
+		
+		if any(result.error is not None for result in results):
+			sys.exit(1)
+		sys.exit(0)
+	
+	if len(filenames) == 1 and args.jobs is None and filenames[0] == args.filename[0]:
+		# check notes of each instrument (if applicable) to catch any out-of-normal-range notes
+		converter = MMP_MusicXML_Converter(key_signature=major, params=params)
+		converter.convert_file(filenames[0])
+		converter.close()
 	else:
-		major = args.key
-		minor = None
-	
-	# check notes of each instrument (if applicable) to catch any out-of-normal-range notes
-	converter = MMP_MusicXML_Converter(key_signature=major,
-		params =
-		{
-		  'opts': args,
-		  'minor': minor,
-		})
-	
-	converter.convert_file(args.filename)
+		# batch mode - every file gets converted with the same options
+		results = convert_many(filenames, key_signature=major, params=params, jobs=args.jobs)
+		print(format_summary(results))
+		
+		if any(result.error is not None for result in results):
+			sys.exit(1)
@@ -0,0 +1,175 @@
+import glob
+import os
+import re
+import time
+import traceback
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+from mmp_to_musicxml.converter import MMP_MusicXML_Converter
+
+"""
+..module:: for converting a bunch of .mmp files at once over multiple processes
+"""
+
+PROJECT_EXTENSIONS = (".mmp", ".mmpz")
+
+# output is the path of the new MusicXML file (None if the conversion failed), error is the traceback if it did
+BatchResult = namedtuple("BatchResult", ["filepath", "output", "error", "seconds"])
+
+def expand_paths(paths: List[str]) -> List[str]:
+	"""Turn a list of files, directories and glob patterns into a list of project files
+
+	 Directories are searched recursively for .mmp and .mmpz files.
+	 Each file shows up only once, in the order it was first found.
+
+	 Arguments:
+		- paths (list): file paths, directory paths or glob patterns
+
+	 Returns a list of file paths
+	"""
+	found = []
+
+	for path in paths:
+		if os.path.isdir(path):
+			for dirpath, dirnames, filenames in os.walk(path):
+				dirnames.sort()
+				for filename in sorted(filenames):
+					if filename.lower().endswith(PROJECT_EXTENSIONS):
+						found.append(os.path.join(dirpath, filename))
+		elif os.path.isfile(path):
+			found.append(path)
+		else:
+			found.extend(sorted(p for p in glob.glob(path, recursive=True) if os.path.isfile(p)))
+
+	return list(dict.fromkeys(found))
+
+def output_path(filepath: str, params=None, suffix="") -> str:
+	"""Get the path MMP_MusicXML_Converter.convert_file() writes a project to (in the current directory)
+
+	 Arguments:
+		- filepath (str): the project file
+		- params (dict): the params the converter gets ('mxl' picks the extension)
+		- suffix (str): added to the name, for other files made from the same project (i.e. "-violin" for song-violin.xml)
+
+	 Returns the path
+	"""
+	name = os.path.basename(filepath)
+	name = name[:name.rfind(".mmp")] if ".mmp" in name else name
+	return name + suffix + (".mxl" if params and params.get("mxl") else ".xml")
+
+def safe_file_name(name: str) -> str:
+	"""Make something like a track name or title safe to put in a file name, i.e. "French Horn/2" -> "French_Horn_2" """
+	return re.sub(r"[^\w.-]+", "_", name).strip("_.")
+
+def find_output_collisions(outputs: List[str]) -> dict:
+	"""Find the files that would be written to the same output file, i.e. for a/song.mmp and b/song.mmp
+
+	 Arguments:
+		- outputs (list): the output path of every file to be written
+
+	 Returns a dict of index -> list of the indexes of the other files with the same output, for just the ones that collide
+	"""
+	by_output = {}
+	for i, output in enumerate(outputs):
+		by_output.setdefault(os.path.normcase(os.path.abspath(output)), []).append(i)
+
+	collisions = {}
+	for same_output in by_output.values():
+		if len(same_output) > 1:
+			for i in same_output:
+				collisions[i] = [j for j in same_output if j != i]
+
+	return collisions
+
+def collision_result(filepath: str, output: str, others: List[str]) -> BatchResult:
+	"""Make the BatchResult for a file that wasn't written because another one would have the same output
+
+	 Arguments:
+		- filepath (str): the project file
+		- output (str): the path it would have been written to
+		- others (list): what else would have been written there (i.e. the other project files)
+	"""
+	error = f"FileExistsError: {output} would also be written for {', '.join(others)} (convert them separately, or rename one)"
+	return BatchResult(filepath, None, error, 0)
+
+def convert_one(filepath: str, key_signature=None, params=None) -> BatchResult:
+	"""Convert a single file, catching any errors so one bad project doesn't stop the rest
+
+	 Arguments:
+		- filepath (str): the project file to convert
+		- key_signature (str): passed to MMP_MusicXML_Converter
+		- params (dict): passed to MMP_MusicXML_Converter
+
+	 Returns a BatchResult
+	"""
+	start = time.perf_counter()
+
+	converter = None
+
+	try:
+		converter = MMP_MusicXML_Converter(key_signature=key_signature, params=params)
+		output = converter.convert_file(filepath)
+		return BatchResult(filepath, output, None, time.perf_counter() - start)
+	except Exception:
+		return BatchResult(filepath, None, traceback.format_exc(), time.perf_counter() - start)
+	finally:
+		if converter is not None:
+			converter.close()
+
+def convert_many(filepaths: List[str], key_signature=None, params=None, jobs=None) -> List[BatchResult]:
+	"""Convert a list of project files using a pool of worker processes
+
+	 The largest files are handed out first so that a big project doesn't end up
+	 being converted by itself after everything else has finished.
+
+	 Every output file goes in the current directory, so files that would end up with the same
+	 output (i.e. a/song.mmp and b/song.mmp) aren't converted and fail instead.
+
+	 Arguments:
+		- filepaths (list): the project files to convert
+		- key_signature (str): the key signature used for every file
+		- params (dict): passed to MMP_MusicXML_Converter for every file
+		- jobs (int): number of worker processes (defaults to the number of cpus)
+
+	 Returns a list of BatchResults in the same order as filepaths
+	"""
+	outputs = [output_path(f, params) for f in filepaths]
+	collisions = find_output_collisions(outputs)
+	by_size = sorted(
+		(i for i in range(len(filepaths)) if i not in collisions),
+		key=lambda i: os.path.getsize(filepaths[i]) if os.path.exists(filepaths[i]) else 0,
+		reverse=True,
+	)
+
+	failed = {i: collision_result(filepaths[i], outputs[i], [filepaths[j] for j in others]) for i, others in collisions.items()}
+
+	with ProcessPoolExecutor(max_workers=jobs) as executor:
+		futures = {i: executor.submit(convert_one, filepaths[i], key_signature, params) for i in by_size}
+		return [failed[i] if i in failed else futures[i].result() for i in range(len(filepaths))]
+
+def format_result(result: BatchResult) -> str:
+	"""Describe how the conversion of a single file went, in one line"""
+	if result.error is None:
+		return f"ok     {result.seconds:8.3f}s  {result.filepath} -> {result.output}"
+
+	# just the last line of the traceback, i.e. the exception itself
+	return f"FAILED {result.seconds:8.3f}s  {result.filepath}: {result.error.strip().splitlines()[-1]}"
+
+def format_summary(results: List[BatchResult]) -> str:
+	"""Make a per-file summary of a batch conversion
+
+	 Arguments:
+		- results (list): BatchResults from convert_many()
+
+	 Returns a string with one line per file followed by the totals
+	"""
+	lines = [format_result(result) for result in results]
+
+	num_failed = sum(1 for r in results if r.error is not None)
+	total_time = sum(r.seconds for r in results)
+	lines.append(f"{len(results) - num_failed} converted, {num_failed} failed, {total_time:.3f}s total conversion time")
+
+	return "\n".join(lines)
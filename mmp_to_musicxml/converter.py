@@ -1,14 +1,31 @@
+import argparse
+import io
+import json
 import logging
 import os
-import sys
 import xml.etree.ElementTree as ET
+import zipfile
 
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from operator import attrgetter
 from typing import List
-from xml.dom import minidom
 
+try:
+	import numpy as np
+except ImportError:
+	np = None # numpy is optional, it's only used by create_length_table_numpy()
+
+from mmp_to_musicxml.utils.conversion_cache import ConversionCache
+from mmp_to_musicxml.utils.diagnostics import ConversionDiagnostics
 from mmp_to_musicxml.utils.note_checker import NoteChecker
 from mmp_to_musicxml.utils.key_sig_note_finder import KeySignatureNoteFinder
+from mmp_to_musicxml.utils.mmp_reader import open_mmp, open_mmp_stream, read_mmp
+from mmp_to_musicxml.utils.note import Note
+from mmp_to_musicxml.utils.profiler import StageProfiler
+from mmp_to_musicxml.utils.project import ParsedProject, ParsedTrack
+from mmp_to_musicxml.utils.track_cache import TrackCache
+from mmp_to_musicxml.utils.xml_writer import escape, pretty_xml_children, write_pretty_xml
 
 """
 ..module:: mmp_to_musicxml-documentation
@@ -29,6 +46,13 @@ from mmp_to_musicxml.utils.key_sig_note_finder import KeySignatureNoteFinder
 #note that a note element node from a mmp file looks like this (note the attributes):
 #<note pan="-38" key="53" vol="59" pos="384" len="192"/>
 
+# what a length quantizes to. note_type is the key used in NOTE_TYPE (i.e. "half-dotted"),
+# type is the MusicXML note type (i.e. "half"), length is the corrected length and duration is the MusicXML duration text
+QuantizedLength = namedtuple("QuantizedLength", ["note_type", "type", "dotted", "length", "duration"])
+
+# the library doesn't configure logging itself, that's up to whatever is using it (i.e. convert-mmp.py)
+logger = logging.getLogger(__name__)
+
 class MMP_MusicXML_Converter:
 
 	LMMS_MEASURE_LENGTH = 192
@@ -164,6 +188,12 @@ class MMP_MusicXML_Converter:
 		3: "64th",
 	}
 	
+	# quantization tables (lists indexed by length) that have already been built, keyed by the largest length they cover
+	QUANTIZATION_TABLES = {}
+	
+	# the table for the current measure length, see update_quantization_table()
+	QUANTIZATION_TABLE = None
+	
 	# available lengths for rests and their corresponding duration based on 32nd notes
 	# note that this also depends on divisions!
 	# assuming division = 8 here!
@@ -176,6 +206,12 @@ class MMP_MusicXML_Converter:
 		"half": "16",
 	}
 
+	# the rests for gap sizes that have already been worked out by get_rest_plan(), most recently used last
+	REST_PLANS = OrderedDict()
+	
+	# max number of gap sizes to remember
+	REST_PLAN_CACHE_SIZE = 512
+	
 	# properties for clef types 
 	CLEF_TYPE = {
 		"treble": {"sign": "G", "line": "2"},
@@ -201,6 +237,26 @@ class MMP_MusicXML_Converter:
 		"gb": "-6",
 		"cb": "-7",
 	}
+	
+	# the relative major of each minor key that can be picked, since the key signature is the same
+	# thanks to @nicolai-rostov - https://github.com/syncopika/mmp-to-MusicXML/issues/7#issuecomment-2212604213
+	MINOR_KEYS = {
+		"abm":  "cb",
+		"ebm":  "gb",
+		"bbm":  "db",
+		"fm":   "ab",
+		"cm":   "eb",
+		"gm":   "bb",
+		"dm":   "f",
+		"am":   "c",
+		"em":   "g",
+		"bm":   "d",
+		"fsm":  "a",
+		"csm":  "e",
+		"gsm":  "b",
+		"dsm":  "fs",
+		"asm":  "cs",
+	}
 
 	# default values for time signature (4/4) 
 	TIME_SIGNATURE_NUMERATOR = "4"
@@ -212,27 +268,172 @@ class MMP_MusicXML_Converter:
 	# note finder based on key signature if specified
 	NOTE_FINDER = None
 	
+	# how to write each key (step, alter and octave), which depends on the key signature.
+	# without a key signature every note is written as a natural or a sharp, the same as in C major
+	SPELLING_TABLE = KeySignatureNoteFinder.get_spelling_table("c")
+	
+	# the problems found during the last conversion (notes out of range, truncated notes)
+	DIAGNOSTICS = None
+	
 	SPECIFIED_KEY_SIGNATURE = None
 	
+	# the minor key picked on the command line, if any (the key signature is its relative major)
+	MINOR_KEY = None
+	
 	opts = None
+	
+	# bump this whenever the output for the same .mmp file and options changes (or what gets saved in the cache),
+	# so that conversions saved in a cache don't get used anymore
+	OUTPUT_VERSION = 4
+	
+	# cache of previous conversions, if a cache directory was given
+	CACHE = None
+	
+	# parts created for tracks in previous conversions, so only the tracks that changed get converted again
+	TRACK_CACHE = None
+	
+	# the part of the cache size that goes to the track cache (inside the cache directory), the rest is for conversions
+	TRACK_CACHE_SHARE = 0.5
+	
+	# (first, last) measure numbers to convert, for an excerpt of the song (None converts the whole song)
+	MEASURE_RANGE = None
+	
+	# whether the measures of an excerpt are numbered from 1 instead of keeping their numbers in the song
+	RENUMBER_MEASURES = False
+	
+	# number of worker processes used to convert tracks in parallel (1 means no parallelism)
+	TRACK_JOBS = 1
+	
+	# the tracks to convert need at least this many notes between them to be worth sending to the worker processes
+	TRACK_JOBS_MIN_NOTES = 5000
+	
+	# the worker processes, started the first time they're needed and reused for every conversion after that
+	TRACK_POOL = None
+	
+	# records the time and memory used by each stage of convert_file (does nothing unless profiling is turned on)
+	PROFILER = StageProfiler(enabled=False)
+	
+	# whether to write compressed MusicXML (.mxl) instead of .xml
+	MXL_OUTPUT = False
+	
+	# what goes in META-INF/container.xml of an .mxl file, which points to the score in the archive
+	# https://www.w3.org/2021/06/musicxml40/tutorial/compressed-mxl-files/
+	MXL_CONTAINER = (
+		'<?xml version="1.0" encoding="UTF-8"?>\n'
+		'<container>\n'
+		'    <rootfiles>\n'
+		'        <rootfile full-path="{}" media-type="application/vnd.recordare.musicxml+xml"/>\n'
+		'    </rootfiles>\n'
+		'</container>\n'
+	)
+	
+	# whether to use the numpy version of create_length_table (which is faster for tracks with lots of notes)
+	USE_NUMPY = False
 
 	def __init__(self, key_signature=None, params=None):
-		logging.basicConfig(level=logging.DEBUG)
-		
 		if params:
 			if 'opts' in params: self.opts = params['opts']
+			if 'track_jobs' in params and params['track_jobs']: self.TRACK_JOBS = params['track_jobs']
+			if 'numpy' in params: self.USE_NUMPY = bool(params['numpy'])
+			if 'profile' in params and params['profile']: self.PROFILER = StageProfiler(enabled=True)
+			if 'mxl' in params: self.MXL_OUTPUT = bool(params['mxl'])
+			if 'minor' in params: self.MINOR_KEY = params['minor']
+			if 'measures' in params and params['measures']: self.MEASURE_RANGE = tuple(params['measures'])
+			if 'renumber' in params: self.RENUMBER_MEASURES = bool(params['renumber'])
+			if 'cache_dir' in params and params['cache_dir']:
+				cache_size = params['cache_size'] if 'cache_size' in params and params['cache_size'] else ConversionCache.DEFAULT_MAX_SIZE
+				
+				# track parts are kept in their own directory inside the cache directory, and the two
+				# split the cache size between them so the whole directory stays under it
+				track_cache_size = int(cache_size * self.TRACK_CACHE_SHARE)
+				self.CACHE = ConversionCache(params['cache_dir'], max_size=cache_size - track_cache_size)
+				self.TRACK_CACHE = TrackCache(os.path.join(params['cache_dir'], "tracks"), max_size=track_cache_size)
+			elif 'track_cache' in params and params['track_cache']:
+				# only keep them in memory, for when this converter gets used for more than one conversion
+				self.TRACK_CACHE = TrackCache()
+		
+		if self.USE_NUMPY and np is None:
+			logger.warning("numpy is not installed, using the regular length table calculation instead")
+			self.USE_NUMPY = False
 
 		if self.opts and self.opts.check:
-			logging.debug("note checking is on")
+			logger.debug("note checking is on")
 			self.NOTE_CHECKER = NoteChecker()
 			
 		if key_signature:
 			if key_signature in self.FIFTHS:
-				logging.debug(f"adjusting notes per key signature: {key_signature}")
+				logger.debug("adjusting notes per key signature: %s", key_signature)
 				self.NOTE_FINDER = KeySignatureNoteFinder(key_signature=key_signature)
+				self.SPELLING_TABLE = self.NOTE_FINDER.SPELLING_TABLE
 				self.SPECIFIED_KEY_SIGNATURE = key_signature
 			else:
-				logging.debug(f"unidentifiable key signature argument was given: {key_signature}")
+				logger.warning("unidentifiable key signature argument was given: %s", key_signature)
+		
+		self.update_quantization_table()
+	
+	def set_time_signature(self, numerator: str, denominator: str):
+		"""Set the time signature, which also sets the length of a measure in LMMS
+		
+		 Arguments:
+			- numerator (str): i.e. "3" for 3/4
+			- denominator (str): i.e. "4" for 3/4
+		"""
+		self.TIME_SIGNATURE_NUMERATOR = numerator
+		self.TIME_SIGNATURE_DENOMINATOR = denominator
+		
+		# LMMS measure length variable needs to be based on the time signature numerator 
+		# a quarter note is always length 48 
+		self.LMMS_MEASURE_LENGTH = self.NOTE_TYPE["quarter"] * int(self.TIME_SIGNATURE_NUMERATOR)
+		self.update_quantization_table()
+	
+	def update_quantization_table(self):
+		"""Make sure the quantization table covers every length up to the current measure length
+		
+		 Needs to be called whenever LMMS_MEASURE_LENGTH changes (i.e. for a different time signature).
+		 Tables are shared by all converters since they only depend on the measure length.
+		"""
+		size = max(self.LMMS_MEASURE_LENGTH, max(self.NOTE_LENGTHS)) + 1
+		
+		if self.QUANTIZATION_TABLE is not None and len(self.QUANTIZATION_TABLE) == size:
+			return
+		
+		if size not in self.QUANTIZATION_TABLES:
+			table = []
+			closest_length = min(self.NOTE_LENGTHS)
+			for length in range(0, size):
+				if length in self.NOTE_LENGTHS:
+					closest_length = length
+				
+				note_type = self.NOTE_LENGTHS[closest_length]
+				corrected_length = self.NOTE_TYPE[note_type]
+				table.append(QuantizedLength(
+					note_type,
+					note_type.split("-")[0],
+					"dotted" in note_type,
+					corrected_length,
+					str(int(corrected_length / 6)),
+				))
+			
+			self.QUANTIZATION_TABLES[size] = table
+		
+		self.QUANTIZATION_TABLE = self.QUANTIZATION_TABLES[size]
+	
+	def quantize(self, length: int) -> QuantizedLength:
+		"""Look up what note type and corrected length a given length should be written as
+		
+		 Arguments:
+			- length(int): length of a note
+		
+		 Returns a QuantizedLength
+		"""
+		table = self.QUANTIZATION_TABLE
+		
+		if length >= len(table):
+			return table[-1]
+		elif length < 0:
+			return table[0]
+		
+		return table[length]
 
 	def find_closest_note_type(self, length: int) -> str:
 		"""For a given length, find the closest note type (i.e. half, whole, quarter)
@@ -245,16 +446,9 @@ class MMP_MusicXML_Converter:
 			
 		 Returns a string indicating the closest note length
 		"""
-		closest_length = None
-		
-		for note_length in sorted(self.NOTE_LENGTHS, reverse=True):
-			if note_length <= length:
-				return self.NOTE_LENGTHS[note_length]
-					
-		if closest_length == None:
-			return self.NOTE_LENGTHS[3]
+		return self.quantize(length).note_type
 
-	def add_note(self, parent_node: ET.Element, note: ET.Element, is_chord=False, length_table=None) -> ET.Element:
+	def add_note(self, parent_node: ET.Element, note: Note, is_chord=False, length_table=None, master_pitch=0) -> ET.Element:
 		"""Add a new note
 		
 		 Can specify if adding a new note to a chord (which appends a chord element)
@@ -262,90 +456,61 @@ class MMP_MusicXML_Converter:
 		 
 		 Arguments:
 			- parent_node (ElementTree element node): the parent node that the note should be added to 
-			- note (ElementTree element node): a node representing a note given by the mmp file
+			- note (Note): a note from the mmp file
 			- is_chord (bool): specify if this note is part of a chord 
 			- length_table (dict)
+			- master_pitch (int): number of semitones to shift the note by
 			
 		 Returns a reference to the element node representing the note
 		"""
-		pitch = self.NOTES[int(note.attrib["key"]) % 12]
-		position = int(note.attrib["pos"])
+		key = note.key + master_pitch
+		position = note.pos
 		new_note = ET.SubElement(parent_node, "note")
 		
 		# if note belongs to chord 
 		if is_chord:
 			new_chord = ET.SubElement(new_note, "chord")
 		
+		# the spelling table already knows the step, alter and octave of every key for the key signature
+		# (including B#/Cb being written in the octave next to the key they're on)
+		if 0 <= key < len(self.SPELLING_TABLE):
+			step, alter, octave = self.SPELLING_TABLE[key]
+		else:
+			step, alter, octave = KeySignatureNoteFinder.spell_key(self.SPECIFIED_KEY_SIGNATURE or "c", key)
+		
 		new_pitch = ET.SubElement(new_note, "pitch")
 		new_step = ET.SubElement(new_pitch, "step")
+		new_step.text = step
 		
-		if self.NOTE_FINDER:
-			# found_note is a dict containing the following keys:
-			# diatonic: boolean
-			# degree: int  // TODO: perhaps we can use this to know which notes to raise if in a minor key?
-			# note: str
-			# octave: int
-			found_note = self.NOTE_FINDER.get_note_based_on_key(int(note.attrib["key"]))
-			
-			#print(
-			#	f"key sig: {self.NOTE_FINDER.KEY_SIGNATURE}, "
-			#	f"note: {found_note['note']}, "
-			#	f"diatonic: {found_note['diatonic']}, "
-			#	f"key num: {int(note.attrib['key'])}, "
-			#	f"degree:{found_note['degree']}, "
-			#	f"octave:{found_note['octave']}"
-			#)
-			
-			pitch = found_note["note"]
-			
-			# adjust octave if B# <-> C or Cb <-> B
-			# TODO: maybe we can just rely on self.NOTE_FINDER to tell us what octave this note should be?
-			if pitch == 'B#':
-				note.attrib["key"] = str(int(note.attrib["key"]) - 12)
-			elif pitch == 'Cb':
-				note.attrib["key"] = str(int(note.attrib["key"]) + 12)
-		
-		new_step.text = str(pitch[0])
-		
-		if len(pitch) == 3 and pitch[1] == "#":
-			# handle double-sharps
+		if alter:
 			new_alter = ET.SubElement(new_pitch, "alter")
-			new_alter.text = "2"
-		elif len(pitch) > 1 and pitch[1] == "#":
-			# if pitch is a sharp note, e.g. "E#"
-			new_alter = ET.SubElement(new_pitch, "alter")
-			new_alter.text = "1"
-		elif len(pitch) > 1 and pitch[1] == "b":
-			# if pitch should be a flat note, e.g. "Bb"
-			new_alter = ET.SubElement(new_pitch, "alter")
-			new_alter.text = "-1"
-		
-		# calculate octave 
-		octave = int(int(note.attrib["key"]) / 12) # basically floor(piano key number / 12)
+			new_alter.text = alter
 		
 		new_octave = ET.SubElement(new_pitch, "octave")
-		new_octave.text = str(octave)
+		new_octave.text = octave
 		
 		# do some math to get the duration given length of note 
-		note_length = int(note.attrib["len"])
-
 		if length_table != None:
 			# when would it be None?
 			# note that the note length is actually the corrected length
 			# this is because I'm not handling dotted notes right now so that if you use the actual length given by LMMS,
 			# you're going to skip out on some rests and throw everything off 
 			# instead take the note's original length but use NOTE_TYPE to get the corrected length
-			note_length = self.NOTE_TYPE[self.find_closest_note_type(length_table[position])]
+			quantized = self.quantize(length_table[position])
+			duration = quantized.duration
+		else:
+			quantized = self.quantize(note.len)
+			duration = str(int(note.len / 6))
 		
 		new_duration = ET.SubElement(new_note, "duration")
-		new_duration.text = str(int(note_length / 6))
+		new_duration.text = duration
 		
 		# need to identify the note type 
 		new_type = ET.SubElement(new_note, "type")
-		new_type.text = self.find_closest_note_type(note_length).split("-")[0]
+		new_type.text = quantized.type
 
 		# add dot element if a dotted note
-		if "dotted" in self.find_closest_note_type(note_length):
+		if quantized.dotted:
 			dot = ET.SubElement(new_note, "dot")
     
 		return new_note
@@ -419,6 +584,52 @@ class MMP_MusicXML_Converter:
 
 		return rests_to_add 
 
+	def add_score_part(self, part_list: ET.Element, track: ParsedTrack, inst_count: str) -> ET.Element:
+		"""Add a score-part element for a track to the part-list
+		
+		 Arguments:
+			- part_list (ElementTree element node): the part-list element
+			- track (ParsedTrack): the track the part is for
+			- inst_count (str): the number of the part, i.e. "1" for part P1
+		
+		 Returns the new score-part element
+		"""
+		name = track.name
+		
+		new_part = ET.SubElement(part_list, "score-part")
+		new_part.set('id', "P" + inst_count)
+		
+		new_part_name = ET.SubElement(new_part, "part-name")
+		new_part_name.text = name
+		
+		new_part_name_abbr = ET.SubElement(new_part, "part-abbreviation")
+		new_part_name_abbr.text = name[0:2] + "."
+		
+		# add midi instrument element
+		# TODO: have this togglable via an argument when calling the script?
+		instrument_pan = track.instrument['pan']
+		instrument_vol = track.instrument['vol']
+		instrument_pitch = track.instrument['pitch'] # this can be important if you want to take into account the pitch offset in LMMS
+		
+		score_instrument_el = ET.SubElement(new_part, "score-instrument")
+		score_instrument_el.set('id', "P" + inst_count + "-I" + inst_count)
+		inst_name_el = ET.SubElement(score_instrument_el, "instrument-name")
+		inst_name_el.text = name
+		
+		midi_instrument_el = ET.SubElement(new_part, "midi-instrument")
+		midi_instrument_el.set('id', "P" + inst_count + "-I" + inst_count)
+		
+		midi_program_el = ET.SubElement(midi_instrument_el, "midi-program")
+		midi_program_el.text = str(self.MIDI_TABLE.get(name.lower(), 1)) # use piano by default if no match found in table
+		
+		volume_el = ET.SubElement(midi_instrument_el, "volume")
+		volume_el.text = "78.7402"
+		
+		pan_el = ET.SubElement(midi_instrument_el, "pan")
+		pan_el.text = str(instrument_pan)
+		
+		return new_part
+	
 	def create_measure(self, parent_node: ET.Element, measure_num: int) -> ET.Element:
 		"""Create a measure node 
 		
@@ -538,6 +749,37 @@ class MMP_MusicXML_Converter:
 		"""
 		return (curr_length % self.LMMS_MEASURE_LENGTH) == 0
 		
+	def get_rest_plan(self, size: int) -> tuple:
+		"""Get the rests needed to fill a gap of a given size
+		
+		 Gaps in real scores only come in a handful of sizes, so the rest elements are built once and
+		 remembered (for up to REST_PLAN_CACHE_SIZE different sizes). They're only templates that never go in
+		 a score themselves: add_rests_for_length() puts copies of them in the measure.
+		 
+		 Arguments:
+			- size (int): the size of the section that should be filled with rests 
+			
+		 Returns a tuple of rest note elements (like add_rest() makes), smallest rest first
+		"""
+		plan_key = (size, self.LMMS_MEASURE_LENGTH, self.NUM_DIVISIONS)
+		
+		if plan_key in self.REST_PLANS:
+			self.REST_PLANS.move_to_end(plan_key)
+			return self.REST_PLANS[plan_key]
+		
+		rests = ET.Element("measure")
+		rests_to_add = self.get_rests(size)
+		for rest_type in rests_to_add:
+			for _ in range(rests_to_add[rest_type]):
+				self.add_rest(rests, rest_type)
+		
+		plan = tuple(rests)
+		self.REST_PLANS[plan_key] = plan
+		if len(self.REST_PLANS) > self.REST_PLAN_CACHE_SIZE:
+			self.REST_PLANS.popitem(last=False)
+		
+		return plan
+	
 	def add_rests_for_length(self, size: int, curr_measure: ET.Element):
 		""" Adds rests based on a given size
 		
@@ -545,16 +787,15 @@ class MMP_MusicXML_Converter:
 			- size (int): the size of the section that should be filled with rests 
 			- curr_measure (ElementTree element node)
 		"""
-		rests_to_add = self.get_rests(size)
-		for rest_type in rests_to_add:
-			for x in range(0, rests_to_add[rest_type]):
-				self.add_rest(curr_measure, rest_type)
+		# every measure gets copies of its own, so changing one score never changes another.
+		# the element's own __deepcopy__ is used since copy.deepcopy() costs more than building the rest again
+		curr_measure.extend([rest.__deepcopy__({}) for rest in self.get_rest_plan(size)])
 
-	def create_length_table(self, notes: List[ET.Element]) -> dict:
+	def create_length_table(self, notes: List[Note]) -> dict:
 		"""Creates a dictionary mapping note positions in the LMMS .mmp file to what their lengths should be in the MusicXML file  
 		
 		 Arguments:
-			- notes (list): list of ElementTree element nodes representing notes
+			- notes (list): list of Notes sorted by position
 		
 		 Returns a dictionary
 		"""
@@ -584,9 +825,9 @@ class MMP_MusicXML_Converter:
 		
 		next_measure_pos = self.LMMS_MEASURE_LENGTH
 		for i in range(0, len(notes)):
-			note = notes[i][0]
-			position = int(note.attrib["pos"])
-			length = int(note.attrib["len"])
+			note = notes[i]
+			position = note.pos
+			length = note.len
 			
 			if position in length_table:
 				if length < length_table[position]:
@@ -595,14 +836,14 @@ class MMP_MusicXML_Converter:
 				# there might be an instance where we have at least 2 notes in the same position,
 				# but they're the same length AND they should actually be truncated because they
 				# spill over into another note like in the second if statement below (in the else block) so we need to check that here 
-				if i < len(notes)-1 and ((length + position) > int(notes[i+1][0].attrib["pos"])) and position != int(notes[i+1][0].attrib["pos"]):
-					next_note_pos = int(notes[i+1][0].attrib["pos"])
+				if i < len(notes)-1 and ((length + position) > notes[i+1].pos) and position != notes[i+1].pos:
+					next_note_pos = notes[i+1].pos
 					
 					# but the new length must be smaller in order to be updated 
 					if next_note_pos - position < length_table[position]:
 						length_table[position] = next_note_pos - position 
 			else:
-				curr_measure_pos = (notes[i][1]-1) * self.LMMS_MEASURE_LENGTH # notes[i][1]-1 is the measure number 
+				curr_measure_pos = (note.measure-1) * self.LMMS_MEASURE_LENGTH
 				next_measure_pos = curr_measure_pos + self.LMMS_MEASURE_LENGTH
 				
 				# we want to know if this current note carries over into the next measure 
@@ -615,14 +856,14 @@ class MMP_MusicXML_Converter:
 					length = next_measure_pos - position
 				
 				if i < len(notes)-1:
-					prev_note_pos = int(notes[i+1][0].attrib["pos"])
+					prev_note_pos = notes[i+1].pos
 					if ((length + position) > prev_note_pos) and position != prev_note_pos:
 						# similar to above, but checking if current note's length overlaps with the next note's position. 
 						# if the current note ends after the next note starts, truncate the current note's length
 						# the new length will be the difference between the next note's position and the current note's position
 						# it's also important to check that this current note is not in the same position as the next note (which forms a chord)
 						# we need this check because otherwise we might get a 0 for the length value 
-						next_note_pos = int(notes[i+1][0].attrib["pos"])
+						next_note_pos = notes[i+1].pos
 						length = next_note_pos - position 
 						#logging.debug(str(l) + ", l+p: " + str(l+p) )
 
@@ -631,8 +872,319 @@ class MMP_MusicXML_Converter:
 				
 		return length_table 
 
+	def create_length_table_numpy(self, notes: List[Note]) -> dict:
+		"""Same as create_length_table(), but done with array operations instead of going through the notes one by one
+		
+		 Requires numpy.
+		 
+		 Arguments:
+			- notes (list): list of Notes sorted by position
+		
+		 Returns a dictionary
+		"""
+		if len(notes) == 0:
+			return {}
+		
+		num_notes = len(notes)
+		positions = np.fromiter(map(attrgetter("pos"), notes), dtype=np.int64, count=num_notes)
+		lengths = np.fromiter(map(attrgetter("len"), notes), dtype=np.int64, count=num_notes)
+		measures = np.fromiter(map(attrgetter("measure"), notes), dtype=np.int64, count=num_notes)
+		no_limit = np.iinfo(np.int64).max
+		
+		# notes at the same position are next to each other since they're sorted, so find where each group starts and ends
+		is_group_start = np.empty(num_notes, dtype=bool)
+		is_group_start[0] = True
+		is_group_start[1:] = positions[1:] != positions[:-1]
+		group_starts = np.flatnonzero(is_group_start)
+		group_ends = np.append(group_starts[1:], num_notes) # exclusive
+		group_positions = positions[group_starts]
+		
+		# the first note at each position gets truncated at the end of its measure
+		measure_ends = measures[group_starts] * self.LMMS_MEASURE_LENGTH
+		first_lengths = np.minimum(lengths[group_starts], measure_ends - group_positions)
+		
+		# any other notes at the same position can only make the length smaller
+		other_lengths = lengths.copy()
+		other_lengths[group_starts] = no_limit
+		table_lengths = np.minimum(first_lengths, np.minimum.reduceat(other_lengths, group_starts))
+		
+		# if the last note at a position runs past the next position, truncate to the next position
+		next_onset_distances = np.full(len(group_starts), no_limit, dtype=np.int64)
+		next_onset_distances[:-1] = np.diff(group_positions)
+		last_lengths = np.where(group_ends - group_starts == 1, first_lengths, lengths[group_ends - 1])
+		table_lengths = np.where(last_lengths > next_onset_distances, np.minimum(table_lengths, next_onset_distances), table_lengths)
+		
+		return dict(zip(group_positions.tolist(), table_lengths.tolist()))
+
+	def convert_track(self, track: ParsedTrack, master_pitch=0) -> tuple:
+		"""Create the part for a single instrument track
+		
+		 Tracks don't depend on each other, so this can be run for several tracks at the same time.
+		 The track itself doesn't get changed.
+		 
+		 Arguments:
+			- track (ParsedTrack): a track from the project
+			- master_pitch (int): number of semitones to shift every note by
+			
+		 Returns a tuple of the new part element (without an id), the number of the last measure that has notes
+		 and a ConversionDiagnostics with any problems found in the track, or (None, 0, diagnostics) if the track has no notes
+		"""
+		name = track.name
+		diagnostics = ConversionDiagnostics()
+		curr_measure = None
+		
+		# the notes are already sorted by position and know what measure they're in
+		notes = track.notes
+		measure_offset = 0
+		
+		if self.MEASURE_RANGE:
+			notes = self.get_excerpt_notes(track)
+			measure_offset = self.MEASURE_RANGE[0] - 1
+		
+		# if no notes (i.e. empty pattern), skip this instrument
+		if len(notes) == 0:
+			if self.MEASURE_RANGE and track.end_measure:
+				# the instrument has notes somewhere else in the song, so it just rests for the whole excerpt
+				current_part = ET.Element("part")
+				self.create_first_measure(current_part, 1, "bass" if name in self.BASS_INSTRUMENTS else "treble", is_rest=True)
+				self.number_excerpt_measures(current_part)
+				return current_part, 1, diagnostics
+			
+			return None, 0, diagnostics
+		
+		# for each valid instrument el, create a new part section that will hold its measures and their notes
+		# (the part id gets filled in once we know where this part goes in the score)
+		current_part = ET.Element("part")
+			
+		# find out what the smallest note length should be for stacked notes in a chord
+		# this unfortunately means tied notes will be broken
+		if self.USE_NUMPY:
+			position_lengths = self.create_length_table_numpy(notes)
+		else:
+			position_lengths = self.create_length_table(notes)
+		
+		self.PROFILER.lap("length table", name)
+		
+		# first create the first measure for this intrument. it might be a rest measure, 
+		# or rest measures might need to be added first!
+		first_note_pos = notes[0].pos
+		first_note_measure_num = notes[0].measure
+
+		if first_note_measure_num == 1:
+			# if first note starts from the very beginning, create initial measure without any rests padding
+			if name in self.BASS_INSTRUMENTS:
+				curr_measure = self.create_first_measure(current_part, first_note_measure_num, "bass", is_rest=False)
+			else:
+				curr_measure = self.create_first_measure(current_part, first_note_measure_num, "treble", is_rest=False)
+		else:			
+			# add whole rests first 
+			num_whole_rests = first_note_measure_num - 1
+			
+			for i in range(0, num_whole_rests):
+				if i == 0:
+					if name in self.BASS_INSTRUMENTS:
+						self.create_first_measure(current_part, i+1, "bass", is_rest=True)
+					else:
+						self.create_first_measure(current_part, i+1, "treble", is_rest=True)
+				else:
+					self.add_rest_measure(current_part, i+1)
+			
+			curr_measure = self.create_measure(current_part, first_note_measure_num)
+			
+		last_measure_num = first_note_measure_num 
+		
+		# check if the notes are within normal range if needed (all at once, since this doesn't depend on anything else)
+		if self.NOTE_CHECKER:
+			out_of_range = self.NOTE_CHECKER.find_out_of_range(name, [n.key + master_pitch for n in notes], [n.measure for n in notes])
+			for key, measure_num in out_of_range:
+				diagnostics.add_out_of_range(name, f"{self.NOTES[key % 12]}{key // 12}", measure_num + measure_offset)
+		
+		# then go through the notes
+		positions_seen = set()
+		for k in range(0, len(notes)):
+			note = notes[k]
+			note_len = note.len
+			measure_num = note.measure
+			position = note.pos
+			rem_measure_size = (measure_num * self.LMMS_MEASURE_LENGTH) - (position + self.quantize(position_lengths[position]).length)
+			
+			# notes can't be tied across measures yet, so anything past the end of the measure gets cut off
+			if position + note_len > measure_num * self.LMMS_MEASURE_LENGTH:
+				diagnostics.add_truncated(name, measure_num + measure_offset)
+			
+			# each note knows the measure it should go in, so we can use this info
+			if last_measure_num == measure_num:
+				# add the note (but check to see if it belongs to a chord!)
+				if position in positions_seen:	
+					# this note is part of a chord 
+					self.add_note(curr_measure, note, True, position_lengths, master_pitch)
+				else:
+					# add rests if needed based on previous note's position, then add the note 
+					if k > 0:
+						prev_note_pos = notes[k-1].pos
+						rest_length = position - (prev_note_pos + self.quantize(position_lengths[prev_note_pos]).length)
+					else:
+						rest_length = position - ((measure_num-1)*self.LMMS_MEASURE_LENGTH)
+				
+					self.add_rests_for_length(rest_length, curr_measure)
+						
+					positions_seen.add(position)
+					self.add_note(curr_measure, note, False, position_lengths, master_pitch)
+				
+				# pad the rest of the measure with rests if needed (i.e. this is the last note of this measure)
+				if (k < len(notes) - 1 and notes[k+1].measure > measure_num ) or (k == (len(notes) - 1)):
+					self.add_rests_for_length(rem_measure_size, curr_measure)
+			else:
+				# need to create new measure(s), then add the note
+				if k > 0:
+					num_whole_rests = measure_num - last_measure_num - 1
+					for i in range(0, num_whole_rests):
+						self.add_rest_measure(current_part, notes[k-1].measure+i+1)
+					
+					# create the new measure to place the note 
+					curr_measure = self.create_measure(current_part, measure_num)
+					
+					# add the note (but check to see if it belongs to a chord!)
+					if position in positions_seen:	
+						# make new note but add to a chord
+						# no need to check if need to make a new measure because these notes are in a chord 
+						self.add_note(curr_measure, note, True, position_lengths, master_pitch)
+					else:
+						# this is reached when adding the first note of a new measure 
+						rest_length = position - ((measure_num-1)*self.LMMS_MEASURE_LENGTH)
+						self.add_rests_for_length(rest_length, curr_measure)
+						
+						# then add the note 
+						positions_seen.add(position)
+						self.add_note(curr_measure, note, False, position_lengths, master_pitch)
+						#logging.debug(str(restsToAdd))
+						#logging.debug(positionLengths)
+					
+					# pad the rest of the measure with rests if needed if we're the last note in the measure or the whole piece
+					# scenarios that could trigger this condition: one measure with a single note 
+					if (k < len(notes)-1 and notes[k+1].measure > measure_num) or (k == (len(notes)-1)):
+						self.add_rests_for_length(rem_measure_size, curr_measure)
+					
+			last_measure_num = measure_num
+		
+		
+		self.number_excerpt_measures(current_part)
+		
+		self.PROFILER.lap("measures", name)
+		
+		return current_part, last_measure_num, diagnostics
+	
+	def use_track_pool(self, tracks: List[ParsedTrack]) -> bool:
+		"""Check whether converting some tracks in the worker processes is worth it
+		
+		 Starting and talking to the workers has a cost, so small projects are faster to convert in this process.
+		 
+		 Arguments:
+			- tracks (list): the ParsedTracks to convert
+		
+		 Returns True if the worker processes should be used
+		"""
+		if self.TRACK_JOBS <= 1 or len(tracks) < 2:
+			return False
+		
+		return sum(len(track.notes) for track in tracks) >= self.TRACK_JOBS_MIN_NOTES
+	
+	def get_track_pool(self) -> ProcessPoolExecutor:
+		"""Get the worker processes for converting tracks, starting them if they haven't been started yet
+		
+		 Each worker gets its own converter with the settings of this one once, when it starts, so only the tracks
+		 need to be sent to them after that. Call close() when this converter isn't needed anymore.
+		 
+		 Returns a ProcessPoolExecutor
+		"""
+		if self.TRACK_POOL is None:
+			worker_params = {
+				"opts": argparse.Namespace(check=self.NOTE_CHECKER is not None),
+				"numpy": self.USE_NUMPY,
+				"measures": self.MEASURE_RANGE,
+				"renumber": self.RENUMBER_MEASURES,
+			}
+			self.TRACK_POOL = ProcessPoolExecutor(
+				max_workers=self.TRACK_JOBS,
+				initializer=_start_track_worker,
+				initargs=(self.SPECIFIED_KEY_SIGNATURE, worker_params),
+			)
+		
+		return self.TRACK_POOL
+	
+	def close(self):
+		"""Stop the worker processes for converting tracks, if they were started"""
+		if self.TRACK_POOL is not None:
+			self.TRACK_POOL.shutdown()
+			self.TRACK_POOL = None
+	
+	def get_measure_number_offset(self) -> int:
+		"""Get how much the measure numbers written out are ahead of the measures as they're converted
+		
+		 An excerpt gets converted as if it started at measure 1, but keeps its measure numbers
+		 from the song unless RENUMBER_MEASURES is on.
+		 
+		 Returns the number to add to the measure numbers
+		"""
+		if self.MEASURE_RANGE and not self.RENUMBER_MEASURES:
+			return self.MEASURE_RANGE[0] - 1
+		return 0
+	
+	def number_excerpt_measures(self, part: ET.Element):
+		"""Put back the song's measure numbers on the measures of an excerpt (see get_measure_number_offset())"""
+		measure_offset = self.get_measure_number_offset()
+		if measure_offset:
+			for measure in part:
+				measure.set("number", str(int(measure.get("number")) + measure_offset))
+
+	def get_track_names(self) -> set:
+		"""Get the names of the tracks that get converted (the ones chosen with the instruments option, or every known instrument)
+		
+		 Returns a set of track names
+		"""
+		if self.opts and self.opts.instruments:
+			logger.debug("tracks: %s", self.opts.instruments.replace('+', '|'))
+			return set(self.opts.instruments.split('+'))
+		
+		return self.INSTRUMENTS.union(self.BASS_INSTRUMENTS)
+	
+	def get_part_tracks(self, project: ParsedProject) -> List[ParsedTrack]:
+		"""Get the tracks that end up with a part in the score (and a score of their own from render_parts()), without converting them
+		
+		 Arguments:
+			- project (ParsedProject): the project
+		
+		 Returns a list of ParsedTracks, in the same order as their parts
+		"""
+		names = self.get_track_names()
+		tracks = [track for track in project.tracks if (track.name in names) and not track.muted]
+		
+		if self.MEASURE_RANGE:
+			# in an excerpt, an instrument with notes anywhere in the song gets a part (see convert_track())
+			return [track for track in tracks if track.end_measure]
+		
+		return [track for track in tracks if track.notes]
+	
+	def get_excerpt_notes(self, track: ParsedTrack) -> List[Note]:
+		"""Get the notes of a track that are in MEASURE_RANGE, moved so the first measure of the range is measure 1
+		
+		 Only the measures in the range get looked at, so this doesn't take longer for longer songs.
+		 
+		 Arguments:
+			- track (ParsedTrack): a track from the project
+		
+		 Returns a list of new Notes
+		"""
+		first, last = self.MEASURE_RANGE
+		shift = (first - 1) * self.LMMS_MEASURE_LENGTH
+		
+		return [Note(n.pos - shift, n.len, n.key, n.vol, n.measure - first + 1) for n in track.notes_in_measures(first, last)]
+	
 	def convert_file(self, filepath: str) -> str:
-		"""Does the converting from .mmp to MusicXML.
+		"""Does the converting from .mmp (or compressed .mmpz) to MusicXML.
+		
+		The new file is written to the current directory with the same name as the .mmp file
+		(as an .mxl file if compressed output is on).
 		
 		Returns the path of the new MusicXML file.
 		"""
@@ -645,37 +1197,346 @@ class MMP_MusicXML_Converter:
 		last_slash_index = file.rfind("/")
 		extension_index = file.rfind(".mmp")
 		output_file_name = file[(last_slash_index+1):extension_index]
+		
+		logger.debug("converting %s", file)
+		
+		if self.CACHE:
+			# if this file was converted before with the same options, just use that
+			cache_key = self.CACHE.make_key(self.CACHE.hash_file(file), self.get_cache_options())
+			output_path = output_file_name + (".mxl" if self.MXL_OUTPUT else ".xml")
 			
-		tree = ET.parse(file)
-		root = tree.getroot()
+			cached = self.get_cached_conversion(cache_key)
+			if cached is not None:
+				logger.debug("using cached conversion of %s", file)
+				with open(output_path, "wb") as new_file:
+					new_file.write(cached)
+				return os.path.realpath(output_path)
+		
+		# .mmpz files get decompressed while they're being parsed
+		with open_mmp(file) as mmp_file:
+			prerendered = {}
+			score_partwise = self.create_score(mmp_file, prerendered)
+		
+		# write a new xml file 
+		if self.MXL_OUTPUT:
+			with open(output_file_name + ".mxl", "wb") as new_file:
+				self.write_mxl(score_partwise, new_file, output_file_name + ".xml", prerendered)
+		else:
+			with open(output_file_name + ".xml", "w") as new_file:
+				self.write_score(score_partwise, new_file, prerendered)
+		
+		self.PROFILER.lap("write")
+		self.PROFILER.stop()
+		
+		if self.PROFILER.enabled:
+			# the report goes next to the MusicXML file
+			self.PROFILER.write(output_file_name + ".profile.json")
+		
+		if self.CACHE:
+			with open(new_file.name, "rb") as f:
+				self.put_cached_conversion(cache_key, f.read())
+		
+		return os.path.realpath(new_file.name)
+	
+	def convert(self, source, output=None):
+		"""Does the converting from .mmp (or compressed .mmpz) data to MusicXML without using any files.
+		
+		 Arguments:
+			- source (bytes, str or file object): the contents of an .mmp/.mmpz file, or a file object to read them from
+			- output (file object): optional binary or text file object to write the MusicXML to
+			  (has to be binary if compressed output is on)
+			
+		 Returns the MusicXML (or .mxl file) as bytes, or None if it was written to output
+		"""
+		cache_key = None
+		
+		if self.CACHE:
+			# the whole input is needed up front to look it up in the cache
+			if not isinstance(source, (bytes, bytearray, memoryview, str)):
+				source = source.read()
+			content = source.encode("utf-8") if isinstance(source, str) else bytes(source)
+			cache_key = self.CACHE.make_key(self.CACHE.hash_bytes(content), self.get_cache_options())
+			
+			cached = self.get_cached_conversion(cache_key)
+			if cached is not None:
+				logger.debug("using cached conversion")
+				return self._write_bytes(cached, output)
+		
+		if isinstance(source, (bytes, bytearray, memoryview)):
+			source = io.BytesIO(source)
+		elif isinstance(source, str):
+			source = io.StringIO(source)
+		
+		prerendered = {}
+		score_partwise = self.create_score(open_mmp_stream(source), prerendered)
+		
+		if cache_key:
+			result = self.write_output(score_partwise, prerendered=prerendered)
+			self.put_cached_conversion(cache_key, result)
+			return self._write_bytes(result, output)
+		
+		return self.write_output(score_partwise, output, prerendered)
+	
+	def convert_project(self, project: ParsedProject, output=None):
+		"""Does the converting from a project that has already been read in to MusicXML.
+		
+		 The project doesn't get changed, so it can be converted again with other settings
+		 (i.e. by other converters with different key signatures) without reading it in again.
+		 
+		 Arguments:
+			- project (ParsedProject): the project to convert
+			- output (file object): optional binary or text file object to write the MusicXML to
+			  (has to be binary if compressed output is on)
+			
+		 Returns the MusicXML (or .mxl file) as bytes, or None if it was written to output
+		"""
+		self.PROFILER.start()
+		prerendered = {}
+		score_partwise = self.render_parts(project, extract_parts=False, prerendered=prerendered)[0]
+		return self.write_output(score_partwise, output, prerendered)
+	
+	def write_output(self, score_partwise: ET.Element, output=None, prerendered=None):
+		"""Write out a score as MusicXML, or as an .mxl file if compressed output is on
+		
+		 Arguments:
+			- score_partwise (ElementTree element node): the root of the score
+			- output (file object): optional binary or text file object to write to
+			- prerendered (dict): parts that were already written out, from render_parts()
+			
+		 Returns the output as bytes, or None if it was written to output
+		"""
+		write = self.write_mxl if self.MXL_OUTPUT else self.write_score
+		
+		if output is None:
+			data = io.BytesIO()
+			write(score_partwise, data, prerendered=prerendered)
+			result = data.getvalue()
+		else:
+			write(score_partwise, output, prerendered=prerendered)
+			result = None
+		
+		self.PROFILER.lap("write")
+		self.PROFILER.stop()
+		
+		return result
+	
+	def _write_bytes(self, data: bytes, output):
+		# for convert(). returns the data if there's no output to write it to
+		if output is None:
+			return data
+		
+		if isinstance(output, io.TextIOBase):
+			output.write(data.decode("utf-8"))
+		else:
+			output.write(data)
+	
+	def get_cached_conversion(self, cache_key: str):
+		"""Look up a conversion in the cache, along with the problems that were found while converting it
+		
+		 On a hit, DIAGNOSTICS are set to the ones saved with the conversion and logged
+		 the same way as after converting, so checking notes (--check) works the same either way.
+		 
+		 Arguments:
+			- cache_key (str): the key from ConversionCache.make_key()
+		
+		 Returns the MusicXML (or .mxl file) as bytes, or None if it isn't in the cache
+		"""
+		path = self.CACHE.get(cache_key)
+		
+		if path is not None:
+			try:
+				with open(path, "rb") as f:
+					diagnostics_json, data = f.read().split(b"\n", 1)
+			except FileNotFoundError:
+				# removed by someone else in the meantime
+				self.CACHE.hits -= 1
+				self.CACHE.misses += 1
+				path = None
+		
+		logger.debug("conversion cache: %s", self.CACHE.stats())
+		
+		if path is None:
+			return None
+		
+		self.DIAGNOSTICS = ConversionDiagnostics.from_dict(json.loads(diagnostics_json))
+		self.log_diagnostics()
+		return data
+	
+	def put_cached_conversion(self, cache_key: str, data: bytes):
+		"""Save a conversion that was just done (with its DIAGNOSTICS) in the cache
+		
+		 Arguments:
+			- cache_key (str): the key from ConversionCache.make_key()
+			- data (bytes): the MusicXML (or .mxl file)
+		"""
+		self.CACHE.put(cache_key, json.dumps(self.DIAGNOSTICS.to_dict()).encode("utf-8") + b"\n" + data)
+	
+	def log_diagnostics(self):
+		"""Log a summary of DIAGNOSTICS, one line per instrument and kind of problem instead of a message for every note
+		
+		 It's only a warning if the notes were being checked (--check), otherwise the truncated notes are just logged for debugging
+		"""
+		self.DIAGNOSTICS.log(logger, logging.WARNING if self.NOTE_CHECKER else logging.DEBUG)
+	
+	def get_cache_options(self) -> dict:
+		"""Get every option that affects the output, for looking up conversions in the cache
+		
+		 Returns a dict
+		"""
+		return {
+			"version": self.OUTPUT_VERSION,
+			"key_signature": self.SPECIFIED_KEY_SIGNATURE,
+			"minor": self.MINOR_KEY,
+			"master": self.opts.master if self.opts else None,
+			"title": self.opts.title if self.opts else None,
+			"instruments": self.opts.instruments if self.opts else None,
+			"check": self.NOTE_CHECKER is not None, # the diagnostics get cached along with the conversion
+			"mxl": self.MXL_OUTPUT,
+			"measures": list(self.MEASURE_RANGE) if self.MEASURE_RANGE else None,
+			"renumber": self.RENUMBER_MEASURES,
+		}
+	
+	def get_track_settings(self, master_pitch: int) -> dict:
+		"""Get every setting that affects the part created for a track, for looking up tracks in the track cache
+		
+		 Arguments:
+			- master_pitch (int): number of semitones every note is shifted by
+		
+		 Returns a dict
+		"""
+		return {
+			"version": self.OUTPUT_VERSION,
+			"key_signature": self.SPECIFIED_KEY_SIGNATURE,
+			"master": master_pitch,
+			"time_signature": [self.TIME_SIGNATURE_NUMERATOR, self.TIME_SIGNATURE_DENOMINATOR],
+			"check": self.NOTE_CHECKER is not None, # the diagnostics get cached along with the part
+			"measures": list(self.MEASURE_RANGE) if self.MEASURE_RANGE else None,
+			"renumber": self.RENUMBER_MEASURES,
+		}
+	
+	def write_score(self, score_partwise: ET.Element, file, prerendered=None):
+		"""Write out a score created by create_score() as MusicXML
+		
+		 Arguments:
+			- score_partwise (ElementTree element node): the root of the score
+			- file (file object): a text or binary file object to write to (binary files get UTF-8)
+			- prerendered (dict): parts that were already written out, from render_parts()
+		"""
+		if not isinstance(file, io.TextIOBase):
+			text_file = io.TextIOWrapper(file, encoding="utf-8", newline="\n")
+			try:
+				self.write_score(score_partwise, text_file, prerendered)
+			finally:
+				# leave the binary file open for the caller
+				text_file.detach()
+			return
+		
+		# add the appropriate headers first 
+		file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+		file.write('<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 3.1 Partwise//EN" "http://www.musicxml.org/dtds/partwise.dtd">\n')
+		
+		# write tree to file 
+		# make sure to pretty-print because otherwise everything will be on one line
+		file.write("\n") # blank line between the headers and the score
+		write_pretty_xml(score_partwise, file, indent="    ", prerendered=prerendered)
+	
+	def write_mxl(self, score_partwise: ET.Element, file, score_name="score.xml", prerendered=None):
+		"""Write out a score created by create_score() as compressed MusicXML (.mxl)
+		
+		 The score is compressed as it's being written, so the whole uncompressed
+		 document never needs to be in memory. The file doesn't need to be seekable.
+		 
+		 Arguments:
+			- score_partwise (ElementTree element node): the root of the score
+			- file (file object): a binary file object to write to
+			- score_name (str): the name of the score inside the .mxl archive
+			- prerendered (dict): parts that were already written out, from render_parts()
+		"""
+		with zipfile.ZipFile(file, "w", compression=zipfile.ZIP_DEFLATED) as mxl:
+			# the mimetype file should come first and not be compressed
+			mxl.writestr(zipfile.ZipInfo("mimetype"), "application/vnd.recordare.musicxml", compress_type=zipfile.ZIP_STORED)
+			mxl.writestr("META-INF/container.xml", self.MXL_CONTAINER.format(escape(score_name)))
+			
+			with mxl.open(score_name, "w") as score_file:
+				self.write_score(score_partwise, score_file, prerendered)
+	
+	def create_score(self, mmp_file, prerendered=None) -> ET.Element:
+		"""Build the MusicXML score for an .mmp project
+		
+		 Arguments:
+			- mmp_file (file object): the project's (uncompressed) xml
+			- prerendered (dict): for parts written out by the worker processes, see render_parts()
+			
+		 Returns the score-partwise element
+		"""
+		self.PROFILER.start()
+		return self.render_parts(self.parse_project(mmp_file), extract_parts=False, prerendered=prerendered)[0]
+	
+	def parse_project(self, mmp_file) -> ParsedProject:
+		"""Read in an .mmp project so it can be converted (see render())
+		
+		 Arguments:
+			- mmp_file (file object): the project's (uncompressed) xml
+			
+		 Returns a ParsedProject
+		"""
+		# only the head, tracks, patterns and notes are kept from the project,
+		# and only the notes of the tracks and measures that are going to be converted
+		tree = read_mmp(mmp_file, tracks=self.get_track_names(), measures=self.MEASURE_RANGE)
+		
+		self.PROFILER.lap("parse")
+		
+		# get every track's notes, sorted by position
+		project = ParsedProject.from_tree(tree)
+		
+		self.PROFILER.lap("notes")
+		
+		return project
+	
+	def render(self, project: ParsedProject) -> ET.Element:
+		"""Build the MusicXML score for a project that has already been read in
+		
+		 The project doesn't get changed, so the same project can be rendered any number of times.
+		 
+		 Arguments:
+			- project (ParsedProject): the project from parse_project() or ParsedProject.load()
+			
+		 Returns the score-partwise element
+		"""
+		return self.render_parts(project, extract_parts=False)[0]
+	
+	def render_parts(self, project: ParsedProject, extract_parts=True, prerendered=None) -> tuple:
+		"""Build the full score for a project, along with a score of its own for every part in it
+		
+		 Every track only gets converted once. The single-part scores have their own part-list
+		 (with the part as P1) and the same number of measures as the full score.
+		 
+		 Arguments:
+			- project (ParsedProject): the project from parse_project() or ParsedProject.load()
+			- extract_parts (bool): whether to build the single-part scores
+			- prerendered (dict): if given, tracks converted by the worker processes (see TRACK_JOBS) are also written out
+			  by them, since that's most of the work. their parts in the score only hold the rest padding, and the
+			  measures they wrote go in this dict for write_output(). only for a score that's about to be written out, and
+			  not used with extract_parts or a track cache, which need the parts as elements
+			
+		 Returns a tuple of the full score-partwise element and a list of (track name, score-partwise element) tuples
+		"""
+		self.DIAGNOSTICS = ConversionDiagnostics()
 
 		# get the time signature of the piece 
-		self.TIME_SIGNATURE_NUMERATOR = str(root.find('head').attrib['timesig_numerator'])
-		self.TIME_SIGNATURE_DENOMINATOR = str(root.find('head').attrib['timesig_denominator'])
+		self.set_time_signature(project.timesig_numerator, project.timesig_denominator)
 
 		# get the master pitch. if it's not 0, we can alter the notes accordingly. 
-		MASTER_PITCH = int(root.find('head').attrib['masterpitch'])
+		MASTER_PITCH = project.master_pitch
 
 		if self.opts and self.opts.master:
 			MASTER_PITCH = int(self.opts.master)
-			logging.debug(f"MASTER_PITCH: {str(MASTER_PITCH)}")
+			logger.debug("MASTER_PITCH: %s", MASTER_PITCH)
 
-		# LMMS measure length variable needs to be based on the time signature numerator 
-		# a quarter note is always length 48 
-		self.LMMS_MEASURE_LENGTH = self.NOTE_TYPE["quarter"] * int(self.TIME_SIGNATURE_NUMERATOR)
-	
-		logging.debug(file)
-		logging.debug(f"LMMS_MEASURE_LENGTH: {str(self.LMMS_MEASURE_LENGTH)}")
-		logging.debug(f"TIME SIGNATURE: {str(self.TIME_SIGNATURE_NUMERATOR)}/{str(self.TIME_SIGNATURE_DENOMINATOR)}")
+		logger.debug("LMMS_MEASURE_LENGTH: %s", self.LMMS_MEASURE_LENGTH)
+		logger.debug("TIME SIGNATURE: %s/%s", self.TIME_SIGNATURE_NUMERATOR, self.TIME_SIGNATURE_DENOMINATOR)
 		#logging.debug("Duration of a measure (with 32nd notes): " + str(int(TIME_SIGNATURE_NUMERATOR) * int(NUM_DIVISIONS)))
 
-		# write a new xml file 
-		new_file = open(output_file_name + ".xml", "w")
-
-		# add the appropriate headers first 
-		new_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-		new_file.write('<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 3.1 Partwise//EN" "http://www.musicxml.org/dtds/partwise.dtd">\n')
-
 		# create the general tree structure, then fill in accordingly
 		score_partwise = ET.Element('score-partwise')
 
@@ -684,64 +1545,25 @@ class MMP_MusicXML_Converter:
 
 		if self.opts and self.opts.title:
 			movement_title.text = self.opts.title
-			logging.debug (f"title: {movement_title.text}")
+			logger.debug("title: %s", movement_title.text)
 		else:
 			movement_title.text = "title of piece goes here"
 
 		# instrument track names
-		if self.opts and self.opts.instruments:
-			names = self.opts.instruments.split('+')
-			logging.debug (f"tracks: {'|'.join(names)}")
-		else:
-			names = self.INSTRUMENTS.union(self.BASS_INSTRUMENTS)
+		names = self.get_track_names()
 
 		# list of the instrument parts 
 		part_list = ET.SubElement(score_partwise, 'part-list')
 
 		# then go through each instrument in the mmp file and add them to part-list 
 		instrument_counter = 1
-		for el in tree.iter(tag = 'track'):
-			name = el.attrib['name']
-			isMuted = el.attrib['muted'] == "1"
-			inst_count = str(instrument_counter)
-			
-			if (name in names) and not isMuted:
+		for track in project.tracks:
+			if (track.name in names) and not track.muted:
 				# need to also check if there are notes for this instrument. if it's an empty track, skip it
-				if el.find("pattern") is None:
+				if not track.has_patterns:
 					continue
 				
-				new_part = ET.SubElement(part_list, "score-part")
-				new_part.set('id', "P" + inst_count)
-				
-				new_part_name = ET.SubElement(new_part, "part-name")
-				new_part_name.text = name
-				
-				new_part_name_abbr = ET.SubElement(new_part, "part-abbreviation")
-				new_part_name_abbr.text = name[0:2] + "."
-				
-				# add midi instrument element
-				# TODO: have this togglable via an argument when calling the script?
-				instrumenttrack_element = el.find("instrumenttrack")
-				instrument_pan = instrumenttrack_element.attrib['pan']
-				instrument_vol = instrumenttrack_element.attrib['vol']
-				instrument_pitch = instrumenttrack_element.attrib['pitch'] # this can be important if you want to take into account the pitch offset in LMMS
-				
-				score_instrument_el = ET.SubElement(new_part, "score-instrument")
-				score_instrument_el.set('id', "P" + inst_count + "-I" + inst_count)
-				inst_name_el = ET.SubElement(score_instrument_el, "instrument-name")
-				inst_name_el.text = name
-				
-				midi_instrument_el = ET.SubElement(new_part, "midi-instrument")
-				midi_instrument_el.set('id', "P" + inst_count + "-I" + inst_count)
-				
-				midi_program_el = ET.SubElement(midi_instrument_el, "midi-program")
-				midi_program_el.text = str(self.MIDI_TABLE.get(name.lower(), 1)) # use piano by default if no match found in table
-				
-				volume_el = ET.SubElement(midi_instrument_el, "volume")
-				volume_el.text = "78.7402"
-				
-				pan_el = ET.SubElement(midi_instrument_el, "pan")
-				pan_el.text = str(instrument_pan)
+				self.add_score_part(part_list, track, str(instrument_counter))
 				
 				# move to next instrument
 				instrument_counter += 1
@@ -757,200 +1579,158 @@ class MMP_MusicXML_Converter:
 		# at the very end we need to make sure every part has the same number of measures 
 		part_measures = {}
 
-		# for each track element
-		for el in tree.iter(tag = 'track'):
-			name = el.attrib['name']
-			is_muted = el.attrib['muted'] == "1"
+		# each track's part can be created independently, so they can optionally be done in parallel.
+		# the parts still get added to the score in the same order as the tracks.
+		tracks = [track for track in project.tracks if (track.name in names) and not track.muted]
+		
+		self.PROFILER.lap("part list")
+		
+		# tracks that haven't changed since they were last converted can come from the track cache
+		converted_tracks = [None] * len(tracks)
+		track_keys = [None] * len(tracks)
+		
+		if self.TRACK_CACHE:
+			track_settings = self.get_track_settings(MASTER_PITCH)
+			for i, el in enumerate(tracks):
+				track_keys[i] = self.TRACK_CACHE.make_key(el, track_settings)
+				converted_tracks[i] = self.TRACK_CACHE.get(track_keys[i])
 			
-			if (name in names) and not is_muted:
-				# get the pattern chunks (which hold the notes)
-				pattern_chunks = []
-				for el2 in el.iter(tag = 'pattern'):
-					pattern_chunks.append(el2)
-				
-				curr_measure = None
-				pattern_notes = [] # list of tuple containing a note and its measure num, i.e. (note, measure)
-				
-				# concatenate all the patterns and get their notes all in one list 
-				for i in range(0, len(pattern_chunks)):
-					# get the position of the pattern. note that a pattern might not start at position 0!
-					# if it doesn't start at 0 and it's the first pattern, or the current chunk doesn't start
-					# where the previous chunk left off, then you need to make rest measures to fill in any gaps. 
-					# another LMMS xml file property -> every measure is of length (time signature numerator * 48), so each measure's position 
-					# is a multiple of that product 
-					chunk = pattern_chunks[i].iter(tag = 'note')
-					chunk_pos = int(pattern_chunks[i].attrib["pos"])
-					measure_num = int(chunk_pos/self.LMMS_MEASURE_LENGTH) + 1 # patterns always start on a multiple of 192 
-					
-					for n in chunk:
-						# because each note's position is relative to their pattern, each note's position should be their pattern pos + note pos 
-						# but an important piece of information is what measure this note falls in.
-						# we'll record the measure in a tuple along with a reference to the note, i.e. (noteReference, measureNumber)
-						note_pos = int(n.attrib["pos"])			
-						new_pos = chunk_pos + note_pos 
-						n.set("pos", str(new_pos))
-						
-						# increment measure num if needed
-						if new_pos >= (measure_num*self.LMMS_MEASURE_LENGTH):
-							# if note is within the next measure over 
-							if new_pos < ((measure_num+1)*self.LMMS_MEASURE_LENGTH):
-								measure_num += 1
-							else:
-								# the newPos might actually be a few measures over, not just the next measure! 
-								# need to add 1 because positions start at 0
-								measure_num = (new_pos // self.LMMS_MEASURE_LENGTH) + 1
-						
-						pattern_notes.append((n, measure_num))
-				
-				# sort the notes in the list by position
-				# remember that the elements are tuples => (note, the measure the note is in)
-				pattern_notes = sorted(pattern_notes, key=lambda p: int(p[0].attrib["pos"]))
-
-				# this is very helpful for checking notes 
-				#if name == 'tuba':
-				#	logging.debug("----- " + str(name) + " ------------------")
-				#	for p in pattern_notes:
-				#		logging.debug("pos: " + str(p[0].attrib["pos"]) + ", len: " + str(p[0].attrib["len"]) + ", measure: " + str(p[1]))
-				#	logging.debug("-----------------------")
-						
-				notes = pattern_notes
-				
-				# if no notes (i.e. empty pattern), skip this instrument
-				if len(notes) == 0:
-					continue
-				
-				# for each valid instrument el, create a new part section that will hold its measures and their notes
-				current_part = ET.SubElement(score_partwise, "part");
-				current_part.set("id", "P" + str(instrument_counter))
-					
-				# find out what the smallest note length should be for stacked notes in a chord
-				# this unfortunately means tied notes will be broken
-				position_lengths = self.create_length_table(notes)
-				
-				# first create the first measure for this intrument. it might be a rest measure, 
-				# or rest measures might need to be added first!
-				first_note_pos = int(notes[0][0].attrib["pos"])
-				first_note_measure_num = notes[0][1]
+			logger.debug("track cache: %s", self.TRACK_CACHE.stats())
+			self.PROFILER.lap("track cache")
+		
+		changed = [i for i in range(len(tracks)) if converted_tracks[i] is None]
+		
+		if self.use_track_pool([tracks[i] for i in changed]):
+			# the workers send back their parts already written out, which is a lot less to send than the elements.
+			# parts that are needed as elements (for the track cache or the single-part scores, or when the score isn't
+			# about to be written out) come back as plain xml and get read back in here, which is still a lot faster
+			# than converting them. the worker processes don't profile anything, so all the tracks show up as one stage
+			pretty = prerendered is not None and not extract_parts and not self.TRACK_CACHE
+			time_signature = (self.TIME_SIGNATURE_NUMERATOR, self.TIME_SIGNATURE_DENOMINATOR)
+			futures = [self.get_track_pool().submit(_convert_track_in_worker, tracks[i], time_signature, MASTER_PITCH, pretty) for i in changed]
+			
+			for i, future in zip(changed, futures):
+				part_text, last_measure_num, track_diagnostics = future.result()
+				part = None
+				if part_text is not None and pretty:
+					part = ET.Element("part")
+					prerendered[part] = part_text
+				elif part_text is not None:
+					part = ET.fromstring(part_text)
+				converted_tracks[i] = (part, last_measure_num, track_diagnostics)
+				if track_keys[i]:
+					self.TRACK_CACHE.put(track_keys[i], *converted_tracks[i])
+			
+			self.PROFILER.lap("tracks")
+		else:
+			for i in changed:
+				converted_tracks[i] = self.convert_track(tracks[i], MASTER_PITCH)
+				if track_keys[i]:
+					self.TRACK_CACHE.put(track_keys[i], *converted_tracks[i])
+		
+		rendered_tracks = [] # (track, part) for every track with notes
+		
+		for track, (current_part, last_measure_num, track_diagnostics) in zip(tracks, converted_tracks):
+			self.DIAGNOSTICS.merge(track_diagnostics)
+			
+			if current_part is None:
+				continue
+			
+			current_part.set("id", "P" + str(instrument_counter))
+			score_partwise.append(current_part)
+			rendered_tracks.append((track, current_part))
+			part_measures[current_part] = last_measure_num # keep track of how many measures this instrument has 
+			
+			instrument_counter += 1
 
-				if first_note_measure_num == 1:
-					# if first note starts from the very beginning, create initial measure without any rests padding
-					if name in self.BASS_INSTRUMENTS:
-						curr_measure = self.create_first_measure(current_part, first_note_measure_num, "bass", is_rest=False)
-					else:
-						curr_measure = self.create_first_measure(current_part, first_note_measure_num, "treble", is_rest=False)
-				else:			
-					# add whole rests first 
-					num_whole_rests = first_note_measure_num - 1
-					
-					for i in range(0, num_whole_rests):
-						if i == 0:
-							if name in self.BASS_INSTRUMENTS:
-								self.create_first_measure(current_part, i+1, "bass", is_rest=True)
-							else:
-								self.create_first_measure(current_part, i+1, "treble", is_rest=True)
-						else:
-							self.add_rest_measure(current_part, i+1)
-					
-					curr_measure = self.create_measure(current_part, first_note_measure_num)
-					
-				last_measure_num = first_note_measure_num 
-				
-				# then go through the notes
-				part_measures[current_part] = 0 # keep track of how many measures this instrument has 
-				positions_seen = set()
-				for k in range(0, len(notes)):
-					note = notes[k][0]
-					note_len = int(notes[k][0].attrib["len"])
-					measure_num = notes[k][1]
-					position = int(note.attrib["pos"])
-					rem_measure_size = (measure_num * self.LMMS_MEASURE_LENGTH) - (position + self.NOTE_TYPE[self.find_closest_note_type(position_lengths[position])])
-					
-					# adjust the note based on master pitch 
-					note.attrib["key"] = str(int(note.attrib["key"]) + MASTER_PITCH)
-					
-					# check if note is within normal range if needed
-					if self.NOTE_CHECKER:
-						note_name = self.NOTES[int(note.attrib["key"]) % 12]
-						note_octave = int(int(note.attrib["key"]) / 12)
-						self.NOTE_CHECKER.evaluate_note(name, note_name, note_octave, f"measure {measure_num}")
-					
-					# since the notes list contains tuples where tuple[0] is the note object, 
-					# and tuple[1] is the measure the note should go in, we can use this info 
-					if last_measure_num == measure_num:
-						# add the note (but check to see if it belongs to a chord!)
-						if position in positions_seen:	
-							# this note is part of a chord 
-							self.add_note(curr_measure, note, True, position_lengths)
-						else:
-							# add rests if needed based on previous note's position, then add the note 
-							if k > 0:
-								prev_note_pos = int(notes[k-1][0].attrib["pos"])
-								rest_length = position - (prev_note_pos + self.NOTE_TYPE[self.find_closest_note_type(position_lengths[prev_note_pos])])
-							else:
-								rest_length = position - ((measure_num-1)*self.LMMS_MEASURE_LENGTH)
-						
-							self.add_rests_for_length(rest_length, curr_measure)
-								
-							positions_seen.add(position)
-							self.add_note(curr_measure, note, False, position_lengths)
-						
-						# pad the rest of the measure with rests if needed (i.e. this is the last note of this measure)
-						if (k < len(notes) - 1 and notes[k+1][1] > measure_num ) or (k == (len(notes) - 1)):
-							self.add_rests_for_length(rem_measure_size, curr_measure)
-					else:
-						# need to create new measure(s), then add the note
-						if k > 0:
-							num_whole_rests = measure_num - last_measure_num - 1
-							for i in range(0, num_whole_rests):
-								self.add_rest_measure(current_part, notes[k-1][1]+i+1)
-							
-							# create the new measure to place the note 
-							curr_measure = self.create_measure(current_part, measure_num)
-							
-							# add the note (but check to see if it belongs to a chord!)
-							if position in positions_seen:	
-								# make new note but add to a chord
-								# no need to check if need to make a new measure because these notes are in a chord 
-								self.add_note(curr_measure, note, True, position_lengths)
-							else:
-								# this is reached when adding the first note of a new measure 
-								rest_length = position - ((measure_num-1)*self.LMMS_MEASURE_LENGTH)
-								self.add_rests_for_length(rest_length, curr_measure)
-								
-								# then add the note 
-								positions_seen.add(position)
-								self.add_note(curr_measure, note, False, position_lengths)
-								#logging.debug(str(restsToAdd))
-								#logging.debug(positionLengths)
-							
-							# pad the rest of the measure with rests if needed if we're the last note in the measure or the whole piece
-							# scenarios that could trigger this condition: one measure with a single note 
-							if (k < len(notes)-1 and notes[k+1][1] > measure_num) or (k == (len(notes)-1)):
-								self.add_rests_for_length(rem_measure_size, curr_measure)
-							
-					part_measures[current_part] = measure_num
-					last_measure_num = measure_num
-				
-				instrument_counter += 1
-				
 		# still need to add whole rests to the end of each instrument so they all have the same number of measures total, 
 		# otherwise a corrupt file will be reported (but it will still work, at least in MuseScore)!
 		highest_num_measures = 0
 		for part in part_measures:
 			if part_measures[part] > highest_num_measures:
 				highest_num_measures = part_measures[part]
+		
+		if self.MEASURE_RANGE and part_measures:
+			# an excerpt goes to the end of its range (or the last measure with notes, like the full score, if that comes first) but no further
+			first, last = self.MEASURE_RANGE
+			song_end = max(track.end_measure for track in tracks)
+			highest_num_measures = max(highest_num_measures, min(last, song_end) - first + 1)
 				
+		measure_offset = self.get_measure_number_offset()
 		for part in part_measures:
 			if part_measures[part] < highest_num_measures:
 				for i in range(part_measures[part]+1, highest_num_measures+1):
-					self.add_rest_measure(part, i)
-
-		# write tree to file 
-		# make sure to pretty-print because otherwise everything will be on one line
-		data = minidom.parseString(ET.tostring(score_partwise, encoding="unicode")).toprettyxml(indent="    ")
-		data = data.replace("<?xml version=\"1.0\" ?>", "") # toprettyxml adds a xml declaration, but I have it already written to the file
-		new_file.write(data)
+					self.add_rest_measure(part, i + measure_offset)
 		
-		new_file.close()
+		self.PROFILER.lap("rest padding")
 		
-		return os.path.realpath(new_file.name)
+		part_scores = []
+		if extract_parts:
+			for track, part in rendered_tracks:
+				part_scores.append((track.name, self.create_part_score(score_partwise, track, part)))
+			
+			self.PROFILER.lap("parts")
+		
+		# one summary of the problems instead of a message for every note
+		self.log_diagnostics()
+		
+		return score_partwise, part_scores
+	
+	def create_part_score(self, score_partwise: ET.Element, track: ParsedTrack, part: ET.Element) -> ET.Element:
+		"""Create a score with just one part of a full score in it
+		
+		 The measures are shared with the full score rather than copied, so neither score should be changed afterwards.
+		 
+		 Arguments:
+			- score_partwise (ElementTree element node): the full score from render_parts()
+			- track (ParsedTrack): the track the part was created for
+			- part (ElementTree element node): the part in the full score
+		
+		 Returns the new score-partwise element
+		"""
+		part_score = ET.Element('score-partwise')
+		part_score.append(score_partwise.find('movement-title'))
+		
+		part_list = ET.SubElement(part_score, 'part-list')
+		self.add_score_part(part_list, track, "1")
+		
+		# the first measure (from create_first_measure()) already has the attributes the part needs
+		single_part = ET.SubElement(part_score, 'part')
+		single_part.set("id", "P1")
+		single_part.extend(part)
+		
+		return part_score
+
+def split_key(key: str) -> tuple:
+	"""Work out the key signature for a key picked by the user, which can be major or minor
+
+	 Arguments:
+		- key (str): i.e. "d" or "fsm" (or None)
+
+	 Returns a tuple of the key_signature and the 'minor' param for MMP_MusicXML_Converter,
+	 i.e. ("a", "fsm") for "fsm" and ("d", None) for "d"
+	"""
+	if key in MMP_MusicXML_Converter.MINOR_KEYS:
+		return MMP_MusicXML_Converter.MINOR_KEYS[key], key
+	return key, None
+
+# the converter a worker process converts tracks with (see MMP_MusicXML_Converter.get_track_pool())
+_TRACK_CONVERTER = None
+
+def _start_track_worker(key_signature, params):
+	global _TRACK_CONVERTER
+	_TRACK_CONVERTER = MMP_MusicXML_Converter(key_signature=key_signature, params=params)
+
+def _convert_track_in_worker(track: ParsedTrack, time_signature: tuple, master_pitch: int, pretty=True) -> tuple:
+	# like convert_track(), but the part comes back already written out (as it goes inside a part in the score if pretty,
+	# otherwise the whole part as plain xml to be read back in)
+	converter = _TRACK_CONVERTER
+	if (converter.TIME_SIGNATURE_NUMERATOR, converter.TIME_SIGNATURE_DENOMINATOR) != time_signature:
+		converter.set_time_signature(*time_signature)
+	
+	part, last_measure_num, diagnostics = converter.convert_track(track, master_pitch)
+	part_text = None
+	if part is not None:
+		part_text = pretty_xml_children(part, 1, indent="    ") if pretty else ET.tostring(part, encoding="utf-8")
+	return part_text, last_measure_num, diagnostics
+
@@ -0,0 +1,179 @@
+import os
+import time
+import traceback
+
+from typing import List
+
+from mmp_to_musicxml.batch import BatchResult, output_path, safe_file_name, find_output_collisions, collision_result
+from mmp_to_musicxml.converter import MMP_MusicXML_Converter
+from mmp_to_musicxml.utils.project import ParsedProject
+
+"""
+..module:: for writing a separate file for every instrument part of a project (and the full score), reading it in only once
+"""
+
+def part_output(filepath: str, name: str, extension=".xml", taken=None) -> str:
+	"""Make up an output path for an instrument's part, i.e. song-violin.xml
+
+	 The file goes in the current directory, like with MMP_MusicXML_Converter.convert_file()
+
+	 Arguments:
+		- filepath (str): the project's file
+		- name (str): the name of the track the part is for
+		- extension (str): ".xml" or ".mxl"
+		- taken (set): paths already in use (i.e. by another track with the same name). the new path gets added to it
+
+	 Returns the path
+	"""
+	# track names can have anything in them, so only keep what's safe in a file name
+	safe_name = safe_file_name(name) or "part"
+	params = {"mxl": extension == ".mxl"}
+
+	output = output_path(filepath, params, f"-{safe_name}")
+	number = 2
+	while taken is not None and output in taken:
+		output = output_path(filepath, params, f"-{safe_name}-{number}")
+		number += 1
+
+	if taken is not None:
+		taken.add(output)
+
+	return output
+
+def convert_parts(filepath: str, key_signature=None, params=None, score=True) -> List[BatchResult]:
+	"""Write a MusicXML file for every instrument part of a project, reading in and converting the project only once
+
+	 Each part file has its own part-list and the part's first measure attributes, and has as many measures as the full score.
+
+	 Arguments:
+		- filepath (str): the .mmp/.mmpz file
+		- key_signature (str): passed to MMP_MusicXML_Converter
+		- params (dict): passed to MMP_MusicXML_Converter ('opts' can pick the instruments, like for a full score)
+		- score (bool): whether to also write the full score (with the same name convert_file() would give it)
+
+	 Returns a list of BatchResults, the full score's first. if the project couldn't be converted, there's just one with the error
+	"""
+	return convert_many_parts([filepath], key_signature, params, score)
+
+def convert_many_parts(filepaths: List[str], key_signature=None, params=None, score=True) -> List[BatchResult]:
+	"""Write the part files (see convert_parts()) for several projects
+
+	 Every project gets read in first so all the output paths are known before anything is written.
+	 Files that would be written to the same path as another one (i.e. for a/song.mmp and b/song.mmp)
+	 aren't written and fail instead, like with batch.convert_many().
+
+	 Arguments:
+		- filepaths (list): the .mmp/.mmpz files
+		- key_signature (str): passed to MMP_MusicXML_Converter
+		- params (dict): passed to MMP_MusicXML_Converter
+		- score (bool): whether to also write the full scores
+
+	 Returns a list of BatchResults, for each project in order (see convert_parts())
+	"""
+	projects = [] # (filepath, seconds so far, converter, project) for every project that could be read in, or a BatchResult if it couldn't
+	outputs = [] # (index in projects, output path) for every file to write, the full score's first
+
+	for filepath in filepaths:
+		start = time.perf_counter()
+
+		try:
+			converter = MMP_MusicXML_Converter(key_signature=key_signature, params=params)
+			converter.PROFILER.start()
+			project = ParsedProject.load(filepath, converter.get_track_names(), converter.MEASURE_RANGE)
+			converter.PROFILER.lap("parse")
+			converter.PROFILER.pause()
+		except Exception:
+			projects.append(BatchResult(filepath, None, traceback.format_exc(), time.perf_counter() - start))
+			continue
+
+		extension = ".mxl" if converter.MXL_OUTPUT else ".xml"
+		taken = set()
+
+		if score:
+			output = output_path(filepath, {"mxl": converter.MXL_OUTPUT})
+			taken.add(output)
+			outputs.append((len(projects), output))
+
+		for track in converter.get_part_tracks(project):
+			outputs.append((len(projects), part_output(filepath, track.name, extension, taken)))
+
+		projects.append((filepath, time.perf_counter() - start, converter, project))
+
+	collisions = find_output_collisions([output for _, output in outputs])
+
+	results = []
+
+	for i, entry in enumerate(projects):
+		if isinstance(entry, BatchResult):
+			results.append(entry)
+			continue
+
+		filepath, seconds, converter, project = entry
+		project_outputs = [j for j, (k, _) in enumerate(outputs) if k == i]
+		project_results = [None] * len(project_outputs)
+		to_write = [] # (the output's place among the project's outputs, output path)
+
+		for place, j in enumerate(project_outputs):
+			output = outputs[j][1]
+			if j in collisions:
+				project_results[place] = collision_result(filepath, output, [projects[outputs[other][0]][0] for other in collisions[j]])
+			else:
+				to_write.append((place, output))
+
+		if to_write:
+			for (place, _), result in zip(to_write, write_parts(filepath, converter, project, to_write, score, seconds)):
+				project_results[place] = result
+
+		results.extend(project_results)
+
+	return results
+
+def write_parts(filepath: str, converter: MMP_MusicXML_Converter, project: ParsedProject, outputs: list, score: bool, seconds=0) -> List[BatchResult]:
+	"""Convert a project that has already been read in, and write out the full score and parts that don't collide with anything
+
+	 Arguments:
+		- filepath (str): the project's file, for the results
+		- converter (MMP_MusicXML_Converter): the converter the project was read in with
+		- project (ParsedProject): the project
+		- outputs (list): (place, output path) tuples of the files to write, where place is 0 for the full score (if score is True),
+		  then counts up through the parts in the order render_parts() returns them
+		- score (bool): whether the full score is one of the project's outputs
+		- seconds (float): time already spent on the project, i.e. reading it in
+
+	 Returns a list of BatchResults, one for each output (which all have the error if the project couldn't be converted)
+	"""
+	start = time.perf_counter() - seconds
+	converter.PROFILER.resume()
+
+	try:
+		score_partwise, part_scores = converter.render_parts(project)
+	except Exception:
+		converter.PROFILER.stop()
+		error = traceback.format_exc()
+		return [BatchResult(filepath, None, error, time.perf_counter() - start) for _ in outputs]
+	finally:
+		# the converter isn't used for anything else, so any worker processes it started can go
+		converter.close()
+
+	# every output the project has, in the same order they were made up in
+	scores = ([score_partwise] if score else []) + [part_score for _, part_score in part_scores]
+
+	write = converter.write_mxl if converter.MXL_OUTPUT else converter.write_score
+	results = []
+
+	for place, output in outputs:
+		try:
+			with open(output, "wb") as new_file:
+				write(scores[place], new_file)
+			results.append(BatchResult(filepath, os.path.realpath(output), None, time.perf_counter() - start))
+		except Exception:
+			results.append(BatchResult(filepath, None, traceback.format_exc(), time.perf_counter() - start))
+
+	converter.PROFILER.lap("write")
+	converter.PROFILER.stop()
+
+	if converter.PROFILER.enabled:
+		# one report for the whole project, named like the one convert_file() writes
+		converter.PROFILER.write(os.path.splitext(output_path(filepath))[0] + ".profile.json")
+
+	return results
@@ -0,0 +1,302 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from mmp_to_musicxml.converter import MMP_MusicXML_Converter, split_key
+
+"""
+..module:: for running the converter as a long-running local server, so each conversion doesn't have to
+           pay for starting python, importing everything and setting up the converter
+"""
+
+# the query parameters a conversion request can have, which work the same as the command line options
+# (so key can be a minor key, i.e. "fsm")
+CONVERT_OPTIONS = ("key", "master", "title", "instruments", "mxl")
+
+# converters that have already been set up in this (worker) process, keyed by their options (except the title,
+# which is set for each request), most recently used last. each worker only does one conversion at a time,
+# so they can be reused as is
+_CONVERTERS = OrderedDict()
+
+# max number of converters each worker keeps around
+MAX_CONVERTERS = 8
+
+def get_converter(options: dict) -> MMP_MusicXML_Converter:
+	"""Get a converter for the given options, reusing one from a previous request if possible
+
+	 Reusing converters keeps everything they work out as they go (i.e. the quantization tables,
+	 rest plans and the parts of tracks that have been converted before) around between requests.
+	 Only the MAX_CONVERTERS most recently used ones are kept.
+
+	 Arguments:
+		- options (dict): any of CONVERT_OPTIONS
+
+	 Returns an MMP_MusicXML_Converter, with its title set to the one in options
+	"""
+	# the title is only used for the score's movement-title, so it doesn't need its own converter
+	converter_key = tuple(sorted((name, value) for name, value in options.items() if name != "title"))
+
+	if converter_key in _CONVERTERS:
+		_CONVERTERS.move_to_end(converter_key)
+	else:
+		key_signature, minor = split_key(options.get("key"))
+		opts = argparse.Namespace(
+			check=False,
+			key=options.get("key"),
+			master=options.get("master"),
+			title=None,
+			instruments=options.get("instruments"),
+		)
+		params = {
+			"opts": opts,
+			"minor": minor,
+			"mxl": bool(options.get("mxl")),
+			"track_cache": True,
+		}
+		_CONVERTERS[converter_key] = MMP_MusicXML_Converter(key_signature=key_signature, params=params)
+		if len(_CONVERTERS) > MAX_CONVERTERS:
+			_CONVERTERS.popitem(last=False)
+
+	converter = _CONVERTERS[converter_key]
+	converter.opts.title = options.get("title")
+	return converter
+
+def convert_request(data: bytes, options: dict) -> bytes:
+	"""Convert the contents of an .mmp/.mmpz file (this runs in a worker process)
+
+	 Returns the MusicXML (or .mxl file) as bytes
+	"""
+	return get_converter(options).convert(data)
+
+def _warm_up():
+	# set up the default converter as soon as a worker process starts instead of during its first request
+	get_converter({})
+
+class ConversionServer:
+	"""A small HTTP server that converts .mmp files, meant to run on localhost
+
+	 Conversions run in a pool of worker processes while an asyncio loop takes care of the connections.
+	 Requests that don't fit in the queue get turned away right away (503) and requests that take
+	 too long get a 504, so a client never waits forever.
+
+	 Endpoints:
+		- POST /convert with the .mmp/.mmpz file as the body. Options go in the query string,
+		  i.e. /convert?key=d&mxl=1 (see CONVERT_OPTIONS). Responds with the MusicXML.
+		- GET /health responds with some stats about the server as json
+	"""
+
+	def __init__(
+		self,
+		host="127.0.0.1",
+		port=8000,
+		unix_socket=None,
+		workers=2,
+		max_queue=16,
+		timeout=60.0,
+		max_request_size=64 * 1024 * 1024,
+	):
+		"""
+		 Arguments:
+			- host (str): address to listen on
+			- port (int): port to listen on (0 picks a free one, see self.port once started)
+			- unix_socket (str): path of a unix socket to listen on instead of host and port
+			- workers (int): number of worker processes
+			- max_queue (int): max number of conversions that can be running or waiting at once
+			- timeout (float): number of seconds a conversion can take before giving up on it
+			- max_request_size (int): max size of an uploaded file in bytes
+		"""
+		self.host = host
+		self.port = port
+		self.unix_socket = unix_socket
+		self.workers = workers
+		self.max_queue = max_queue
+		self.timeout = timeout
+		self.max_request_size = max_request_size
+
+		self.executor = None
+		self.server = None
+		self.started_at = None
+
+		self.queued = 0 # conversions that are running or waiting for a worker
+		self.counts = {"completed": 0, "failed": 0, "timed_out": 0, "rejected": 0}
+		self.conversion_seconds = 0
+
+	async def start(self):
+		"""Start the worker processes and start listening"""
+		self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+
+		if self.unix_socket:
+			self.server = await asyncio.start_unix_server(self.handle_connection, path=self.unix_socket)
+		else:
+			self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+			self.port = self.server.sockets[0].getsockname()[1]
+
+		self.started_at = time.monotonic()
+
+	async def serve_forever(self):
+		if self.server is None:
+			await self.start()
+		await self.server.serve_forever()
+
+	async def close(self):
+		"""Stop listening and shut down the worker processes"""
+		if self.server:
+			self.server.close()
+			await self.server.wait_closed()
+			self.server = None
+
+		if self.executor:
+			self.executor.shutdown(wait=True, cancel_futures=True)
+			self.executor = None
+
+		if self.unix_socket and os.path.exists(self.unix_socket):
+			os.remove(self.unix_socket)
+
+	def stats(self) -> dict:
+		completed = self.counts["completed"]
+		return {
+			"status": "ok",
+			"uptime_seconds": time.monotonic() - self.started_at if self.started_at else 0,
+			"workers": self.workers,
+			"queued": self.queued,
+			"max_queue": self.max_queue,
+			"timeout": self.timeout,
+			**self.counts,
+			"average_seconds": self.conversion_seconds / completed if completed else None,
+		}
+
+	async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+		try:
+			status, content_type, body = await self.handle_request(reader)
+		except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+			status, content_type, body = self.error(HTTPStatus.BAD_REQUEST, f"malformed request: {e}")
+
+		try:
+			writer.write(
+				f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+				f"Content-Type: {content_type}\r\n"
+				f"Content-Length: {len(body)}\r\n"
+				"Connection: close\r\n"
+				"\r\n".encode("latin-1")
+			)
+			writer.write(body)
+			await writer.drain()
+		except ConnectionError:
+			# the client gave up already
+			pass
+		finally:
+			writer.close()
+
+	async def handle_request(self, reader: asyncio.StreamReader) -> tuple:
+		"""Read a request and work out the response
+
+		 Returns a tuple of the response's status, content type and body
+		"""
+		request_line, *header_lines = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+		method, target, _ = request_line.split(" ", 2)
+
+		headers = {}
+		for line in header_lines:
+			if ":" in line:
+				name, value = line.split(":", 1)
+				headers[name.strip().lower()] = value.strip()
+
+		url = urlsplit(target)
+
+		if url.path == "/health":
+			if method != "GET":
+				return self.error(HTTPStatus.METHOD_NOT_ALLOWED, "use GET")
+			return HTTPStatus.OK, "application/json", json.dumps(self.stats()).encode("utf-8")
+
+		if url.path != "/convert":
+			return self.error(HTTPStatus.NOT_FOUND, f"nothing at {url.path}")
+		if method != "POST":
+			return self.error(HTTPStatus.METHOD_NOT_ALLOWED, "use POST")
+
+		length = int(headers.get("content-length", 0))
+		if length <= 0:
+			return self.error(HTTPStatus.LENGTH_REQUIRED, "send the .mmp file as the body, with a Content-Length")
+		if length > self.max_request_size:
+			return self.error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"max size is {self.max_request_size} bytes")
+
+		data = await reader.readexactly(length)
+
+		query = parse_qs(url.query)
+		options = {name: query[name][-1] for name in CONVERT_OPTIONS if name in query}
+		if "mxl" in options:
+			options["mxl"] = options["mxl"].lower() in ("1", "true", "yes")
+
+		return await self.convert(data, options)
+
+	async def convert(self, data: bytes, options: dict) -> tuple:
+		"""Run a conversion on the worker pool, unless the queue is full
+
+		 Returns a tuple of the response's status, content type and body
+		"""
+		if self.queued >= self.max_queue:
+			self.counts["rejected"] += 1
+			return self.error(HTTPStatus.SERVICE_UNAVAILABLE, "too many conversions queued, try again later")
+
+		self.queued += 1
+		start = time.perf_counter()
+
+		try:
+			try:
+				future = self.executor.submit(convert_request, data, options)
+			except BrokenProcessPool:
+				# a worker process died, so start over with a new pool
+				self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+				future = self.executor.submit(convert_request, data, options)
+		except Exception as e:
+			self.queued -= 1
+			self.counts["failed"] += 1
+			return self.error(HTTPStatus.UNPROCESSABLE_ENTITY, f"conversion failed: {type(e).__name__}: {e}")
+
+		# the conversion only stops taking up a place in the queue once the worker is done with it,
+		# which can be after the request has timed out (the callback runs in one of the executor's threads)
+		loop = asyncio.get_running_loop()
+		future.add_done_callback(lambda _: loop.call_soon_threadsafe(self.conversion_done))
+
+		try:
+			# a conversion that's already running can't be stopped, but one that's still waiting gets cancelled
+			result = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+		except asyncio.TimeoutError:
+			self.counts["timed_out"] += 1
+			return self.error(HTTPStatus.GATEWAY_TIMEOUT, f"conversion took longer than {self.timeout} seconds")
+		except Exception as e:
+			self.counts["failed"] += 1
+			return self.error(HTTPStatus.UNPROCESSABLE_ENTITY, f"conversion failed: {type(e).__name__}: {e}")
+
+		self.counts["completed"] += 1
+		self.conversion_seconds += time.perf_counter() - start
+
+		if options.get("mxl"):
+			return HTTPStatus.OK, "application/vnd.recordare.musicxml", result
+		return HTTPStatus.OK, "application/vnd.recordare.musicxml+xml", result
+
+	def conversion_done(self):
+		self.queued -= 1
+
+	def error(self, status: HTTPStatus, message: str) -> tuple:
+		return status, "application/json", json.dumps({"error": message}).encode("utf-8")
+
+def run_server(**kwargs):
+	"""Run a ConversionServer until interrupted (takes the same arguments as ConversionServer)"""
+	server = ConversionServer(**kwargs)
+
+	async def main():
+		await server.start()
+		try:
+			await server.serve_forever()
+		finally:
+			await server.close()
+
+	asyncio.run(main())
@@ -0,0 +1,55 @@
+import pytest
+import os
+import filecmp
+import shutil
+
+from ..batch import expand_paths, convert_many, format_summary, find_output_collisions
+
+TEST_DIR = os.path.join(os.path.dirname(__file__), 'test_key_sig')
+
+def test_expand_paths():
+	files = expand_paths([TEST_DIR, os.path.join(TEST_DIR, 'a*.mmp')])
+	assert len(files) == len([f for f in os.listdir(TEST_DIR) if f.endswith('.mmp')])
+	assert all(f.endswith('.mmp') for f in files)
+	
+	# the glob matches files already found in the directory, so they shouldn't show up twice
+	assert len(set(files)) == len(files)
+
+def test_convert_many(tmp_path, monkeypatch):
+	# output files get written to the current directory
+	monkeypatch.chdir(tmp_path)
+	
+	filepaths = [os.path.join(TEST_DIR, 'd.mmp'), os.path.join(TEST_DIR, 'does-not-exist.mmp'), os.path.join(TEST_DIR, 'd-chromatic.mmp')]
+	results = convert_many(filepaths, key_signature='d', jobs=2)
+	
+	assert [r.filepath for r in results] == filepaths
+	assert results[1].output is None and results[1].error is not None
+	
+	for result, name in [(results[0], 'd.xml'), (results[2], 'd-chromatic.xml')]:
+		assert result.error is None
+		assert filecmp.cmp(result.output, os.path.join(TEST_DIR, 'expected_output', name), shallow=False) is True
+	
+	summary = format_summary(results)
+	assert "2 converted, 1 failed" in summary
+
+def test_output_collisions(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	
+	# a/song.mmp and b/song.mmp would both be written to song.xml, so neither one should be
+	for name in ['a', 'b', 'c']:
+		os.makedirs(tmp_path / 'in' / name)
+	filepaths = [str(tmp_path / 'in' / 'a' / 'song.mmp'), str(tmp_path / 'in' / 'b' / 'song.mmp'), str(tmp_path / 'in' / 'c' / 'other.mmp')]
+	for filepath in filepaths:
+		shutil.copyfile(os.path.join(TEST_DIR, 'd.mmp'), filepath)
+	
+	assert find_output_collisions(['song.xml', './song.xml', 'other.xml']) == {0: [1], 1: [0]}
+	
+	results = convert_many(filepaths, key_signature='d', jobs=1)
+	
+	assert results[0].error is not None and filepaths[1] in results[0].error
+	assert results[1].error is not None and filepaths[0] in results[1].error
+	assert results[2].error is None
+	assert not os.path.exists(tmp_path / 'song.xml')
+	assert os.path.exists(tmp_path / 'other.xml')
+	
+	assert "1 converted, 2 failed" in format_summary(results)
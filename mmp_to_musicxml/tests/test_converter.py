@@ -1,8 +1,19 @@
 import pytest
+import os
+import random
+import json
+import io
+import zlib
+import zipfile
+import argparse
+import logging
+import filecmp
 import xml.etree.ElementTree as ET 
 from xml.dom import minidom 
 
 from ..converter import MMP_MusicXML_Converter
+from ..utils.note import Note
+from ..utils.project import ParsedProject
 
 # create the converter object once and reuse across all tests
 @pytest.fixture(scope="session")
@@ -22,10 +33,7 @@ def test_find_closest_note_type(mmp_converter):
 
 def test_add_note(mmp_converter):
 	parent_node = ET.Element('node')
-	note = ET.Element('note')
-	note.set('len', 192)
-	note.set('key', 53)
-	note.set('pos', 384)
+	note = Note(pos=384, len=192, key=53)
 	mmp_converter.add_note(parent_node, note, False, None)
 	
 	count = 0
@@ -83,3 +91,413 @@ def test_get_rests(mmp_converter):
 			assert rest_count == 1
 		else:
 			assert rest_count == 0
+
+def test_parallel_tracks(tmp_path, monkeypatch):
+	# output files get written to the current directory
+	monkeypatch.chdir(tmp_path)
+	testfile = os.path.join(os.path.dirname(__file__), '..', '..', 'testfiles', 'funbgmXMLTESTsmall.mmp')
+	
+	with open(MMP_MusicXML_Converter().convert_file(testfile), 'rb') as f:
+		sequential_output = f.read()
+	
+	converter = MMP_MusicXML_Converter(params={'track_jobs': 2})
+	
+	# small projects are converted in this process
+	assert not converter.use_track_pool(ParsedProject.load(testfile).tracks)
+	converter.TRACK_JOBS_MIN_NOTES = 0
+	
+	try:
+		with open(converter.convert_file(testfile), 'rb') as f:
+			parallel_output = f.read()
+		assert parallel_output == sequential_output
+		
+		# the same workers get used again, and the score can be written any of the usual ways
+		pool = converter.TRACK_POOL
+		assert pool is not None
+		with open(testfile, 'rb') as f:
+			assert converter.convert(f.read()) == sequential_output
+		assert converter.convert_project(ParsedProject.load(testfile)) == sequential_output
+		assert converter.TRACK_POOL is pool
+	finally:
+		converter.close()
+	
+	assert converter.TRACK_POOL is None
+
+def test_parallel_tracks_excerpt():
+	testfile = os.path.join(os.path.dirname(__file__), '..', '..', 'testfiles', 'funbgmXMLTESTsmall.mmp')
+	project = ParsedProject.load(testfile)
+	params = {'measures': (3, 10), 'opts': argparse.Namespace(check=True, key=None, master='2', title=None, instruments=None)}
+	
+	sequential = MMP_MusicXML_Converter(key_signature='d', params=params)
+	sequential_output = sequential.convert_project(project)
+	
+	converter = MMP_MusicXML_Converter(key_signature='d', params=dict(params, track_jobs=2))
+	converter.TRACK_JOBS_MIN_NOTES = 0
+	try:
+		assert converter.convert_project(project) == sequential_output
+		assert converter.DIAGNOSTICS.to_dict() == sequential.DIAGNOSTICS.to_dict()
+	finally:
+		converter.close()
+
+def test_parallel_tracks_track_cache_and_parts():
+	testfile = os.path.join(os.path.dirname(__file__), '..', '..', 'testfiles', 'funbgmXMLTESTsmall.mmp')
+	project = ParsedProject.load(testfile)
+	sequential_output = MMP_MusicXML_Converter().convert_project(project)
+	sequential_parts = MMP_MusicXML_Converter().render_parts(project)[1]
+	
+	converter = MMP_MusicXML_Converter(params={'track_jobs': 2, 'track_cache': True})
+	converter.TRACK_JOBS_MIN_NOTES = 0
+	try:
+		# the tracks that aren't cached yet still go to the workers
+		assert converter.convert_project(project) == sequential_output
+		assert converter.TRACK_POOL is not None
+		num_tracks = converter.TRACK_CACHE.stats()['misses']
+		
+		# and the parts they sent back were cached
+		assert converter.convert_project(project) == sequential_output
+		assert converter.TRACK_CACHE.stats() == {'hits': num_tracks, 'misses': num_tracks}
+	finally:
+		converter.close()
+	
+	converter = MMP_MusicXML_Converter(params={'track_jobs': 2})
+	converter.TRACK_JOBS_MIN_NOTES = 0
+	try:
+		parts = converter.render_parts(project)[1]
+		assert converter.TRACK_POOL is not None
+		assert [(name, ET.tostring(score)) for name, score in parts] == [(name, ET.tostring(score)) for name, score in sequential_parts]
+	finally:
+		converter.close()
+
+def test_create_length_table_numpy(mmp_converter):
+	pytest.importorskip("numpy")
+	random.seed(8)
+	
+	# random chords, overlapping notes and notes spilling into the next measure
+	for _ in range(50):
+		notes = []
+		for _ in range(random.randint(1, 200)):
+			pos = random.randrange(0, 192*8, 3)
+			notes.append(Note(pos=pos, len=random.choice([3, 6, 12, 24, 36, 48, 72, 96, 144, 192, 240]), key=60, measure=pos // 192 + 1))
+		notes.sort(key=lambda n: n.pos)
+		
+		assert mmp_converter.create_length_table_numpy(notes) == mmp_converter.create_length_table(notes)
+
+def test_quantize(mmp_converter):
+	def closest_note_type(length):
+		for note_length in sorted(mmp_converter.NOTE_LENGTHS, reverse=True):
+			if note_length <= length:
+				return mmp_converter.NOTE_LENGTHS[note_length]
+		return mmp_converter.NOTE_LENGTHS[3]
+	
+	for length in range(-1, 400):
+		quantized = mmp_converter.quantize(length)
+		note_type = closest_note_type(length)
+		assert quantized.note_type == note_type
+		assert quantized.type == note_type.split("-")[0]
+		assert quantized.dotted == ("dotted" in note_type)
+		assert quantized.length == mmp_converter.NOTE_TYPE[note_type]
+		assert quantized.duration == str(int(mmp_converter.NOTE_TYPE[note_type] / 6))
+	
+	assert mmp_converter.quantize(80) == ("quarter-dotted", "quarter", True, 72, "12")
+
+def test_quantization_table_follows_measure_length():
+	converter = MMP_MusicXML_Converter()
+	converter.LMMS_MEASURE_LENGTH = 48 * 6 # 6/4 time
+	converter.update_quantization_table()
+	assert len(converter.QUANTIZATION_TABLE) == 48 * 6 + 1
+	assert converter.find_closest_note_type(48 * 6) == "whole"
+
+def test_get_rest_plan(mmp_converter):
+	size = 192+48+24+12+6
+	plan = mmp_converter.get_rest_plan(size)
+	assert [rest.find('type').text for rest in plan] == ["32nd", "16th", "eighth", "quarter", "whole"]
+	
+	# same gap size gives back the same plan
+	assert mmp_converter.get_rest_plan(size) is plan
+	
+	parent_node = ET.Element('measure')
+	mmp_converter.add_rests_for_length(size, parent_node)
+	assert [child.find('type').text for child in parent_node] == ["32nd", "16th", "eighth", "quarter", "whole"]
+	assert [child.find('duration').text for child in parent_node] == ["1", "2", "4", "8", ""]
+	
+	# every measure gets rest elements of its own, copied from the plan
+	other_node = ET.Element('measure')
+	mmp_converter.add_rests_for_length(size, other_node)
+	assert all(a is not b for a, b in zip(parent_node, other_node))
+	assert all(a is not b and a.find('rest') is not b.find('rest') for a, b in zip(parent_node, plan))
+	assert [ET.tostring(rest) for rest in other_node] == [ET.tostring(rest) for rest in plan]
+
+def test_rendered_trees_are_independent():
+	testfile = os.path.join(os.path.dirname(__file__), '..', '..', 'testfiles', 'funbgmXMLTESTsmall.mmp')
+	project = ParsedProject.load(testfile)
+	expected = ET.tostring(MMP_MusicXML_Converter().render(project))
+	
+	# changing one rendered score shouldn't change anything rendered afterwards
+	score = MMP_MusicXML_Converter().render(project)
+	for note in score.iter('note'):
+		if note.find('rest') is not None:
+			ET.SubElement(note, 'voice').text = '2'
+	
+	assert ET.tostring(MMP_MusicXML_Converter().render(project)) == expected
+
+def test_profile(tmp_path, monkeypatch):
+	# output files get written to the current directory
+	monkeypatch.chdir(tmp_path)
+	testfile = os.path.join(os.path.dirname(__file__), '..', '..', 'testfiles', 'funbgmXMLTESTsmall.mmp')
+	
+	converter = MMP_MusicXML_Converter(params={'profile': True})
+	output = converter.convert_file(testfile)
+	
+	with open(tmp_path / 'funbgmXMLTESTsmall.profile.json') as f:
+		report = json.load(f)
+	
+	stage_names = [stage['stage'] for stage in report['stages']]
+	assert stage_names[:3] == ['parse', 'notes', 'part list']
+	assert stage_names[-2:] == ['rest padding', 'write']
+	assert set(report['track_seconds']) == set(stage['track'] for stage in report['stages'] if stage['track'])
+	assert all(stage['seconds'] >= 0 for stage in report['stages'])
+	
+	# profiling is off by default
+	assert MMP_MusicXML_Converter().PROFILER.enabled is False
+
+def test_convert_in_memory(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	testfile = os.path.join(os.path.dirname(__file__), 'test_key_sig', 'a.mmp')
+	with open(os.path.join(os.path.dirname(__file__), 'test_key_sig', 'expected_output', 'a.xml'), 'rb') as f:
+		expected_output = f.read()
+	with open(testfile, 'rb') as f:
+		data = f.read()
+	
+	converter = MMP_MusicXML_Converter(key_signature='a')
+	assert converter.convert(data) == expected_output
+	assert converter.convert(data.decode('utf-8')) == expected_output
+	
+	# compressed .mmpz data is recognized without a file name
+	assert converter.convert(len(data).to_bytes(4, 'big') + zlib.compress(data)) == expected_output
+	
+	# file objects in and out
+	output = io.BytesIO()
+	with open(testfile, 'rb') as f:
+		assert converter.convert(f, output) is None
+	assert output.getvalue() == expected_output
+	
+	output = io.StringIO()
+	converter.convert(io.BytesIO(data), output)
+	assert output.getvalue() == expected_output.decode('utf-8')
+	
+	# nothing gets written to disk
+	assert os.listdir(tmp_path) == []
+
+def test_mxl_output(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	testfile = os.path.join(os.path.dirname(__file__), 'test_key_sig', 'a.mmp')
+	with open(os.path.join(os.path.dirname(__file__), 'test_key_sig', 'expected_output', 'a.xml'), 'rb') as f:
+		expected_output = f.read()
+	
+	converter = MMP_MusicXML_Converter(key_signature='a', params={'mxl': True})
+	output = converter.convert_file(testfile)
+	assert output.endswith('a.mxl')
+	
+	with zipfile.ZipFile(output) as mxl:
+		assert mxl.namelist()[0] == 'mimetype'
+		assert mxl.read('mimetype') == b'application/vnd.recordare.musicxml'
+		container = ET.fromstring(mxl.read('META-INF/container.xml'))
+		assert container.find('rootfiles/rootfile').get('full-path') == 'a.xml'
+		assert mxl.read('a.xml') == expected_output
+	
+	with open(testfile, 'rb') as f:
+		with zipfile.ZipFile(io.BytesIO(converter.convert(f))) as mxl:
+			assert mxl.read('score.xml') == expected_output
+
+def test_conversion_cache(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	testfile = os.path.join(os.path.dirname(__file__), 'test_key_sig', 'a.mmp')
+	expected_output = os.path.join(os.path.dirname(__file__), 'test_key_sig', 'expected_output', 'a.xml')
+	params = {'cache_dir': str(tmp_path / 'cache')}
+	
+	converter = MMP_MusicXML_Converter(key_signature='a', params=params)
+	output = converter.convert_file(testfile)
+	assert converter.CACHE.stats() == {'hits': 0, 'misses': 1}
+	os.remove(output)
+	
+	# a cache hit doesn't parse anything
+	converter = MMP_MusicXML_Converter(key_signature='a', params=params)
+	monkeypatch.setattr(converter, 'create_score', None)
+	output = converter.convert_file(testfile)
+	assert converter.CACHE.stats() == {'hits': 1, 'misses': 0}
+	assert filecmp.cmp(output, expected_output, shallow=False) is True
+	
+	# a different key signature is a different entry
+	converter = MMP_MusicXML_Converter(key_signature='d', params=params)
+	converter.convert_file(testfile)
+	assert converter.CACHE.stats() == {'hits': 0, 'misses': 1}
+	
+	# the in-memory api uses the same cache
+	converter = MMP_MusicXML_Converter(key_signature='a', params=params)
+	with open(testfile, 'rb') as f:
+		converter.convert(f.read())
+	assert converter.CACHE.stats() == {'hits': 1, 'misses': 0}
+
+def test_conversion_cache_diagnostics(tmp_path, caplog):
+	# a flute note that's too low, and a note that goes past the end of its measure
+	project = '''<?xml version="1.0"?>
+	<lmms-project><head timesig_numerator="4" timesig_denominator="4" masterpitch="0"/><song><trackcontainer>
+	<track name="flute" muted="0" type="0"><instrumenttrack pan="0" vol="100" pitch="0"/>
+	<pattern pos="0"><note pan="0" key="24" vol="100" pos="0" len="48"/><note pan="0" key="60" vol="100" pos="192" len="240"/></pattern>
+	</track></trackcontainer></song></lmms-project>'''
+	opts = argparse.Namespace(check=True, key=None, master=None, title=None, instruments=None)
+	params = {'opts': opts, 'cache_dir': str(tmp_path / 'cache')}
+	
+	converter = MMP_MusicXML_Converter(params=params)
+	with caplog.at_level(logging.WARNING):
+		converter.convert(project)
+	expected = converter.DIAGNOSTICS.to_dict()
+	warnings = [r.getMessage() for r in caplog.records]
+	assert len(warnings) == 2
+	
+	# a cache hit reports the same problems as converting again would
+	caplog.clear()
+	converter = MMP_MusicXML_Converter(params=params)
+	with caplog.at_level(logging.WARNING):
+		converter.convert(project)
+	assert converter.CACHE.stats() == {'hits': 1, 'misses': 0}
+	assert converter.DIAGNOSTICS.to_dict() == expected
+	assert [r.getMessage() for r in caplog.records] == warnings
+	
+	# without checking there's nothing out of range, so that's cached separately
+	converter = MMP_MusicXML_Converter(params={**params, 'opts': argparse.Namespace(**{**vars(opts), 'check': False})})
+	converter.convert(project)
+	assert converter.CACHE.stats() == {'hits': 0, 'misses': 1}
+	assert converter.DIAGNOSTICS.out_of_range == {}
+
+def test_track_cache(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	testfile = os.path.join(os.path.dirname(__file__), '..', '..', 'testfiles', 'funbgmXMLTESTsmall.mmp')
+	with open(testfile) as f:
+		project = f.read()
+	
+	# change a single note of the first track
+	first_note = project.index('<note ')
+	key_index = project.index(' key="', first_note) + len(' key="')
+	edited_project = project[:key_index] + '1' + project[key_index:]
+	
+	converter = MMP_MusicXML_Converter(params={'track_cache': True})
+	assert converter.convert(project) == MMP_MusicXML_Converter().convert(project)
+	num_tracks = converter.TRACK_CACHE.stats()['misses']
+	assert converter.TRACK_CACHE.stats() == {'hits': 0, 'misses': num_tracks}
+	
+	# only the edited track gets converted again
+	assert converter.convert(edited_project) == MMP_MusicXML_Converter().convert(edited_project)
+	assert converter.TRACK_CACHE.stats() == {'hits': num_tracks - 1, 'misses': num_tracks + 1}
+	
+	# the parts can also be saved to the cache directory for the next run
+	MMP_MusicXML_Converter(params={'cache_dir': str(tmp_path / 'cache')}).convert(project)
+	converter = MMP_MusicXML_Converter(params={'cache_dir': str(tmp_path / 'cache')})
+	assert converter.convert(edited_project) == MMP_MusicXML_Converter().convert(edited_project)
+	assert converter.TRACK_CACHE.stats() == {'hits': num_tracks - 1, 'misses': 1}
+
+def test_cache_size(tmp_path, monkeypatch):
+	# the conversions and the track parts share the cache size, so the whole cache directory stays under it
+	monkeypatch.chdir(tmp_path)
+	cache_size = 300 * 1024
+	params = {'cache_dir': str(tmp_path / 'cache'), 'cache_size': cache_size}
+	
+	for name in ['funbgmXMLTESTsmall.mmp', 'funbgmXMLTEST.mmp', 'xmltest.mmp', 'edgecase.mmp', '3-4_time_test.mmp']:
+		converter = MMP_MusicXML_Converter(params=params)
+		converter.convert_file(os.path.join(os.path.dirname(__file__), '..', '..', 'testfiles', name))
+		assert converter.CACHE.max_size + converter.TRACK_CACHE.disk.max_size == cache_size
+		
+		disk_usage = sum(os.path.getsize(os.path.join(dirpath, f)) for dirpath, _, files in os.walk(tmp_path / 'cache') for f in files)
+		assert disk_usage <= cache_size
+
+def test_diagnostics(caplog):
+	root_handlers = list(logging.getLogger().handlers)
+	opts = argparse.Namespace(check=True, key=None, master=None, title=None, instruments=None)
+	converter = MMP_MusicXML_Converter(params={'opts': opts})
+	
+	# the converter shouldn't be configuring logging for everyone else
+	assert logging.getLogger().handlers == root_handlers
+	assert logging.getLogger().level == logging.WARNING
+	
+	# a flute note that's too low, and a note that goes past the end of its measure
+	project = '''<?xml version="1.0"?>
+	<lmms-project><head timesig_numerator="4" timesig_denominator="4" masterpitch="0"/><song><trackcontainer>
+	<track name="flute" muted="0" type="0"><instrumenttrack pan="0" vol="100" pitch="0"/>
+	<pattern pos="0"><note pan="0" key="24" vol="100" pos="0" len="48"/><note pan="0" key="60" vol="100" pos="192" len="240"/></pattern>
+	</track></trackcontainer></song></lmms-project>'''
+	
+	with caplog.at_level(logging.WARNING):
+		converter.convert(project)
+	
+	assert converter.DIAGNOSTICS.out_of_range == {'flute': {'count': 1, 'locations': ['C2 in measure 1']}}
+	assert converter.DIAGNOSTICS.truncated == {'flute': {'count': 1, 'locations': ['measure 2']}}
+	
+	# one summary line for each kind of problem
+	assert [r.getMessage() for r in caplog.records] == converter.DIAGNOSTICS.summary().splitlines()
+	
+	# without checking, the truncated note is still recorded but isn't worth a warning
+	caplog.clear()
+	opts.check = False
+	converter = MMP_MusicXML_Converter(params={'opts': opts})
+	with caplog.at_level(logging.WARNING):
+		converter.convert(project)
+	
+	assert converter.DIAGNOSTICS.truncated == {'flute': {'count': 1, 'locations': ['measure 2']}}
+	assert caplog.records == []
+	
+	with caplog.at_level(logging.DEBUG, logger='mmp_to_musicxml.converter'):
+		converter.convert(project)
+	assert converter.DIAGNOSTICS.summary() in caplog.text
+
+def test_convert_project():
+	testfile = os.path.join(os.path.dirname(__file__), '..', '..', 'testfiles', 'funbgmXMLTESTsmall.mmp')
+	with open(testfile, 'rb') as f:
+		data = f.read()
+	
+	project = ParsedProject.load(testfile)
+	notes_before = [repr(n) for track in project.tracks for n in track.notes]
+	
+	for key, master in [('d', None), ('bb', '3'), ('d', None), (None, '-2')]:
+		opts = argparse.Namespace(check=False, key=key, master=master, title=None, instruments=None)
+		params = {'opts': opts}
+		
+		# rendering the same project again and again should be the same as converting from scratch every time
+		expected = MMP_MusicXML_Converter(key_signature=key, params=params).convert(data)
+		assert MMP_MusicXML_Converter(key_signature=key, params=params).convert_project(project) == expected
+	
+	# and the project shouldn't have been changed along the way
+	assert [repr(n) for track in project.tracks for n in track.notes] == notes_before
+
+@pytest.mark.parametrize('renumber', [False, True])
+def test_measure_range(renumber):
+	testfile = os.path.join(os.path.dirname(__file__), '..', '..', 'testfiles', 'funbgmXMLTESTsmall.mmp')
+	project = ParsedProject.load(testfile)
+	
+	full_score = MMP_MusicXML_Converter().render(project)
+	excerpt = MMP_MusicXML_Converter(params={'measures': (3, 5), 'renumber': renumber}).render(project)
+	
+	numbers = ['1', '2', '3'] if renumber else ['3', '4', '5']
+	assert len(excerpt.findall('part')) == len(full_score.findall('part'))
+	
+	for full_part, part in zip(full_score.findall('part'), excerpt.findall('part')):
+		assert [m.get('number') for m in part] == numbers
+		
+		# the first measure of the excerpt gets the attributes, and otherwise the measures are the same as in the full score
+		assert part[0].find('attributes/time/beats').text == '4'
+		for measure, full_measure in zip(part, full_part[2:5]):
+			assert [ET.tostring(el) for el in measure if el.tag != 'attributes'] == [ET.tostring(el) for el in full_measure if el.tag != 'attributes']
+	
+	# a range past the end of the song only goes as far as the song does
+	excerpt = MMP_MusicXML_Converter(params={'measures': (11, 40)}).render(project)
+	assert [[m.get('number') for m in part] for part in excerpt.findall('part')] == [['11', '12']] * 3
+
+
+@pytest.mark.parametrize('filename', sorted(os.listdir(os.path.join(os.path.dirname(__file__), '..', '..', 'testfiles'))))
+def test_measure_range_whole_song(filename):
+	testfile = os.path.join(os.path.dirname(__file__), '..', '..', 'testfiles', filename)
+	full_score = MMP_MusicXML_Converter().convert_project(ParsedProject.load(testfile))
+	
+	# an excerpt with the whole song in it is the same as the full score, whether the project was read in with the range or not
+	converter = MMP_MusicXML_Converter(params={'measures': (1, 10000)})
+	assert converter.convert_project(ParsedProject.load(testfile)) == full_score
+	assert converter.convert_project(ParsedProject.load(testfile, measures=(1, 10000))) == full_score
@@ -2,7 +2,7 @@ import pytest
 import os
 import filecmp
 
-from ..converter import MMP_MusicXML_Converter
+from ..converter import MMP_MusicXML_Converter, split_key
 
 def test_a():
 	converter = MMP_MusicXML_Converter(key_signature='a')
@@ -136,5 +136,10 @@ def test_g_melodic_minor():
 	
 	os.remove(output)
 
+def test_split_key():
+	assert split_key('gm') == ('bb', 'gm')
+	assert split_key('fsm') == ('a', 'fsm')
+	assert split_key('d') == ('d', None)
+	assert split_key(None) == (None, None)
 
 # TODO: add tests for the other keys :)
\ No newline at end of file
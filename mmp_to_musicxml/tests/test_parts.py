@@ -0,0 +1,104 @@
+import pytest
+import argparse
+import json
+import os
+import shutil
+import xml.etree.ElementTree as ET
+
+from ..converter import MMP_MusicXML_Converter
+from ..parts import part_output, convert_parts, convert_many_parts
+from ..utils.project import ParsedProject
+
+TESTFILE = os.path.join(os.path.dirname(__file__), '..', '..', 'testfiles', 'funbgmXMLTESTsmall.mmp')
+
+def test_part_output():
+	taken = set()
+	assert part_output('projects/song.mmpz', 'violin', taken=taken) == 'song-violin.xml'
+	assert part_output('song.mmp', 'violin', taken=taken) == 'song-violin-2.xml' # two tracks with the same name
+	assert part_output('song.mmp', 'French Horn/2', '.mxl') == 'song-French_Horn_2.mxl'
+
+def test_render_parts():
+	project = ParsedProject.load(TESTFILE)
+	converter = MMP_MusicXML_Converter()
+	score, part_scores = converter.render_parts(project)
+	
+	# the full score is the same as rendering it by itself
+	full_score = MMP_MusicXML_Converter().render(project)
+	assert ET.tostring(score) == ET.tostring(full_score)
+	
+	parts = score.findall('part')
+	assert len(part_scores) == len(parts) > 1
+	
+	for (name, part_score), part in zip(part_scores, parts):
+		score_parts = part_score.findall('part-list/score-part')
+		assert len(score_parts) == 1
+		assert score_parts[0].get('id') == 'P1'
+		assert score_parts[0].find('part-name').text == name
+		
+		single_part = part_score.find('part')
+		assert single_part.get('id') == 'P1'
+		assert len(single_part) == len(part) # every part has as many measures as the full score
+		
+		attributes = single_part.find('measure/attributes')
+		assert attributes.find('key/fifths').text == '0'
+		assert attributes.find('time/beats').text == project.timesig_numerator
+
+def test_convert_parts(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	opts = argparse.Namespace(check=False, key=None, master=None, title=None, instruments='piano')
+	
+	results = convert_parts(TESTFILE, key_signature='d', params={'opts': opts})
+	assert [r.error for r in results] == [None, None]
+	assert [os.path.basename(r.output) for r in results] == ['funbgmXMLTESTsmall.xml', 'funbgmXMLTESTsmall-piano.xml']
+	
+	part = ET.parse(results[1].output).getroot()
+	assert part.find('part-list/score-part/part-name').text == 'piano'
+	assert part.find('part/measure/attributes/key/fifths').text == '2'
+	
+	results = convert_parts(TESTFILE, params={'opts': opts, 'mxl': True}, score=False)
+	assert [os.path.basename(r.output) for r in results] == ['funbgmXMLTESTsmall-piano.mxl']
+
+def test_convert_parts_profile(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	
+	results = convert_parts(TESTFILE, params={'profile': True})
+	assert all(r.error is None for r in results)
+	
+	with open(tmp_path / 'funbgmXMLTESTsmall.profile.json') as f:
+		report = json.load(f)
+	stage_names = [stage['stage'] for stage in report['stages']]
+	assert stage_names[0] == 'parse'
+	assert stage_names[-1] == 'write'
+
+def test_get_part_tracks():
+	# the part files get named before anything is converted, so this has to match what render_parts() makes
+	testfiles = os.path.join(os.path.dirname(__file__), '..', '..', 'testfiles')
+	
+	for name in sorted(os.listdir(testfiles)):
+		project = ParsedProject.load(os.path.join(testfiles, name))
+		
+		for measures in [None, (3, 6), (1000, 1001)]:
+			converter = MMP_MusicXML_Converter(params={'measures': measures})
+			_, part_scores = converter.render_parts(project)
+			assert [track.name for track in converter.get_part_tracks(project)] == [name for name, _ in part_scores]
+
+def test_convert_parts_collisions(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	opts = argparse.Namespace(check=False, key=None, master=None, title=None, instruments='piano')
+	
+	# a/song.mmp and b/song.mmp would write the same files, and so would other/song-piano.mmp's full score and song.mmp's piano part
+	for name in ['a', 'b', 'other']:
+		os.makedirs(tmp_path / name)
+	filepaths = [str(tmp_path / 'a' / 'song.mmp'), str(tmp_path / 'b' / 'song.mmp'), str(tmp_path / 'other' / 'song-piano.mmp')]
+	for filepath in filepaths:
+		shutil.copyfile(TESTFILE, filepath)
+	
+	results = convert_many_parts(filepaths, params={'opts': opts})
+	assert [r.error is None for r in results] == [False, False, False, False, False, True]
+	assert filepaths[1] in results[0].error and filepaths[2] in results[1].error
+	assert sorted(os.listdir(tmp_path)) == ['a', 'b', 'other', 'song-piano-piano.xml']
+
+def test_convert_parts_missing_file(tmp_path):
+	results = convert_parts(str(tmp_path / 'missing.mmp'))
+	assert len(results) == 1
+	assert results[0].output is None and results[0].error is not None
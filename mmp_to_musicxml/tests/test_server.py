@@ -0,0 +1,175 @@
+import pytest
+import asyncio
+import http.client
+import json
+import os
+import socket
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from ..converter import MMP_MusicXML_Converter
+from .. import server as server_module
+from ..server import ConversionServer, get_converter
+
+TEST_DIR = os.path.join(os.path.dirname(__file__), 'test_key_sig')
+
+@pytest.fixture
+def run_server():
+	# runs a server on its own event loop in another thread, so the tests can use normal blocking clients
+	servers = []
+	
+	def start(**kwargs):
+		server = ConversionServer(**kwargs)
+		loop = asyncio.new_event_loop()
+		started = threading.Event()
+		
+		def run():
+			asyncio.set_event_loop(loop)
+			loop.run_until_complete(server.start())
+			started.set()
+			loop.run_forever()
+			loop.run_until_complete(server.close())
+			loop.close()
+		
+		thread = threading.Thread(target=run)
+		thread.start()
+		started.wait(timeout=30)
+		servers.append((loop, thread))
+		return server
+	
+	yield start
+	
+	for loop, thread in servers:
+		loop.call_soon_threadsafe(loop.stop)
+		thread.join(timeout=30)
+
+def request(server, method, path, body=None):
+	connection = http.client.HTTPConnection('127.0.0.1', server.port, timeout=60)
+	connection.request(method, path, body=body)
+	response = connection.getresponse()
+	result = response.status, response.read()
+	connection.close()
+	return result
+
+def test_convert(run_server):
+	server = run_server(port=0, workers=1)
+	
+	for name in ['a.mmp', '../../../testfiles/3-4_time_test.mmp', 'd.mmp']:
+		with open(os.path.join(TEST_DIR, name), 'rb') as f:
+			project = f.read()
+		
+		# the worker's converter gets reused, but the result should be the same as a brand new one
+		status, body = request(server, 'POST', '/convert?key=d', project)
+		assert status == 200
+		assert body == MMP_MusicXML_Converter(key_signature='d').convert(project)
+	
+	status, body = request(server, 'POST', '/convert', b'not a project')
+	assert status == 422
+	assert 'error' in json.loads(body)
+	
+	assert request(server, 'GET', '/convert')[0] == 405
+	assert request(server, 'GET', '/nothing-here')[0] == 404
+	
+	status, body = request(server, 'GET', '/health')
+	stats = json.loads(body)
+	assert status == 200
+	assert stats['completed'] == 3
+	assert stats['failed'] == 1
+	assert stats['queued'] == 0
+
+def test_minor_key(run_server):
+	server = run_server(port=0, workers=1)
+	
+	with open(os.path.join(TEST_DIR, 'a.mmp'), 'rb') as f:
+		project = f.read()
+	
+	# f# minor has the same key signature as a major
+	status, body = request(server, 'POST', '/convert?key=fsm', project)
+	assert status == 200
+	assert b'<fifths>3</fifths>' in body
+	assert body == MMP_MusicXML_Converter(key_signature='a', params={'minor': 'fsm'}).convert(project)
+
+def test_get_converter(monkeypatch):
+	monkeypatch.setattr(server_module, '_CONVERTERS', server_module.OrderedDict())
+	monkeypatch.setattr(server_module, 'MAX_CONVERTERS', 2)
+	
+	# the title doesn't get a converter of its own
+	converter = get_converter({'key': 'd', 'title': 'first'})
+	assert converter.opts.title == 'first'
+	assert get_converter({'key': 'd', 'title': 'second'}) is converter
+	assert converter.opts.title == 'second'
+	assert get_converter({'key': 'd'}) is converter
+	assert converter.opts.title is None
+	
+	# only the most recently used converters are kept
+	get_converter({'key': 'g'})
+	get_converter({'key': 'd'})
+	get_converter({'key': 'a'})
+	assert len(server_module._CONVERTERS) == 2
+	assert get_converter({'key': 'd'}) is converter
+	assert get_converter({'key': 'g'}) is not converter
+
+def test_limits(run_server):
+	with open(os.path.join(TEST_DIR, 'a.mmp'), 'rb') as f:
+		project = f.read()
+	
+	server = run_server(port=0, max_queue=0)
+	assert request(server, 'POST', '/convert', project)[0] == 503
+	
+	server = run_server(port=0, timeout=0)
+	assert request(server, 'POST', '/convert', project)[0] == 504
+	
+	server = run_server(port=0, max_request_size=10)
+	assert request(server, 'POST', '/convert', project)[0] == 413
+
+def test_timed_out_conversion_stays_queued(monkeypatch):
+	# a conversion that timed out keeps running, so it should keep its place in the queue until it's done
+	release = threading.Event()
+	monkeypatch.setattr(server_module, 'convert_request', lambda data, options: release.wait(30) and b'done')
+	
+	server = ConversionServer(max_queue=1, timeout=0.05)
+	server.executor = ThreadPoolExecutor(max_workers=1)
+	
+	async def run():
+		assert (await server.convert(b'', {}))[0] == 504
+		assert server.queued == 1
+		assert (await server.convert(b'', {}))[0] == 503
+		
+		release.set()
+		for _ in range(100):
+			if server.queued == 0:
+				break
+			await asyncio.sleep(0.05)
+		assert server.queued == 0
+		
+		status, _, body = await server.convert(b'', {})
+		assert status == 200
+		assert body == b'done'
+	
+	try:
+		asyncio.run(run())
+	finally:
+		release.set()
+		server.executor.shutdown()
+	
+	assert server.counts['timed_out'] == 1
+	assert server.counts['rejected'] == 1
+	assert server.counts['completed'] == 1
+
+def test_unix_socket(run_server, tmp_path):
+	server = run_server(unix_socket=str(tmp_path / 'server.sock'))
+	
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+		client.connect(server.unix_socket)
+		client.sendall(b'GET /health HTTP/1.1\r\nHost: localhost\r\n\r\n')
+		response = b''
+		while True:
+			chunk = client.recv(4096)
+			if not chunk:
+				break
+			response += chunk
+	
+	headers, body = response.split(b'\r\n\r\n', 1)
+	assert headers.startswith(b'HTTP/1.1 200')
+	assert json.loads(body)['status'] == 'ok'
@@ -0,0 +1,102 @@
+import pytest
+import argparse
+import os
+import shutil
+import zipfile
+
+from ..converter import MMP_MusicXML_Converter
+from ..variants import OutputSpec, parse_spec, format_spec, default_output, convert_variants, convert_many_variants
+
+TESTFILE = os.path.join(os.path.dirname(__file__), '..', '..', 'testfiles', 'funbgmXMLTESTsmall.mmp')
+
+def test_parse_spec():
+	assert parse_spec('key=d, master=2,output=song-d.xml') == OutputSpec(output='song-d.xml', key='d', master='2')
+	assert parse_spec('instruments=violin+cello') == OutputSpec(instruments='violin+cello')
+	
+	with pytest.raises(ValueError):
+		parse_spec('color=blue')
+	with pytest.raises(ValueError):
+		parse_spec('key')
+
+def test_default_output():
+	assert default_output('projects/song.mmpz', OutputSpec(key='d', master='-2')) == 'song-d-master-2.xml'
+	assert default_output('song.mmp', OutputSpec(instruments='violin+cello')) == 'song-violin-cello.xml'
+	assert default_output('song.mmp', OutputSpec(key='d'), mxl=True) == 'song-d.mxl'
+	assert default_output('song.mmp', OutputSpec(title='Act 1: Overture')) == 'song-Act_1_Overture.xml'
+	
+	spec = OutputSpec(output='song-d.xml', key='d', master='2')
+	assert parse_spec(format_spec(spec)) == spec
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_convert_variants(tmp_path, monkeypatch, jobs):
+	# outputs without a path get written to the current directory
+	monkeypatch.chdir(tmp_path)
+	opts = argparse.Namespace(check=False, key='a', master=None, title='the title', instruments=None)
+	
+	specs = [
+		OutputSpec(),
+		OutputSpec(key='fsm', master='3', output='minor.xml'),
+		OutputSpec(instruments='piano', output='piano.mxl'),
+	]
+	results = convert_variants(TESTFILE, specs, params={'opts': opts}, jobs=jobs)
+	assert [r.error for r in results] == [None, None, None]
+	assert [os.path.basename(r.output) for r in results] == ['funbgmXMLTESTsmall.xml', 'minor.xml', 'piano.mxl']
+	
+	# every variant should be the same as converting it by itself, with the options from the command line as the defaults
+	with open(TESTFILE, 'rb') as f:
+		data = f.read()
+	
+	expected = [
+		MMP_MusicXML_Converter(key_signature='a', params={'opts': opts}).convert(data),
+		MMP_MusicXML_Converter(key_signature='a', params={'opts': argparse.Namespace(**{**vars(opts), 'key': 'fsm', 'master': '3'}), 'minor': 'fsm'}).convert(data),
+		MMP_MusicXML_Converter(key_signature='a', params={'opts': argparse.Namespace(**{**vars(opts), 'instruments': 'piano'})}).convert(data),
+	]
+	
+	with open(results[0].output, 'rb') as f:
+		assert f.read() == expected[0]
+	with open(results[1].output, 'rb') as f:
+		assert f.read() == expected[1]
+	with zipfile.ZipFile(results[2].output) as mxl:
+		assert mxl.read('score.xml') == expected[2]
+
+def test_convert_variants_mxl(tmp_path, monkeypatch):
+	# --mxl applies to every variant, including ones with an output that doesn't end in .mxl
+	monkeypatch.chdir(tmp_path)
+	
+	results = convert_variants(TESTFILE, [OutputSpec(key='d'), OutputSpec(output='other.xml')], params={'mxl': True})
+	assert [r.error for r in results] == [None, None]
+	assert [os.path.basename(r.output) for r in results] == ['funbgmXMLTESTsmall-d.mxl', 'other.xml']
+	assert all(zipfile.is_zipfile(r.output) for r in results)
+
+def test_convert_variants_profile(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	
+	results = convert_variants(TESTFILE, [OutputSpec(key='d'), OutputSpec(output='other.mxl')], params={'profile': True})
+	assert [r.error for r in results] == [None, None]
+	assert os.path.exists(tmp_path / 'funbgmXMLTESTsmall-d.profile.json')
+	assert os.path.exists(tmp_path / 'other.profile.json')
+
+def test_convert_variants_collisions(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	os.makedirs(tmp_path / 'a')
+	shutil.copyfile(TESTFILE, tmp_path / 'a' / 'song.mmp')
+	shutil.copyfile(TESTFILE, tmp_path / 'a' / 'other.mmp')
+	filepaths = [str(tmp_path / 'a' / 'song.mmp'), str(tmp_path / 'a' / 'other.mmp')]
+	
+	# the same output for both files, and two versions of the same file that only differ in what gets cleaned out of the title
+	specs = [OutputSpec(key='d', output='x.xml'), OutputSpec(title='one!'), OutputSpec(title='one?'), OutputSpec(key='g')]
+	results = convert_many_variants(filepaths, specs)
+	assert [r.error is None for r in results] == [False, False, False, True] * 2
+	assert filepaths[1] in results[0].error and filepaths[0] in results[4].error
+	assert 'title=one?' in results[1].error
+	
+	# only the versions that don't collide get written
+	assert sorted(os.listdir(tmp_path)) == ['a', 'other-g.xml', 'song-g.xml']
+	
+	# the title goes in the name, so versions with different titles don't collide
+	results = convert_variants(filepaths[0], [OutputSpec(title='one'), OutputSpec(title='two')])
+	assert [os.path.basename(r.output) for r in results] == ['song-one.xml', 'song-two.xml']
+
+def test_convert_variants_missing_file(tmp_path):
+	results = convert_variants(str(tmp_path / 'missing.mmp'), [OutputSpec(key='d'), OutputSpec(key='f')])
+	assert all(r.output is None and r.error is not None for r in results)
@@ -0,0 +1,102 @@
+import pytest
+import os
+import shutil
+import threading
+
+from ..watch import ProjectWatcher, watch
+
+TEST_DIR = os.path.join(os.path.dirname(__file__), 'test_key_sig')
+
+def touch(filepath, content=None, mtime=None):
+	if content is not None:
+		with open(filepath, 'wb') as f:
+			f.write(content)
+	if mtime is not None:
+		os.utime(filepath, (mtime, mtime))
+
+def test_project_watcher(tmp_path):
+	filepath = str(tmp_path / 'a.mmp')
+	shutil.copyfile(os.path.join(TEST_DIR, 'a.mmp'), filepath)
+	
+	watcher = ProjectWatcher([str(tmp_path)], debounce=1, convert_existing=False)
+	assert watcher.check(now=0) == []
+	
+	# a burst of saves only gets reported once it's been quiet for a while
+	touch(filepath, b'<?xml version="1.0"?>\n<lmms-project/>', mtime=100)
+	assert watcher.check(now=10) == []
+	touch(filepath, b'<?xml version="1.0"?>\n<lmms-project></lmms-project>', mtime=101)
+	assert watcher.check(now=10.5) == []
+	assert watcher.check(now=11) == []
+	assert watcher.check(now=11.5) == [filepath]
+	
+	# a file being converted waits until it's done
+	touch(filepath, b'<lmms-project/>', mtime=102)
+	assert watcher.check(now=20) == []
+	assert watcher.check(now=30) == []
+	watcher.finished(filepath)
+	assert watcher.check(now=31) == [filepath]
+	watcher.finished(filepath)
+	
+	# saving without changing anything doesn't count
+	touch(filepath, mtime=103)
+	assert watcher.check(now=40) == []
+	assert watcher.check(now=50) == []
+	
+	# new files do
+	new_filepath = str(tmp_path / 'new.mmpz')
+	touch(new_filepath, b'new')
+	assert watcher.check(now=60) == []
+	assert watcher.check(now=70) == [new_filepath]
+
+def test_watch(tmp_path, monkeypatch):
+	# output files get written to the current directory
+	monkeypatch.chdir(tmp_path)
+	shutil.copyfile(os.path.join(TEST_DIR, 'a.mmp'), tmp_path / 'a.mmp')
+	touch(str(tmp_path / 'broken.mmp'), b'not a project')
+	
+	results = []
+	stop = threading.Event()
+	
+	def on_result(result):
+		results.append(result)
+		if len(results) == 2:
+			stop.set()
+	
+	thread = threading.Thread(target=watch, args=([str(tmp_path)],), kwargs={'jobs': 1, 'interval': 0.05, 'debounce': 0, 'on_result': on_result, 'stop': stop})
+	thread.start()
+	thread.join(timeout=60)
+	assert not thread.is_alive()
+	
+	# the broken project doesn't stop the other one from being converted
+	results = {os.path.basename(r.filepath): r for r in results}
+	assert results['broken.mmp'].error is not None
+	assert results['a.mmp'].error is None
+	assert os.path.exists(tmp_path / 'a.xml')
+
+def test_watch_output_collisions(tmp_path, monkeypatch):
+	# a/song.mmp and b/song.mmp would both be written to song.xml, so neither one should be
+	monkeypatch.chdir(tmp_path)
+	for name in ['a', 'b']:
+		os.makedirs(tmp_path / 'in' / name)
+		shutil.copyfile(os.path.join(TEST_DIR, 'a.mmp'), tmp_path / 'in' / name / 'song.mmp')
+	shutil.copyfile(os.path.join(TEST_DIR, 'a.mmp'), tmp_path / 'in' / 'other.mmp')
+	
+	results = []
+	stop = threading.Event()
+	
+	def on_result(result):
+		results.append(result)
+		if len(results) == 3:
+			stop.set()
+	
+	thread = threading.Thread(target=watch, args=([str(tmp_path / 'in')],), kwargs={'jobs': 1, 'interval': 0.05, 'debounce': 0, 'on_result': on_result, 'stop': stop})
+	thread.start()
+	thread.join(timeout=60)
+	assert not thread.is_alive()
+	
+	results = {os.path.relpath(r.filepath, tmp_path / 'in'): r for r in results}
+	assert results[os.path.join('a', 'song.mmp')].error is not None
+	assert results[os.path.join('b', 'song.mmp')].error is not None
+	assert results['other.mmp'].error is None
+	assert not os.path.exists(tmp_path / 'song.xml')
+	assert os.path.exists(tmp_path / 'other.xml')
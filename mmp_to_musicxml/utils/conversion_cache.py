@@ -0,0 +1,150 @@
+"""
+for keeping converted files around so the same project doesn't get converted twice
+
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+class ConversionCache:
+	"""An on-disk cache of conversion results, keyed by the input file's contents and the conversion options
+
+	 Each entry is a single file in the cache directory named after its key.
+	 When the total size goes over max_size, the least recently used entries are removed
+	 (an entry's modification time is updated whenever it's used).
+	"""
+
+	HASH_CHUNK_SIZE = 1024 * 1024
+
+	# 1 GB
+	DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+	def __init__(self, directory: str, max_size=DEFAULT_MAX_SIZE):
+		self.directory = directory
+		self.max_size = max_size
+		self.hits = 0
+		self.misses = 0
+		os.makedirs(directory, exist_ok=True)
+
+	@staticmethod
+	def hash_file(filepath: str) -> str:
+		"""Get the sha256 of a file's contents, reading it a chunk at a time"""
+		file_hash = hashlib.sha256()
+		with open(filepath, "rb") as f:
+			for chunk in iter(lambda: f.read(ConversionCache.HASH_CHUNK_SIZE), b""):
+				file_hash.update(chunk)
+		return file_hash.hexdigest()
+
+	@staticmethod
+	def hash_bytes(data: bytes) -> str:
+		return hashlib.sha256(data).hexdigest()
+
+	@staticmethod
+	def make_key(content_hash: str, options: dict) -> str:
+		"""Combine the hash of the input with everything that affects the output
+
+		 Arguments:
+			- content_hash (str): hash of the input file's contents
+			- options (dict): every option that changes the output (must be json serializable)
+
+		 Returns the key as a hex string
+		"""
+		key_data = json.dumps({"content": content_hash, "options": options}, sort_keys=True)
+		return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+	def _path(self, key: str) -> str:
+		return os.path.join(self.directory, key)
+
+	def get(self, key: str):
+		"""Look up an entry, marking it as recently used
+
+		 Returns the path of the cached file, or None if there isn't one
+		"""
+		path = self._path(key)
+
+		try:
+			os.utime(path)
+		except FileNotFoundError:
+			self.misses += 1
+			return None
+
+		self.hits += 1
+		return path
+
+	def copy_to(self, key: str, destination) -> bool:
+		"""Copy an entry to a file path or binary file object
+
+		 Returns True if there was an entry to copy
+		"""
+		path = self.get(key)
+		if path is None:
+			return False
+
+		try:
+			if isinstance(destination, str):
+				shutil.copyfile(path, destination)
+			else:
+				with open(path, "rb") as f:
+					shutil.copyfileobj(f, destination)
+		except FileNotFoundError:
+			# removed by someone else in the meantime
+			self.hits -= 1
+			self.misses += 1
+			return False
+
+		return True
+
+	def put(self, key: str, source):
+		"""Add an entry, then remove old entries if the cache is too big
+
+		 Arguments:
+			- key (str): the entry's key from make_key()
+			- source (str or bytes): path of the file to add, or its contents
+		"""
+		# write to a temporary file first so nobody ever sees a partial entry
+		fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+		try:
+			with os.fdopen(fd, "wb") as tmp_file:
+				if isinstance(source, str):
+					with open(source, "rb") as f:
+						shutil.copyfileobj(f, tmp_file)
+				else:
+					tmp_file.write(source)
+			os.replace(tmp_path, self._path(key))
+		except BaseException:
+			os.unlink(tmp_path)
+			raise
+
+		self.evict()
+
+	def evict(self):
+		"""Remove the least recently used entries until the cache fits in max_size"""
+		entries = []
+		total_size = 0
+
+		with os.scandir(self.directory) as it:
+			for entry in it:
+				if entry.name.startswith(".tmp-") or not entry.is_file():
+					continue
+				stat = entry.stat()
+				entries.append((stat.st_mtime, stat.st_size, entry.path))
+				total_size += stat.st_size
+
+		entries.sort()
+		for mtime, size, path in entries:
+			if total_size <= self.max_size:
+				break
+			try:
+				os.remove(path)
+				logger.debug("removed %s from the conversion cache", path)
+			except FileNotFoundError:
+				pass
+			total_size -= size
+
+	def stats(self) -> dict:
+		return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,84 @@
+"""
+for collecting the problems found during a conversion in one place instead of logging each one as it happens
+
+"""
+import logging
+
+class ConversionDiagnostics:
+	"""Counts of the problems found during a conversion, per instrument
+
+	 Only the first few locations of each kind of problem are kept for each instrument,
+	 so a project with thousands of problem notes doesn't use up a lot of memory.
+	"""
+
+	# max number of locations to keep per instrument for each kind of problem
+	MAX_LOCATIONS = 10
+
+	def __init__(self, max_locations=None):
+		if max_locations is not None:
+			self.MAX_LOCATIONS = max_locations
+
+		# instrument name -> {"count": int, "locations": [str]}
+		self.out_of_range = {}
+		self.truncated = {}
+
+	def _add(self, problems: dict, instrument: str, location: str):
+		if instrument not in problems:
+			problems[instrument] = {"count": 0, "locations": []}
+
+		entry = problems[instrument]
+		entry["count"] += 1
+		if len(entry["locations"]) < self.MAX_LOCATIONS:
+			entry["locations"].append(location)
+
+	def add_out_of_range(self, instrument: str, note: str, measure_num: int):
+		"""Record a note that's outside of the usual range of its instrument, i.e. add_out_of_range("flute", "C3", 4)"""
+		self._add(self.out_of_range, instrument, f"{note} in measure {measure_num}")
+
+	def add_truncated(self, instrument: str, measure_num: int):
+		"""Record a note that got cut short because it goes past the end of its measure"""
+		self._add(self.truncated, instrument, f"measure {measure_num}")
+
+	def merge(self, other: "ConversionDiagnostics"):
+		"""Add everything recorded by another ConversionDiagnostics (i.e. for a single track) to this one"""
+		for problems, other_problems in ((self.out_of_range, other.out_of_range), (self.truncated, other.truncated)):
+			for instrument, other_entry in other_problems.items():
+				if instrument not in problems:
+					problems[instrument] = {"count": 0, "locations": []}
+
+				entry = problems[instrument]
+				entry["count"] += other_entry["count"]
+				entry["locations"].extend(other_entry["locations"][:self.MAX_LOCATIONS - len(entry["locations"])])
+
+	def __bool__(self) -> bool:
+		return bool(self.out_of_range or self.truncated)
+
+	def to_dict(self) -> dict:
+		return {"out_of_range": self.out_of_range, "truncated": self.truncated}
+
+	@classmethod
+	def from_dict(cls, data: dict) -> "ConversionDiagnostics":
+		"""Create a ConversionDiagnostics from the output of to_dict()"""
+		diagnostics = cls()
+		for instrument, entry in data["out_of_range"].items():
+			diagnostics.out_of_range[instrument] = {"count": entry["count"], "locations": list(entry["locations"])}
+		for instrument, entry in data["truncated"].items():
+			diagnostics.truncated[instrument] = {"count": entry["count"], "locations": list(entry["locations"])}
+		return diagnostics
+
+	def summary(self) -> str:
+		"""Describe the problems in a few lines, one per instrument and kind of problem"""
+		lines = []
+
+		for description, problems in (("notes out of range", self.out_of_range), ("notes truncated", self.truncated)):
+			for instrument, entry in problems.items():
+				more = ", ..." if entry["count"] > len(entry["locations"]) else ""
+				lines.append(f"{instrument}: {entry['count']} {description} ({', '.join(entry['locations'])}{more})")
+
+		return "\n".join(lines)
+
+	def log(self, logger: logging.Logger, level=logging.WARNING):
+		"""Log the summary, if there's anything to report"""
+		if self and logger.isEnabledFor(level):
+			for line in self.summary().splitlines():
+				logger.log(level, "%s", line)
@@ -2,8 +2,7 @@
 for getting the right notes given a key signature
 
 """
-import logging
-from typing import List, Dict
+from typing import Dict, Sequence, Tuple
 
 class KeySignatureNoteFinder:
 	
@@ -64,20 +63,83 @@ class KeySignatureNoteFinder:
 		'cs': ['C#', 'D#', 'E#', 'F#', 'G#', 'A#', 'B#', 'F##', 'G##'],
 	}
 	
-	NUM_KEYS = 86 # 12 notes * 8 octaves
+	NUM_KEYS = 128 # every midi key
 	
 	NOTE_LIST = None
+	
+	# maps every key number to a tuple of the MusicXML step, alter (None if there isn't one) and octave, as strings
+	SPELLING_TABLE = None
 
 	KEY_SIGNATURE = ''
 	
+	# note lists and spelling tables that have already been worked out for each key signature.
+	# they never change, so every KeySignatureNoteFinder in the process shares them
+	NOTE_LISTS = {}
+	SPELLING_TABLES = {}
+	
 	# how far from the tonic note the diatonic notes in a scale are
 	DIATONIC_OFFSETS = [0, 2, 4, 5, 7, 9, 11]
 
 	def __init__(self, key_signature='c'):
-		logging.basicConfig(level=logging.DEBUG)
 		self.KEY_SIGNATURE = key_signature
-		self.NOTE_LIST = []
-		self.__calculate_note_list()
+		
+		if key_signature not in self.NOTE_LISTS:
+			self.NOTE_LIST = []
+			self.__calculate_note_list()
+			self.NOTE_LISTS[key_signature] = tuple(self.NOTE_LIST)
+		
+		self.NOTE_LIST = self.NOTE_LISTS[key_signature]
+		self.SPELLING_TABLE = self.get_spelling_table(key_signature)
+
+	@classmethod
+	def get_spelling_table(cls, key_signature='c') -> Tuple[Tuple[str, str, str], ...]:
+		"""Get how every key should be written in a key signature, working it out the first time it's needed
+		
+		 Arguments:
+			- key_signature (str): i.e. 'c' or 'bb'
+		
+		 Returns a tuple with a (step, alter, octave) tuple for each key number from 0 to NUM_KEYS - 1
+		"""
+		if key_signature not in cls.SPELLING_TABLES:
+			cls.SPELLING_TABLES[key_signature] = tuple(cls.spell_key(key_signature, key) for key in range(cls.NUM_KEYS))
+		
+		return cls.SPELLING_TABLES[key_signature]
+	
+	@classmethod
+	def spell_key(cls, key_signature: str, key: int) -> Tuple[str, str, str]:
+		"""Work out how a key should be written in a key signature (this also works for keys outside of the spelling tables)
+		
+		 Arguments:
+			- key_signature (str): i.e. 'c' or 'bb'
+			- key (int): the key number, where 0 is C0
+		
+		 Returns a tuple of the MusicXML step (i.e. "B"), alter ("2", "1", "-1" or None) and octave (i.e. "4")
+		"""
+		note_candidates = cls.NOTES[key % 12]
+		note = note_candidates[0]
+		
+		if key_signature in cls.KEY_SIGNATURE_TABLE:
+			# find right enharmonic based on key signature
+			for candidate in note_candidates:
+				if candidate in cls.KEY_SIGNATURE_TABLE[key_signature]:
+					note = candidate
+		
+		if len(note) == 3 and note[1] == "#":
+			alter = "2" # double-sharp
+		elif len(note) > 1 and note[1] == "#":
+			alter = "1"
+		elif len(note) > 1 and note[1] == "b":
+			alter = "-1"
+		else:
+			alter = None
+		
+		# B# and Cb are written in a different octave than the key they're on, i.e. B#3 is the same key as C4
+		if note == "B#":
+			key -= 12
+		elif note == "Cb":
+			key += 12
+		
+		return note[0], alter, str(key // 12)
 
 	def __calculate_note_list(self):
 		tonic_pos = self.NOTE_START_POSITIONS[self.KEY_SIGNATURE]
@@ -86,7 +148,7 @@ class KeySignatureNoteFinder:
 		octave = -1
 		
 		# i represents the number of a piano key
-		for i in range(offset, self.NUM_KEYS + 1):
+		for i in range(offset, self.NUM_KEYS):
 			if i < 0:
 				dist_from_tonic += 1
 				if dist_from_tonic > 11:
@@ -125,8 +187,12 @@ class KeySignatureNoteFinder:
 
 		#print(self.NOTE_LIST)
 		
-	def get_note_list(self) -> List[Dict]:
+	def get_note_list(self) -> Sequence[Dict]:
 		return self.NOTE_LIST
 		
 	def get_note_based_on_key(self, key_num: int) -> str:
 		return self.NOTE_LIST[key_num]
+
+# every key signature's spelling table gets worked out once, when this is first imported
+for _key_signature in KeySignatureNoteFinder.KEY_SIGNATURE_TABLE:
+	KeySignatureNoteFinder.get_spelling_table(_key_signature)
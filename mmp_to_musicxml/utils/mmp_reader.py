@@ -0,0 +1,201 @@
+"""
+for reading in .mmp (and compressed .mmpz) files without keeping the parts of the project we don't use
+
+"""
+import io
+import zlib
+import xml.etree.ElementTree as ET
+
+# the only elements the converter actually looks at.
+# everything else (instrument plugins, effects, automation, ui state, etc.) gets thrown away
+# as soon as the parser is done with it, unless it contains one of these elements
+# (e.g. the trackcontainer of a beat/bassline track holds more tracks).
+KEEP_TAGS = frozenset([
+	"head",
+	"track",
+	"instrumenttrack",
+	"pattern",
+	"note",
+])
+
+# the length of a quarter note in LMMS. a measure is (time signature numerator * this) long
+QUARTER_NOTE_LENGTH = 48
+
+class MMPZReader(io.RawIOBase):
+	"""Read-only file object that decompresses an .mmpz file as it's being read
+
+	 LMMS compresses projects with Qt's qCompress, which is a zlib stream with the
+	 uncompressed size stored in front of it as a 4-byte big-endian integer.
+	 Only one chunk of compressed data is held at a time.
+	"""
+
+	CHUNK_SIZE = 64 * 1024
+
+	def __init__(self, fileobj):
+		self._file = fileobj
+		self._file.read(4) # skip the uncompressed size, we don't need it
+		self._decompressor = zlib.decompressobj()
+		self._pending = b""
+
+	def readable(self) -> bool:
+		return True
+
+	def readinto(self, buffer) -> int:
+		size = len(buffer)
+
+		while not self._pending:
+			if self._decompressor.unconsumed_tail:
+				self._pending = self._decompressor.decompress(self._decompressor.unconsumed_tail, size)
+			elif self._decompressor.eof:
+				return 0
+			else:
+				chunk = self._file.read(self.CHUNK_SIZE)
+				if not chunk:
+					self._pending = self._decompressor.flush()
+					if not self._pending:
+						raise EOFError("compressed .mmpz data ended unexpectedly")
+				else:
+					self._pending = self._decompressor.decompress(chunk, size)
+
+		data = self._pending[:size]
+		self._pending = self._pending[size:]
+		buffer[:len(data)] = data
+		return len(data)
+
+	def close(self):
+		self._file.close()
+		super().close()
+
+def open_mmp(filepath: str):
+	"""Open an .mmp or .mmpz file for reading
+
+	 Arguments:
+		- filepath (str): path to the project file
+
+	 Returns a binary file object with the project's uncompressed XML
+	"""
+	file = open(filepath, "rb")
+
+	if filepath.lower().endswith(".mmpz"):
+		return MMPZReader(file)
+
+	return file
+
+class _PrefixedReader(io.RawIOBase):
+	"""Read-only file object that gives back some already-read bytes before the rest of a file"""
+
+	def __init__(self, prefix: bytes, fileobj):
+		self._prefix = prefix
+		self._file = fileobj
+
+	def readable(self) -> bool:
+		return True
+
+	def readinto(self, buffer) -> int:
+		if self._prefix:
+			data = self._prefix[:len(buffer)]
+			self._prefix = self._prefix[len(data):]
+		else:
+			data = self._file.read(len(buffer))
+
+		buffer[:len(data)] = data
+		return len(data)
+
+def open_mmp_stream(fileobj):
+	"""Get a file object with the uncompressed xml of an .mmp or .mmpz project from an already open file
+
+	 Since there's no file name to go by, compressed data is recognized by its contents:
+	 an .mmp starts with the xml (usually "<?xml"), while an .mmpz starts with the 4-byte size
+	 and then the zlib header, which is 0x78.
+	 The given file object isn't closed when the returned one is.
+
+	 Arguments:
+		- fileobj (file object): a binary or text file object. text is always treated as an .mmp
+
+	 Returns a file object that can be passed to read_mmp()
+	"""
+	if isinstance(fileobj, io.TextIOBase):
+		return fileobj
+
+	head = fileobj.read(5)
+	stream = _PrefixedReader(head, fileobj)
+
+	if len(head) == 5 and head[4] == 0x78 and head[0] not in b" \t\r\n<\xef":
+		return MMPZReader(stream)
+
+	return stream
+
+def read_mmp(source, tracks=None, measures=None) -> ET.ElementTree:
+	"""Parse an .mmp file, keeping only the head, track, instrumenttrack, pattern and note elements
+
+	 The project is read incrementally so unused subtrees are dropped while parsing instead of
+	 after the whole document has been built, which means memory use depends on the number of notes
+	 in the project rather than the size of the file.
+	 
+	 Patterns that can't have any notes the converter needs (because they aren't in one of the given tracks,
+	 or their pos and len put them outside of the given measures) are decided on as soon as they start,
+	 and their notes are thrown away as they're parsed. The patterns themselves are kept, without any notes.
+	 Patterns skipped because of the measures get the position of the last note they had in a lastnote attribute,
+	 so the end of the song is still known.
+	 Notes past the end of their pattern (which LMMS doesn't play) count as outside of the pattern.
+
+	 Arguments:
+		- source (str or file object): the .mmp file to read (see open_mmp() for .mmpz files)
+		- tracks (set): names of the tracks to keep the notes of. a pattern is kept if any track it's in
+		  (i.e. a beat/bassline track or one inside it) has one of these names. None keeps every track's notes
+		- measures (tuple): (first, last) measure numbers to keep the notes of. None keeps every measure
+
+	 Returns an ElementTree with the same track/pattern/note structure as the original file
+	"""
+	root = None
+	stack = []
+	skipping = None # the pattern whose notes are being thrown away
+	last_note = None # if it's outside of the measures, the position of the last note thrown away from it (-1 before the first one)
+	start_pos = end_pos = None # the positions the measures cover, once the time signature is known
+
+	for event, el in ET.iterparse(source, events=("start", "end")):
+		if event == "start":
+			if root is None:
+				root = el
+			elif measures and el.tag == "head":
+				measure_length = QUARTER_NOTE_LENGTH * int(el.attrib["timesig_numerator"])
+				start_pos = (measures[0] - 1) * measure_length
+				end_pos = measures[1] * measure_length
+			elif el.tag == "pattern" and skipping is None:
+				if tracks is not None and not any(parent.tag == "track" and parent.attrib.get("name") in tracks for parent in stack):
+					skipping = el
+				elif start_pos is not None:
+					pattern_pos = int(el.attrib["pos"])
+					pattern_end = pattern_pos + int(el.attrib["len"]) if "len" in el.attrib else None
+					if pattern_pos >= end_pos or (pattern_end is not None and pattern_end <= start_pos):
+						skipping = el
+						last_note = -1
+			stack.append(el)
+			continue
+
+		stack.pop()
+
+		# whitespace between elements is never used
+		el.tail = None
+
+		if skipping is not None:
+			if el is skipping:
+				if last_note is not None and last_note >= 0:
+					el.set("lastnote", str(last_note))
+				skipping = last_note = None
+			else:
+				if el.tag == "note" and last_note is not None:
+					last_note = max(int(el.attrib["pos"]), last_note)
+				# it's always the last child of its parent, like below
+				del stack[-1][-1]
+			continue
+
+		if el.tag in KEEP_TAGS or not stack:
+			continue
+
+		if len(el) == 0:
+			# nothing we need is inside this element. it's always the last child
+			# of its parent at this point since its siblings haven't been parsed yet
+			del stack[-1][-1]
+
+	return ET.ElementTree(root)
@@ -0,0 +1,49 @@
+"""
+compact representation of a note from an .mmp file
+
+"""
+import xml.etree.ElementTree as ET
+
+class Note:
+	"""A single note, with everything the converter needs already parsed into ints
+
+	 A note element in an .mmp file looks like <note pan="-38" key="53" vol="59" pos="384" len="192"/>,
+	 where pos is relative to the pattern the note is in. Here pos is the absolute position in the song
+	 and measure is the (1-based) number of the measure the note falls in.
+	"""
+
+	__slots__ = ("pos", "len", "key", "vol", "measure")
+
+	def __init__(self, pos: int, len: int, key: int, vol=100, measure=1):
+		self.pos = pos
+		self.len = len
+		self.key = key
+		self.vol = vol
+		self.measure = measure
+
+	@classmethod
+	def from_element(cls, note: ET.Element, pattern_pos=0, measure=1) -> "Note":
+		"""Create a Note from a note element of an .mmp file
+
+		 Arguments:
+			- note (ElementTree element node): the note element
+			- pattern_pos (int): position of the pattern the note belongs to
+			- measure (int): the measure the note falls in
+
+		 Returns a new Note
+		"""
+		attrib = note.attrib
+		return cls(
+			pattern_pos + int(attrib["pos"]),
+			int(attrib["len"]),
+			int(attrib["key"]),
+			int(attrib.get("vol", 100)),
+			measure,
+		)
+
+	def __reduce__(self):
+		# much quicker to pickle than the default for __slots__ (i.e. when sending tracks to other processes)
+		return (Note, (self.pos, self.len, self.key, self.vol, self.measure))
+
+	def __repr__(self) -> str:
+		return f"Note(pos={self.pos}, len={self.len}, key={self.key}, vol={self.vol}, measure={self.measure})"
@@ -5,6 +5,8 @@ many thanks to https://www.vsl.info/en/academy/index for providing instrument ra
 """
 import logging
 
+logger = logging.getLogger(__name__)
+
 class NoteChecker:
 
     # using # instad of b to match the note options in converter.pyg
@@ -34,9 +36,17 @@ class NoteChecker:
     }
     
     notes = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B'] # order matters!
+    
+    # instrument name -> (lowest key, highest key) where a key is octave * 12 + the note's index in notes (i.e. C4 is 48),
+    # the same numbering the converter uses. worked out from instrument_ranges when the first NoteChecker is created
+    key_ranges = None
 
     def __init__(self):
-        logging.basicConfig(level=logging.DEBUG)
+        if NoteChecker.key_ranges is None:
+            NoteChecker.key_ranges = {
+                instrument_name: (self.note_to_key(note_range["min"]), self.note_to_key(note_range["max"]))
+                for instrument_name, note_range in self.instrument_ranges.items()
+            }
         
     # we can use the index of note in notes as a 'weight' so we can easily compare with other notes whether it comes before or after
     def get_note_weight(self, note: str):
@@ -54,40 +64,47 @@ class NoteChecker:
             
         return None, None
     
+    def note_to_key(self, note: str) -> int:
+        """Turn a note like "A#2" into a key number (see key_ranges)"""
+        note_name, octave = self.extract_note_and_octave(note)
+        return octave * 12 + self.notes.index(note_name)
+    
+    def evaluate_key(self, instrument_name: str, key: int) -> bool:
+        """Check if a key number (see key_ranges) is in the usual range of an instrument
+        
+         Instruments without a known range always pass.
+        """
+        if instrument_name not in self.key_ranges:
+            return True
+        
+        lowest_key, highest_key = self.key_ranges[instrument_name]
+        return lowest_key <= key <= highest_key
     
     def evaluate_note(self, instrument_name: str, note: str, octave: int, location=""):
-        if instrument_name not in self.instrument_ranges:
+        if instrument_name not in self.key_ranges:
             #TODO: maybe log a warning that this instrument doesn't exist?
             return
-            
-        valid_note = True
-            
-        min_note, min_octave = self.extract_note_and_octave(self.instrument_ranges[instrument_name]["min"])
-        max_note, max_octave = self.extract_note_and_octave(self.instrument_ranges[instrument_name]["max"])
-        #print(f"min note: {min_note}, min octave: {min_octave}, max note: {max_note}, max octave: {max_octave}")
         
-        # check if note octave falls in the octave range first
-        if octave < min_octave or octave > max_octave:
-            valid_note = False
-        
-        # if octaves are the same, then check the note (e.g. A1 should be considered invalid if the range min is D1)
-        if octave == min_octave and self.get_note_weight(note) < self.get_note_weight(min_note):
-            # e.g. if min is D3 and note is A3
-            valid_note = False
-            
-        if octave == max_octave and self.get_note_weight(note) > self.get_note_weight(max_note):
-            # e.g. if max is D3 and note is F3
-            valid_note = False
-
-        # special case for sharp min note and same octave
-        if self.is_sharp(min_note) and octave == min_octave:
-            if not self.is_sharp(note) and self.get_note_weight(note) == self.get_note_weight(min_note):
-                # if note is like A1 but min note is A#1
-                valid_note = False
+        valid_note = self.evaluate_key(instrument_name, octave * 12 + self.notes.index(note))
                 
         if not valid_note:
-            logging.debug(f"Warning: {note}{octave} is not within the expected range for {instrument_name}. @{location}")
+            logger.debug("%s%s is not within the expected range for %s. @%s", note, octave, instrument_name, location)
             return False
             
         return valid_note
+    
+    def find_out_of_range(self, instrument_name: str, keys: list, measures: list) -> list:
+        """Check all the notes of a track at once
+        
+         Arguments:
+            - instrument_name (str): name of the track's instrument
+            - keys (list): the key number (see key_ranges) of each note
+            - measures (list): the measure number of each note
+            
+         Returns a list of (key, measure number) tuples for the notes outside of the instrument's range, in order
+        """
+        if instrument_name not in self.key_ranges:
+            return []
         
+        lowest_key, highest_key = self.key_ranges[instrument_name]
+        return [(key, measure) for key, measure in zip(keys, measures) if key < lowest_key or key > highest_key]
@@ -0,0 +1,136 @@
+"""
+for recording how long each stage of a conversion takes and how much memory it allocates
+
+"""
+import json
+import time
+import tracemalloc
+
+class StageProfiler:
+	"""Records the wall time and memory of each stage of a conversion, optionally per track
+
+	 Stages are recorded like laps on a stopwatch: start() starts the clock and each call to
+	 lap() records everything since the previous lap as a stage with the given name.
+	 When disabled, every method returns right away so the cost is just a function call.
+
+	 When enabled, tracemalloc is started (if it isn't running already) so memory can be measured,
+	 which does slow things down a bit - so times should only be compared with other profiled runs.
+	"""
+
+	def __init__(self, enabled=False):
+		self.enabled = enabled
+		self.stages = []
+		self._started_tracemalloc = False
+		self._start_time = None
+		self._last_time = None
+		self._last_memory = 0
+		self._total_seconds = None
+		self._paused_at = None
+
+	def __getstate__(self):
+		# a copy sent to another process (i.e. for converting tracks in parallel) can't report
+		# back what it records, so it doesn't need to record anything
+		return {"enabled": False}
+
+	def __setstate__(self, state):
+		self.__init__(**state)
+
+	def start(self):
+		"""Clear any previous results and start profiling a new conversion"""
+		if not self.enabled:
+			return
+
+		self.stages = []
+		if not tracemalloc.is_tracing():
+			tracemalloc.start()
+			self._started_tracemalloc = True
+
+		tracemalloc.reset_peak()
+		self._last_memory = tracemalloc.get_traced_memory()[0]
+		self._start_time = self._last_time = time.perf_counter()
+
+	def lap(self, name: str, track=None):
+		"""Record everything since the previous lap (or since start()) as a stage
+
+		 Arguments:
+			- name (str): name of the stage, i.e. "parse"
+			- track (str): name of the track, if the stage is for a single track
+		"""
+		if not self.enabled:
+			return
+
+		now = time.perf_counter()
+		memory, peak_memory = tracemalloc.get_traced_memory()
+
+		self.stages.append({
+			"stage": name,
+			"track": track,
+			"seconds": now - self._last_time,
+			"memory_allocated": memory - self._last_memory,
+			"memory_peak": peak_memory - self._last_memory,
+		})
+
+		tracemalloc.reset_peak()
+		self._last_memory = memory
+		self._last_time = time.perf_counter() # don't count the time spent recording
+
+	def pause(self):
+		"""Stop the clock until resume(), i.e. while other conversions are being worked on"""
+		if not self.enabled:
+			return
+
+		self._paused_at = time.perf_counter()
+
+	def resume(self):
+		"""Start the clock again after pause(), without counting the time in between"""
+		if not self.enabled or self._paused_at is None:
+			return
+
+		# another profiler that was running at the same time might have stopped tracemalloc
+		if not tracemalloc.is_tracing():
+			tracemalloc.start()
+			self._started_tracemalloc = True
+
+		tracemalloc.reset_peak()
+		self._last_memory = tracemalloc.get_traced_memory()[0]
+
+		now = time.perf_counter()
+		self._start_time += now - self._paused_at
+		self._last_time = now
+		self._paused_at = None
+
+	def stop(self):
+		"""Stop profiling, which stops tracemalloc if start() was the one to start it"""
+		if not self.enabled:
+			return
+
+		self._total_seconds = time.perf_counter() - self._start_time
+		if self._started_tracemalloc:
+			tracemalloc.stop()
+			self._started_tracemalloc = False
+
+	def report(self) -> dict:
+		"""Summarize the recorded stages
+
+		 Returns a dict with every stage in the order they happened,
+		 plus the total time for each stage name and for each track
+		"""
+		stage_totals = {}
+		track_totals = {}
+
+		for stage in self.stages:
+			stage_totals[stage["stage"]] = stage_totals.get(stage["stage"], 0) + stage["seconds"]
+			if stage["track"] is not None:
+				track_totals[stage["track"]] = track_totals.get(stage["track"], 0) + stage["seconds"]
+
+		return {
+			"total_seconds": self._total_seconds,
+			"stage_seconds": stage_totals,
+			"track_seconds": track_totals,
+			"stages": self.stages,
+		}
+
+	def write(self, filepath: str):
+		"""Write the report to a json file"""
+		with open(filepath, "w") as f:
+			json.dump(self.report(), f, indent=2)
@@ -0,0 +1,209 @@
+"""
+the parts of an .mmp project the converter needs, read in once so the project can be converted any number of times
+
+"""
+import xml.etree.ElementTree as ET
+
+from bisect import bisect_left, bisect_right
+from typing import List, Tuple
+
+from .mmp_reader import QUARTER_NOTE_LENGTH, open_mmp, read_mmp
+from .note import Note
+
+def parse_measure_range(measures: str) -> Tuple[int, int]:
+	"""Turn a string like "9-16" (or just "9" for a single measure) into a tuple of the first and last measure numbers
+
+	 Raises ValueError if the string can't be understood
+	"""
+	first, _, last = measures.partition("-")
+	try:
+		first = int(first)
+		last = int(last) if last.strip() else first
+	except ValueError:
+		raise ValueError(f"expected a measure range like 9-16, got {measures!r}") from None
+
+	if first < 1 or last < first:
+		raise ValueError(f"invalid measure range {measures!r} (measures start at 1 and the last one can't come before the first)")
+
+	return first, last
+
+class ParsedTrack:
+	"""A track from an .mmp file, with its notes sorted by position
+
+	 Nothing here gets changed by the converter, so the same track can be converted with different settings
+	 (i.e. key signature or master pitch) as many times as needed.
+	"""
+
+	__slots__ = ("name", "muted", "has_patterns", "instrument", "notes", "measures", "measure_numbers", "end_measure")
+
+	def __init__(self, name: str, muted=False, has_patterns=False, instrument=None, notes=None, end_measure=None):
+		self.name = name
+		self.muted = muted
+		self.has_patterns = has_patterns # whether the track has any patterns of its own (i.e. not in a nested track)
+		self.instrument = instrument # the attributes of the instrumenttrack element (pan, vol, pitch), if there is one
+		self.notes = notes if notes is not None else [] # Notes sorted by position, which know what measure they're in
+		
+		# the same notes bucketed by measure number (still sorted by position within each measure),
+		# so the notes of a few measures can be found without going through the whole track
+		self.measures = {}
+		for note in self.notes:
+			if note.measure in self.measures:
+				self.measures[note.measure].append(note)
+			else:
+				self.measures[note.measure] = [note]
+		
+		self.measure_numbers = sorted(self.measures) # the measures that have notes in them
+		
+		# the last measure with notes in it. this is still known when
+		# the notes of some patterns weren't read in (see read_mmp())
+		self.end_measure = max(end_measure or 0, self.last_measure)
+
+	@classmethod
+	def from_element(cls, track: ET.Element, measure_length: int) -> "ParsedTrack":
+		"""Read in a track element from an .mmp file
+
+		 Arguments:
+			- track (ElementTree element node): the track element
+			- measure_length (int): the length of a measure in LMMS
+
+		 Returns a new ParsedTrack
+		"""
+		instrumenttrack = track.find("instrumenttrack")
+
+		# the last measure with notes in it, for the patterns whose notes weren't read in
+		end_measure = max(((int(p.attrib["pos"]) + int(p.attrib["lastnote"])) // measure_length + 1 for p in track.iter(tag = 'pattern') if "lastnote" in p.attrib), default=0)
+
+		return cls(
+			track.attrib["name"],
+			track.attrib["muted"] == "1",
+			track.find("pattern") is not None,
+			dict(instrumenttrack.attrib) if instrumenttrack is not None else None,
+			cls.read_notes(track, measure_length),
+			end_measure,
+		)
+
+	@staticmethod
+	def read_notes(track: ET.Element, measure_length: int) -> List[Note]:
+		"""Get the notes of every pattern in a track, sorted by position
+
+		 Arguments:
+			- track (ElementTree element node): the track element
+			- measure_length (int): the length of a measure in LMMS
+
+		 Returns a list of Notes
+		"""
+		pattern_notes = [] # list of Notes, which also know what measure they're in
+
+		# concatenate all the patterns and get their notes all in one list
+		for pattern in track.iter(tag = 'pattern'):
+			# get the position of the pattern. note that a pattern might not start at position 0!
+			# another LMMS xml file property -> every measure is of length (time signature numerator * 48), so each measure's position
+			# is a multiple of that product
+			chunk_pos = int(pattern.attrib["pos"])
+			measure_num = int(chunk_pos/measure_length) + 1 # patterns always start on a multiple of 192
+
+			for n in pattern.iter(tag = 'note'):
+				# because each note's position is relative to their pattern, each note's position should be their pattern pos + note pos
+				# but an important piece of information is what measure this note falls in.
+				# the attributes only get converted to ints once, here
+				note = Note.from_element(n, chunk_pos)
+				new_pos = note.pos
+
+				# increment measure num if needed
+				if new_pos >= (measure_num*measure_length):
+					# if note is within the next measure over
+					if new_pos < ((measure_num+1)*measure_length):
+						measure_num += 1
+					else:
+						# the newPos might actually be a few measures over, not just the next measure!
+						# need to add 1 because positions start at 0
+						measure_num = (new_pos // measure_length) + 1
+
+				note.measure = measure_num
+				pattern_notes.append(note)
+
+		# sort the notes in the list by position
+		return sorted(pattern_notes, key=lambda n: n.pos)
+
+	@property
+	def last_measure(self) -> int:
+		"""The number of the last measure with notes in it (0 if there aren't any notes)"""
+		return self.measure_numbers[-1] if self.measure_numbers else 0
+
+	def notes_in_measures(self, first: int, last: int) -> List[Note]:
+		"""Get the notes in a range of measures, measure by measure
+		
+		 Arguments:
+			- first (int): number of the first measure in the range
+			- last (int): number of the last measure in the range (included)
+		
+		 Returns a list of Notes
+		"""
+		start = bisect_left(self.measure_numbers, first)
+		end = bisect_right(self.measure_numbers, last)
+		
+		notes = []
+		for measure_num in self.measure_numbers[start:end]:
+			notes.extend(self.measures[measure_num])
+		return notes
+
+	def __reduce__(self):
+		# the measure index gets built again from the notes instead of being pickled
+		return (ParsedTrack, (self.name, self.muted, self.has_patterns, self.instrument, self.notes, self.end_measure))
+
+	def __repr__(self) -> str:
+		return f"ParsedTrack(name={self.name!r}, muted={self.muted}, notes={len(self.notes)})"
+
+class ParsedProject:
+	"""Everything the converter needs from an .mmp project
+
+	 Reading a project (parsing the xml, getting every track's notes and sorting them) is done once here,
+	 then the project can be converted by any number of converters with different settings, i.e.
+
+		project = ParsedProject.load("song.mmp")
+		for key in ["c", "d", "bb"]:
+			MMP_MusicXML_Converter(key_signature=key).convert_project(project, open(f"song-{key}.xml", "wb"))
+	"""
+
+	def __init__(self, timesig_numerator="4", timesig_denominator="4", master_pitch=0, tracks=None):
+		self.timesig_numerator = timesig_numerator
+		self.timesig_denominator = timesig_denominator
+		self.master_pitch = master_pitch
+		self.tracks = tracks if tracks is not None else [] # every track in the project (including nested ones), in order
+
+	@property
+	def measure_length(self) -> int:
+		return QUARTER_NOTE_LENGTH * int(self.timesig_numerator)
+
+	@property
+	def last_measure(self) -> int:
+		"""The number of the last measure of the song (the last one with notes in it)"""
+		return max((track.end_measure for track in self.tracks), default=0)
+
+	@classmethod
+	def from_tree(cls, tree: ET.ElementTree) -> "ParsedProject":
+		"""Read in a project that has already been parsed with read_mmp()"""
+		head = tree.getroot().find('head')
+		project = cls(
+			str(head.attrib['timesig_numerator']),
+			str(head.attrib['timesig_denominator']),
+			int(head.attrib['masterpitch']),
+		)
+
+		measure_length = project.measure_length
+		project.tracks = [ParsedTrack.from_element(track, measure_length) for track in tree.iter(tag = 'track')]
+		return project
+
+	@classmethod
+	def from_file(cls, mmp_file, tracks=None, measures=None) -> "ParsedProject":
+		"""Read in a project from a file object with the project's (uncompressed) xml
+		
+		 Only the notes of the given tracks and measures get read in, if there are any (see read_mmp())
+		"""
+		return cls.from_tree(read_mmp(mmp_file, tracks, measures))
+
+	@classmethod
+	def load(cls, filepath: str, tracks=None, measures=None) -> "ParsedProject":
+		"""Read in an .mmp or .mmpz file (see from_file())"""
+		with open_mmp(filepath) as mmp_file:
+			return cls.from_file(mmp_file, tracks, measures)
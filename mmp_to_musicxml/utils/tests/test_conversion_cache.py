@@ -0,0 +1,35 @@
+import pytest
+import os
+
+from ..conversion_cache import ConversionCache
+
+def test_key_depends_on_content_and_options():
+	key = ConversionCache.make_key(ConversionCache.hash_bytes(b'<mmp/>'), {'key_signature': 'd'})
+	assert key == ConversionCache.make_key(ConversionCache.hash_bytes(b'<mmp/>'), {'key_signature': 'd'})
+	assert key != ConversionCache.make_key(ConversionCache.hash_bytes(b'<mmp />'), {'key_signature': 'd'})
+	assert key != ConversionCache.make_key(ConversionCache.hash_bytes(b'<mmp/>'), {'key_signature': 'a'})
+
+def test_get_and_put(tmp_path):
+	cache = ConversionCache(str(tmp_path))
+	assert cache.get('abc') is None
+	
+	cache.put('abc', b'some musicxml')
+	with open(cache.get('abc'), 'rb') as f:
+		assert f.read() == b'some musicxml'
+	
+	assert cache.stats() == {'hits': 1, 'misses': 1}
+
+def test_lru_eviction(tmp_path):
+	cache = ConversionCache(str(tmp_path), max_size=25)
+	cache.put('a', b'0123456789')
+	cache.put('b', b'0123456789')
+	
+	# make 'a' the oldest, then use it so 'b' becomes the least recently used
+	os.utime(os.path.join(str(tmp_path), 'a'), (1, 1))
+	os.utime(os.path.join(str(tmp_path), 'b'), (2, 2))
+	assert cache.get('a') is not None
+	
+	cache.put('c', b'0123456789')
+	assert cache.get('b') is None
+	assert cache.get('a') is not None
+	assert cache.get('c') is not None
@@ -0,0 +1,29 @@
+import pytest
+
+from ..diagnostics import ConversionDiagnostics
+
+def test_locations_are_limited():
+	diagnostics = ConversionDiagnostics(max_locations=2)
+	assert not diagnostics
+	
+	for measure_num in range(1, 6):
+		diagnostics.add_truncated('flute', measure_num)
+	diagnostics.add_out_of_range('tuba', 'C7', 3)
+	
+	assert diagnostics
+	assert diagnostics.truncated == {'flute': {'count': 5, 'locations': ['measure 1', 'measure 2']}}
+	assert diagnostics.summary() == "tuba: 1 notes out of range (C7 in measure 3)\nflute: 5 notes truncated (measure 1, measure 2, ...)"
+
+def test_merge():
+	track_diagnostics = ConversionDiagnostics()
+	for measure_num in range(1, 20):
+		track_diagnostics.add_truncated('flute', measure_num)
+	
+	diagnostics = ConversionDiagnostics()
+	diagnostics.add_truncated('flute', 30)
+	diagnostics.merge(track_diagnostics)
+	diagnostics.merge(ConversionDiagnostics.from_dict(track_diagnostics.to_dict()))
+	
+	assert diagnostics.truncated['flute']['count'] == 39
+	assert len(diagnostics.truncated['flute']['locations']) == ConversionDiagnostics.MAX_LOCATIONS
+	assert diagnostics.truncated['flute']['locations'][0] == 'measure 30'
@@ -9,12 +9,12 @@ def test_creation():
 def test_note_list_creation():
 	key_sig_note_finder = KeySignatureNoteFinder(key_signature='d')
 	note_list = key_sig_note_finder.get_note_list()
-	assert len(note_list) == 86
+	assert len(note_list) == 128
 	
 def test_note_list():
 	key_sig_note_finder = KeySignatureNoteFinder(key_signature='a')
 	note_list = key_sig_note_finder.get_note_list()
-	assert len(note_list) == 86
+	assert len(note_list) == 128
 	
 	# check A4 - A5
 	a4 = note_list[57]
@@ -40,4 +40,23 @@ def test_note_list():
 	assert c4['octave'] == 4
 	assert c4['diatonic'] is False
 	assert c4['degree'] == -1
-	assert c4['note'] == 'C'
\ No newline at end of file
+	assert c4['note'] == 'C'
+
+def test_spelling_table():
+	table = KeySignatureNoteFinder(key_signature='cs').SPELLING_TABLE
+	assert len(table) == 128
+	
+	# every key signature shares the same table
+	assert KeySignatureNoteFinder(key_signature='cs').SPELLING_TABLE is table
+	
+	assert table[60] == ('B', '1', '4') # B#4 is the same key as C5
+	assert table[61] == ('C', '1', '5')
+	assert table[67] == ('F', '2', '5')
+	assert table[127] == ('F', '2', '10') # the 86-key ceiling is gone
+	
+	assert KeySignatureNoteFinder.get_spelling_table('gb')[59] == ('C', '-1', '5') # Cb5 is the same key as B4
+	assert KeySignatureNoteFinder.get_spelling_table('c')[58] == ('A', '1', '4')
+	assert KeySignatureNoteFinder.get_spelling_table('f')[58] == ('B', '-1', '4')
+	
+	# keys outside of the table still work
+	assert KeySignatureNoteFinder.spell_key('bb', 130) == ('B', '-1', '10')
@@ -0,0 +1,91 @@
+import pytest
+import io
+import os
+import zlib
+import xml.etree.ElementTree as ET
+
+from ..mmp_reader import open_mmp, read_mmp, KEEP_TAGS
+
+# has a beat/bassline track, which holds more tracks inside of it
+TESTFILE = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'testfiles', 'edgecase.mmp')
+
+def test_only_needed_elements_kept():
+	root = read_mmp(TESTFILE).getroot()
+	for el in root.iter():
+		if el is root or el.tag in KEEP_TAGS:
+			continue
+		# containers are only kept if there's something we need inside
+		assert any(child.tag in KEEP_TAGS for child in el.iter())
+
+	for instrumenttrack in root.iter('instrumenttrack'):
+		assert len(instrumenttrack) == 0
+
+def test_same_notes_as_full_parse():
+	full_root = ET.parse(TESTFILE).getroot()
+	root = read_mmp(TESTFILE).getroot()
+
+	assert root.find('head').attrib == full_root.find('head').attrib
+
+	tracks = list(root.iter('track'))
+	full_tracks = list(full_root.iter('track'))
+	assert [t.attrib for t in tracks] == [t.attrib for t in full_tracks]
+
+	for track, full_track in zip(tracks, full_tracks):
+		patterns = list(track.iter('pattern'))
+		full_patterns = list(full_track.iter('pattern'))
+		assert [p.attrib for p in patterns] == [p.attrib for p in full_patterns]
+		assert [n.attrib for n in track.iter('note')] == [n.attrib for n in full_track.iter('note')]
+
+def test_mmpz(tmp_path):
+	with open(TESTFILE, 'rb') as f:
+		data = f.read()
+
+	# same layout as qCompress: uncompressed size followed by a zlib stream
+	mmpz_file = tmp_path / 'edgecase.mmpz'
+	mmpz_file.write_bytes(len(data).to_bytes(4, 'big') + zlib.compress(data))
+
+	with open_mmp(str(mmpz_file)) as f:
+		# read in small pieces to make sure decompressed data gets split up correctly
+		f.CHUNK_SIZE = 100
+		assert f.read() == data
+
+	with open_mmp(str(mmpz_file)) as f:
+		root = read_mmp(f).getroot()
+
+	full_root = read_mmp(TESTFILE).getroot()
+	assert [n.attrib for n in root.iter('note')] == [n.attrib for n in full_root.iter('note')]
+
+def test_skip_tracks():
+	full_root = read_mmp(TESTFILE).getroot()
+	root = read_mmp(TESTFILE, tracks={'Default preset'}).getroot()
+	
+	# every track and pattern is still there, but only the chosen tracks have notes
+	assert [t.attrib for t in root.iter('track')] == [t.attrib for t in full_root.iter('track')]
+	assert [p.attrib for p in root.iter('pattern')] == [p.attrib for p in full_root.iter('pattern')]
+	for track in root.iter('track'):
+		if track.get('name') != 'Default preset':
+			assert track.find('pattern/note') is None
+	
+	# tracks inside a chosen beat/bassline track keep their notes too
+	root = read_mmp(TESTFILE, tracks={'piano', 'Beat/Bassline 0'}).getroot()
+	assert [n.attrib for n in root.iter('note')] == [n.attrib for n in full_root.iter('note')]
+
+def test_skip_measures():
+	project = b'''<?xml version="1.0"?>
+<lmms-project><head timesig_numerator="3" timesig_denominator="4" masterpitch="0"/><song><trackcontainer>
+<track name="piano" muted="0" type="0"><instrumenttrack pan="0" vol="100" pitch="0"/>
+<pattern pos="0" len="144"><note key="60" vol="100" pos="0" len="48"/></pattern>
+<pattern pos="144" len="288"><note key="62" vol="100" pos="0" len="48"/><note key="64" vol="100" pos="144" len="48"/></pattern>
+<pattern pos="432" len="144"><note key="65" vol="100" pos="0" len="48"/></pattern>
+</track>
+</trackcontainer></song></lmms-project>'''
+	
+	# measures are 144 long, so only the second pattern has anything in measure 3
+	root = read_mmp(io.BytesIO(project), measures=(3, 3)).getroot()
+	assert [len(p) for p in root.iter('pattern')] == [0, 2, 0]
+	
+	# the skipped patterns still say where their last note was
+	assert [p.get('lastnote') for p in root.iter('pattern')] == ['0', None, '0']
+	
+	root = read_mmp(io.BytesIO(project), measures=(1, 4)).getroot()
+	assert [len(p) for p in root.iter('pattern')] == [1, 2, 1]
@@ -0,0 +1,19 @@
+import pytest
+import xml.etree.ElementTree as ET
+
+from ..note import Note
+
+def test_from_element():
+	el = ET.fromstring('<note pan="-38" key="53" vol="59" pos="24" len="192"/>')
+	note = Note.from_element(el, pattern_pos=384, measure=3)
+	
+	assert note.pos == 384 + 24
+	assert note.len == 192
+	assert note.key == 53
+	assert note.vol == 59
+	assert note.measure == 3
+
+def test_slots():
+	note = Note(pos=0, len=48, key=60)
+	with pytest.raises(AttributeError):
+		note.pan = 0
@@ -34,4 +34,24 @@ def test_evaluate_note(notechecker):
     assert notechecker.evaluate_note("oboe", "A", 5) is True
     assert notechecker.evaluate_note("oboe", "B", 2) is True
     assert notechecker.evaluate_note("oboe", "A", 2) is False
-    assert notechecker.evaluate_note("oboe", "G", 2) is False
\ No newline at end of file
+    assert notechecker.evaluate_note("oboe", "G", 2) is False
+
+def test_key_ranges(notechecker):
+    # C4 is key 48, like in the converter
+    assert notechecker.note_to_key("C4") == 48
+    assert notechecker.key_ranges["clarinet"] == (notechecker.note_to_key("E3"), notechecker.note_to_key("C7"))
+    
+    assert notechecker.evaluate_key("clarinet", 40) is True
+    assert notechecker.evaluate_key("clarinet", 39) is False
+    assert notechecker.evaluate_key("not an instrument", 0) is True
+
+def test_find_out_of_range(notechecker):
+    keys = [39, 40, 84, 85, 60]
+    measures = [1, 1, 2, 3, 3]
+    assert notechecker.find_out_of_range("clarinet", keys, measures) == [(39, 1), (85, 3)]
+    assert notechecker.find_out_of_range("not an instrument", keys, measures) == []
+    
+    # just inside and outside of oboe's range (A#2 to G6)
+    keys = [33, 34, 79, 80]
+    assert notechecker.find_out_of_range("oboe", keys, [1, 2, 3, 4]) == [(33, 1), (80, 4)]
+    assert [notechecker.evaluate_key("oboe", key) for key in keys] == [False, True, True, False]
@@ -0,0 +1,56 @@
+import pytest
+import io
+
+from ..project import ParsedProject, parse_measure_range
+
+PROJECT = b'''<?xml version="1.0"?>
+<lmms-project><head timesig_numerator="3" timesig_denominator="4" masterpitch="2"/><song><trackcontainer>
+<track name="piano" muted="0" type="0"><instrumenttrack pan="10" vol="100" pitch="0"/>
+<pattern pos="144"><note pan="0" key="60" vol="100" pos="48" len="48"/><note pan="0" key="62" vol="100" pos="0" len="48"/></pattern>
+<pattern pos="0"><note pan="0" key="64" vol="100" pos="0" len="48"/></pattern>
+</track>
+<track name="flute" muted="1" type="0"><instrumenttrack pan="0" vol="100" pitch="0"/></track>
+</trackcontainer></song></lmms-project>'''
+
+def test_from_file():
+	project = ParsedProject.from_file(io.BytesIO(PROJECT))
+	assert (project.timesig_numerator, project.timesig_denominator, project.master_pitch) == ("3", "4", 2)
+	assert project.measure_length == 144
+	
+	piano, flute = project.tracks
+	assert (piano.name, piano.muted, piano.has_patterns, piano.instrument['pan']) == ("piano", False, True, "10")
+	assert (flute.name, flute.muted, flute.has_patterns, flute.notes) == ("flute", True, False, [])
+	
+	# notes are sorted by their position in the song, not the pattern
+	assert [(n.pos, n.key, n.measure) for n in piano.notes] == [(0, 64, 1), (144, 62, 2), (192, 60, 2)]
+
+def test_measure_index():
+	project = ParsedProject.from_file(io.BytesIO(PROJECT))
+	piano, flute = project.tracks
+	
+	assert piano.measure_numbers == [1, 2]
+	assert [n.key for n in piano.measures[2]] == [62, 60]
+	assert [n.key for n in piano.notes_in_measures(2, 10)] == [62, 60]
+	assert [n.key for n in piano.notes_in_measures(1, 1)] == [64]
+	assert piano.notes_in_measures(3, 4) == []
+	
+	assert (piano.last_measure, flute.last_measure, project.last_measure) == (2, 0, 2)
+
+def test_parse_measure_range():
+	assert parse_measure_range("9-16") == (9, 16)
+	assert parse_measure_range("4") == (4, 4)
+	
+	for measures in ["0-4", "5-2", "a-b", "1-2-3"]:
+		with pytest.raises(ValueError):
+			parse_measure_range(measures)
+
+def test_from_file_filtered():
+	project = ParsedProject.from_file(io.BytesIO(PROJECT), tracks={'flute'}, measures=(1, 1))
+	piano, flute = project.tracks
+	assert (piano.notes, piano.has_patterns) == ([], True)
+	
+	# the pattern starting in measure 2 gets skipped, but the track still knows where its last note is
+	project = ParsedProject.from_file(io.BytesIO(PROJECT), measures=(1, 1))
+	piano, flute = project.tracks
+	assert [n.key for n in piano.notes] == [64]
+	assert (piano.last_measure, piano.end_measure, project.last_measure) == (1, 2, 2)
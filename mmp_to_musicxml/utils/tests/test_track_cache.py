@@ -0,0 +1,47 @@
+import pytest
+import xml.etree.ElementTree as ET
+
+from ..diagnostics import ConversionDiagnostics
+from ..project import ParsedTrack
+from ..track_cache import TrackCache
+
+TRACK = '<track name="piano" muted="0"><pattern pos="0"><note pan="0" key="53" vol="59" pos="0" len="48"/></pattern></track>'
+
+def make_key(track, settings):
+	return TrackCache.make_key(ParsedTrack.from_element(ET.fromstring(track), 192), settings)
+
+def test_key_only_depends_on_what_gets_converted():
+	key = make_key(TRACK, {'master': 0})
+	
+	# panning and volume don't change the part
+	assert key == make_key(TRACK.replace('vol="59"', 'vol="100"').replace('pan="0"', 'pan="10"'), {'master': 0})
+	
+	assert key != make_key(TRACK.replace('key="53"', 'key="54"'), {'master': 0})
+	assert key != make_key(TRACK.replace('pattern pos="0"', 'pattern pos="192"'), {'master': 0})
+	assert key != make_key(TRACK.replace('piano', 'bass'), {'master': 0})
+	assert key != make_key(TRACK, {'master': 1})
+
+@pytest.mark.parametrize('on_disk', [False, True])
+def test_get_and_put(tmp_path, on_disk):
+	cache = TrackCache(str(tmp_path) if on_disk else None)
+	part = ET.fromstring('<part><measure number="1"><note><rest/></note></measure></part>')
+	assert cache.get('abc') is None
+	
+	diagnostics = ConversionDiagnostics()
+	diagnostics.add_truncated('piano', 1)
+	cache.put('abc', part, 1, diagnostics)
+	cache.put('empty', None, 0, ConversionDiagnostics())
+	if on_disk:
+		# a new cache only has what was saved to disk
+		cache = TrackCache(str(tmp_path))
+	
+	cached_part, last_measure_num, cached_diagnostics = cache.get('abc')
+	assert last_measure_num == 1
+	assert cached_diagnostics.to_dict() == diagnostics.to_dict()
+	assert ET.tostring(cached_part) == ET.tostring(part)
+	
+	# changing the part that was returned doesn't change the cached one
+	cached_part.set('id', 'P1')
+	assert 'id' not in cache.get('abc')[0].attrib
+	
+	assert cache.get('empty')[:2] == (None, 0)
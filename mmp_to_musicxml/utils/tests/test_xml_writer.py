@@ -0,0 +1,61 @@
+import pytest
+import io
+import xml.etree.ElementTree as ET
+from xml.dom import minidom
+
+from ..xml_writer import pretty_xml_children, write_pretty_xml
+
+def toprettyxml(element):
+	data = minidom.parseString(ET.tostring(element, encoding="unicode")).toprettyxml(indent="    ")
+	return data.replace("<?xml version=\"1.0\" ?>\n", "")
+
+def test_same_as_minidom():
+	root = ET.Element('score-partwise')
+	title = ET.SubElement(root, 'movement-title')
+	title.text = 'a "title" with <special> & characters'
+	part = ET.SubElement(root, 'part')
+	part.set('id', 'P1 & "P2"')
+	measure = ET.SubElement(part, 'measure')
+	measure.set('number', '1')
+	note = ET.SubElement(measure, 'note')
+	ET.SubElement(note, 'chord')
+	ET.SubElement(note, 'rest').set('measure', 'yes')
+	ET.SubElement(note, 'duration').text = '32'
+	ET.SubElement(note, 'empty').text = ''
+	
+	# text mixed in with child elements
+	mixed = ET.SubElement(root, 'mixed')
+	mixed.text = 'before'
+	ET.SubElement(mixed, 'child').tail = 'after'
+	
+	output = io.StringIO()
+	write_pretty_xml(root, output)
+	
+	assert output.getvalue() == toprettyxml(root)
+
+def test_prerendered():
+	root = ET.Element('score-partwise')
+	part = ET.SubElement(root, 'part')
+	part.set('id', 'P1')
+	for number in ['1', '2']:
+		measure = ET.SubElement(part, 'measure')
+		measure.set('number', number)
+		ET.SubElement(measure, 'note').text = 'C'
+	
+	expected = io.StringIO()
+	write_pretty_xml(root, expected)
+	
+	# the first measure gets written out separately, and the second one is still in the tree
+	written_part = ET.Element('part')
+	written_part.append(part[0])
+	text = pretty_xml_children(written_part, 1)
+	
+	shell = ET.Element('part')
+	shell.set('id', 'P1')
+	shell.append(part[1])
+	shell_root = ET.Element('score-partwise')
+	shell_root.append(shell)
+	
+	output = io.StringIO()
+	write_pretty_xml(shell_root, output, prerendered={shell: text})
+	assert output.getvalue() == expected.getvalue()
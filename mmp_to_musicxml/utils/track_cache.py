@@ -0,0 +1,116 @@
+"""
+for keeping the parts created for each track so that only the tracks that changed get converted again
+
+"""
+import copy
+import hashlib
+import json
+import xml.etree.ElementTree as ET
+
+from collections import OrderedDict
+
+from .conversion_cache import ConversionCache
+from .diagnostics import ConversionDiagnostics
+from .project import ParsedTrack
+
+class TrackCache:
+	"""Remembers the part created for each track, keyed by a fingerprint of the track's notes and the settings used
+
+	 Parts are kept in memory (for when the same converter is used over and over) and, if a directory
+	 is given, also saved to disk so that later runs can use them. Parts are copied on the way in and out
+	 since the converter keeps changing a part after it's been created (i.e. its id and rest padding).
+	"""
+
+	# max number of parts to keep in memory, least recently used ones get dropped first
+	MEMORY_SIZE = 256
+
+	def __init__(self, directory=None, max_size=1024 * 1024 * 1024):
+		self.parts = OrderedDict()
+		self.disk = ConversionCache(directory, max_size=max_size) if directory else None
+		self.hits = 0
+		self.misses = 0
+
+	def __getstate__(self):
+		# a copy sent to another process (i.e. for converting tracks in parallel) never gets used,
+		# so there's no point in sending all the parts along with it
+		return {}
+
+	def __setstate__(self, state):
+		self.__init__()
+
+	@staticmethod
+	def make_key(track: ParsedTrack, settings: dict) -> str:
+		"""Fingerprint a track's notes along with the settings that affect its part
+
+		 Only what the converter actually uses from the track goes into the fingerprint,
+		 so i.e. changing a note's panning or volume doesn't count as a change.
+
+		 Arguments:
+			- track (ParsedTrack): a track from the project
+			- settings (dict): everything else that changes the part, i.e. key signature and master pitch
+			  (must be json serializable)
+
+		 Returns the key as a hex string
+		"""
+		fingerprint = hashlib.sha256()
+		fingerprint.update(json.dumps({"name": track.name, "end_measure": track.end_measure, "settings": settings}, sort_keys=True).encode("utf-8"))
+		fingerprint.update(",".join([f"{n.pos} {n.len} {n.key} {n.measure}" for n in track.notes]).encode("utf-8"))
+		return fingerprint.hexdigest()
+
+	def get(self, key: str):
+		"""Look up the part for a track
+
+		 Returns a tuple of a copy of the part (or None if the track had no notes), the number of
+		 its last measure and its diagnostics, like convert_track() does, or None if the track isn't cached
+		"""
+		if key in self.parts:
+			self.parts.move_to_end(key)
+			part, last_measure_num, diagnostics = self.parts[key]
+			self.hits += 1
+			return copy.deepcopy(part), last_measure_num, diagnostics
+
+		path = self.disk.get(key) if self.disk else None
+		if path is None:
+			self.misses += 1
+			return None
+
+		try:
+			with open(path, "rb") as f:
+				last_measure_num, diagnostics_json, part_xml = f.read().split(b"\n", 2)
+		except FileNotFoundError:
+			# removed by someone else in the meantime
+			self.misses += 1
+			return None
+
+		part = ET.fromstring(part_xml) if part_xml else None
+		diagnostics = ConversionDiagnostics.from_dict(json.loads(diagnostics_json))
+		self._remember(key, part, int(last_measure_num), diagnostics)
+
+		self.hits += 1
+		return copy.deepcopy(part), int(last_measure_num), diagnostics
+
+	def put(self, key: str, part: ET.Element, last_measure_num: int, diagnostics: ConversionDiagnostics):
+		"""Save the part created for a track
+
+		 Arguments:
+			- key (str): the track's key from make_key()
+			- part (ElementTree element node): the part from convert_track(), or None if the track had no notes
+			- last_measure_num (int): the number of the part's last measure
+			- diagnostics (ConversionDiagnostics): the problems found while converting the track
+		"""
+		part = copy.deepcopy(part)
+		self._remember(key, part, last_measure_num, diagnostics)
+
+		if self.disk:
+			part_xml = ET.tostring(part, encoding="utf-8") if part is not None else b""
+			diagnostics_json = json.dumps(diagnostics.to_dict()).encode("utf-8")
+			self.disk.put(key, str(last_measure_num).encode("utf-8") + b"\n" + diagnostics_json + b"\n" + part_xml)
+
+	def _remember(self, key: str, part: ET.Element, last_measure_num: int, diagnostics: ConversionDiagnostics):
+		self.parts[key] = (part, last_measure_num, diagnostics)
+		self.parts.move_to_end(key)
+		if len(self.parts) > self.MEMORY_SIZE:
+			self.parts.popitem(last=False)
+
+	def stats(self) -> dict:
+		return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,83 @@
+"""
+for writing out an indented xml document directly from an ElementTree element
+
+"""
+import io
+import xml.etree.ElementTree as ET
+
+def escape(data: str) -> str:
+	# the same characters minidom escapes, for both text and attribute values
+	return data.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+def write_pretty_xml(element: ET.Element, file, indent="    ", newl="\n", prerendered=None):
+	"""Write an element and all of its children to a file, one element per line
+
+	 The output is the same as running the element through minidom's toprettyxml()
+	 (minus the xml declaration), but without serializing and parsing the whole document first.
+	 An element that only holds text is written on a single line, i.e. <step>C</step>,
+	 and an element with no children or text is self-closing, i.e. <chord/>.
+
+	 Arguments:
+		- element (ElementTree element node): the root of the tree to write
+		- file (file object): a text file (or anything with a write method) to write to
+		- indent (str): indentation added for each level of the tree
+		- newl (str): what to put at the end of each line
+		- prerendered (dict): elements whose first children have already been written out (see pretty_xml_children()),
+		  mapped to that text. the text is written in front of any children the element has
+	"""
+	_write_element(element, file.write, "", indent, newl, prerendered)
+
+def pretty_xml_children(element: ET.Element, depth: int, indent="    ", newl="\n") -> str:
+	"""Write out the children of an element the way write_pretty_xml() would, for an element at a given depth in the tree
+
+	 Arguments:
+		- element (ElementTree element node): the element whose children should be written
+		- depth (int): how deep the element is in the tree (0 for the root)
+		- indent (str): indentation added for each level of the tree
+		- newl (str): what to put at the end of each line
+
+	 Returns the text
+	"""
+	text = io.StringIO()
+	child_indent = indent * (depth + 1)
+	for child in element:
+		_write_element(child, text.write, child_indent, indent, newl)
+		if child.tail:
+			text.write(escape(child_indent + child.tail + newl))
+	return text.getvalue()
+
+def _write_element(element: ET.Element, write, curr_indent: str, indent: str, newl: str, prerendered=None):
+	start_tag = [curr_indent, "<", element.tag]
+	for name, value in element.attrib.items():
+		start_tag.append(f" {name}=\"{escape(value)}\"")
+	write("".join(start_tag))
+
+	text = element.text
+
+	if prerendered and element in prerendered:
+		write(">" + newl)
+		write(prerendered[element])
+		for child in element:
+			_write_element(child, write, curr_indent + indent, indent, newl, prerendered)
+		write(f"{curr_indent}</{element.tag}>{newl}")
+		return
+
+	if len(element) == 0:
+		if text:
+			write(f">{escape(text)}</{element.tag}>{newl}")
+		else:
+			write(f"/>{newl}")
+		return
+
+	write(">" + newl)
+
+	child_indent = curr_indent + indent
+	if text:
+		write(escape(child_indent + text + newl))
+
+	for child in element:
+		_write_element(child, write, child_indent, indent, newl, prerendered)
+		if child.tail:
+			write(escape(child_indent + child.tail + newl))
+
+	write(f"{curr_indent}</{element.tag}>{newl}")
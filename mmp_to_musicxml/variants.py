@@ -0,0 +1,210 @@
+import argparse
+import os
+import time
+import traceback
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+from mmp_to_musicxml.batch import BatchResult, output_path, safe_file_name, find_output_collisions, collision_result
+from mmp_to_musicxml.converter import MMP_MusicXML_Converter, split_key
+from mmp_to_musicxml.utils.project import ParsedProject
+
+"""
+..module:: for converting a project into several versions at once (i.e. in different keys), reading it in only once
+"""
+
+# one version of a project to write out. anything left as None uses the project's (or the command line's) setting.
+# key can also be a minor key (i.e. "fsm"), master is the master pitch, instruments are separated by + (i.e. "violin+cello")
+# and output is the path of the new file (ending in .mxl for compressed MusicXML, which the 'mxl' param also turns on)
+OutputSpec = namedtuple("OutputSpec", ["output", "key", "master", "instruments", "title"], defaults=[None, None, None, None, None])
+
+# the fields that can be given in a spec string, see parse_spec()
+SPEC_FIELDS = ("output", "key", "master", "instruments", "title")
+
+def parse_spec(spec: str) -> OutputSpec:
+	"""Turn a string like "key=d,master=2,output=song-d.xml" into an OutputSpec
+
+	 Returns an OutputSpec, or raises ValueError if the string can't be understood
+	"""
+	fields = {}
+
+	for part in spec.split(","):
+		if not part.strip():
+			continue
+		if "=" not in part:
+			raise ValueError(f"expected name=value in {spec!r}, got {part!r}")
+
+		name, value = part.split("=", 1)
+		name = name.strip()
+		if name not in SPEC_FIELDS:
+			raise ValueError(f"unknown field {name!r} in {spec!r} (can be one of: {', '.join(SPEC_FIELDS)})")
+		fields[name] = value.strip()
+
+	return OutputSpec(**fields)
+
+def format_spec(spec: OutputSpec) -> str:
+	"""Turn an OutputSpec back into a string like "key=d,master=2,output=song-d.xml" (the opposite of parse_spec())"""
+	return ",".join(f"{name}={value}" for name, value in spec._asdict().items() if value is not None)
+
+def default_output(filepath: str, spec: OutputSpec, mxl=False) -> str:
+	"""Make up an output path for a spec that doesn't have one, i.e. song-d-master2.xml
+
+	 The file goes in the current directory, like with MMP_MusicXML_Converter.convert_file(),
+	 and ends in .mxl instead if mxl is True (i.e. the 'mxl' param is on)
+	"""
+	suffix = ""
+
+	if spec.key:
+		suffix += f"-{spec.key}"
+	if spec.master:
+		suffix += f"-master{spec.master}"
+	if spec.instruments:
+		suffix += "-" + spec.instruments.replace("+", "-")
+	if spec.title and safe_file_name(spec.title):
+		suffix += "-" + safe_file_name(spec.title)
+
+	return output_path(filepath, {"mxl": mxl}, suffix)
+
+def make_converter(spec: OutputSpec, params=None) -> MMP_MusicXML_Converter:
+	"""Create a converter for a spec
+
+	 Arguments:
+		- spec (OutputSpec): the version to convert to
+		- params (dict): params for MMP_MusicXML_Converter shared by every spec. if there's an 'opts'
+		  (i.e. from the command line), its key, master pitch, instruments and title are the defaults
+
+	 Returns an MMP_MusicXML_Converter
+	"""
+	params = dict(params or {})
+	base_opts = params.get("opts")
+
+	opts = argparse.Namespace(**vars(base_opts)) if base_opts else argparse.Namespace(check=False, key=None, master=None, title=None, instruments=None)
+	for name in ("key", "master", "instruments", "title"):
+		if getattr(spec, name) is not None:
+			setattr(opts, name, getattr(spec, name))
+
+	key, minor = split_key(opts.key)
+	if minor or spec.key is not None:
+		params["minor"] = minor
+
+	params["opts"] = opts
+	# an output ending in .mxl turns on compressed output, but it stays on for every variant if the params ask for it
+	params["mxl"] = bool(params.get("mxl")) or spec.output.lower().endswith(".mxl")
+
+	return MMP_MusicXML_Converter(key_signature=key, params=params)
+
+def render_variant(project: ParsedProject, filepath: str, spec: OutputSpec, params=None) -> BatchResult:
+	"""Write out one version of a project that has already been read in, catching any errors
+
+	 Arguments:
+		- project (ParsedProject): the project
+		- filepath (str): the project's file, for the result
+		- spec (OutputSpec): the version to write (it needs an output path)
+		- params (dict): see make_converter()
+
+	 Returns a BatchResult
+	"""
+	start = time.perf_counter()
+
+	converter = None
+
+	try:
+		converter = make_converter(spec, params)
+		with open(spec.output, "wb") as output:
+			converter.convert_project(project, output)
+		if converter.PROFILER.enabled:
+			# the report goes next to the variant's file, i.e. song-d.profile.json
+			converter.PROFILER.write(os.path.splitext(spec.output)[0] + ".profile.json")
+		return BatchResult(filepath, os.path.realpath(spec.output), None, time.perf_counter() - start)
+	except Exception:
+		return BatchResult(filepath, None, traceback.format_exc(), time.perf_counter() - start)
+	finally:
+		if converter is not None:
+			converter.close()
+
+# the project being converted by a worker process, so it only gets sent to each worker once
+_PROJECT = None
+
+def _set_project(project: ParsedProject):
+	global _PROJECT
+	_PROJECT = project
+
+def _render_variant_in_worker(filepath: str, spec: OutputSpec, params=None) -> BatchResult:
+	return render_variant(_PROJECT, filepath, spec, params)
+
+def convert_variants(filepath: str, specs: List[OutputSpec], params=None, jobs=1) -> List[BatchResult]:
+	"""Convert a project into several versions, reading in (and sorting the notes of) the project only once
+
+	 Arguments:
+		- filepath (str): the .mmp/.mmpz file
+		- specs (list): the OutputSpecs to write (specs without an output get one from default_output())
+		- params (dict): see make_converter()
+		- jobs (int): number of worker processes to render the versions with (1 renders them one after another)
+
+	 Returns a list of BatchResults in the same order as specs
+	"""
+	return convert_many_variants([filepath], specs, params, jobs)
+
+def convert_many_variants(filepaths: List[str], specs: List[OutputSpec], params=None, jobs=1) -> List[BatchResult]:
+	"""Convert several projects into the same versions, reading in each project only once
+
+	 Every output path gets worked out first, and versions that would be written to the same file
+	 as another one (i.e. output=x.xml for two projects) aren't written and fail instead.
+
+	 Arguments:
+		- filepaths (list): the .mmp/.mmpz files
+		- specs (list): the OutputSpecs to write for every file (see convert_variants())
+		- params (dict): see make_converter()
+		- jobs (int): number of worker processes to render each project's versions with
+
+	 Returns a list of BatchResults, for every spec of the first file, then every spec of the second file and so on
+	"""
+	if not specs:
+		return []
+
+	mxl = bool((params or {}).get("mxl"))
+	entries = [
+		(filepath, spec if spec.output else spec._replace(output=default_output(filepath, spec, mxl)))
+		for filepath in filepaths
+		for spec in specs
+	]
+
+	def describe(filepath, spec):
+		# i.e. "b/song.mmp (key=d)", everything but the output (which is the same for all of them)
+		fields = format_spec(spec._replace(output=None))
+		return f"{filepath} ({fields})" if fields else filepath
+
+	results = [None] * len(entries)
+	for i, others in find_output_collisions([spec.output for _, spec in entries]).items():
+		filepath, spec = entries[i]
+		results[i] = collision_result(filepath, spec.output, [describe(*entries[j]) for j in others])
+
+	for first in range(0, len(entries), len(specs)):
+		to_write = [i for i in range(first, first + len(specs)) if results[i] is None]
+		if to_write:
+			file_results = _convert_variants(entries[first][0], [entries[i][1] for i in to_write], params, jobs)
+			for i, result in zip(to_write, file_results):
+				results[i] = result
+
+	return results
+
+def _convert_variants(filepath: str, specs: List[OutputSpec], params=None, jobs=1) -> List[BatchResult]:
+	# like convert_variants(), for specs that all have an output already
+	start = time.perf_counter()
+
+	try:
+		# the variants can each pick different instruments, but they all share the measure range (if there is one)
+		project = ParsedProject.load(filepath, measures=(params or {}).get("measures"))
+	except Exception:
+		# every version fails the same way
+		error = traceback.format_exc()
+		return [BatchResult(filepath, None, error, time.perf_counter() - start) for _ in specs]
+
+	if jobs and jobs > 1 and len(specs) > 1:
+		with ProcessPoolExecutor(max_workers=jobs, initializer=_set_project, initargs=(project,)) as executor:
+			futures = [executor.submit(_render_variant_in_worker, filepath, spec, params) for spec in specs]
+			return [future.result() for future in futures]
+
+	return [render_variant(project, filepath, spec, params) for spec in specs]
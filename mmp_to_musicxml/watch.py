@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List
+
+from mmp_to_musicxml.batch import BatchResult, expand_paths, convert_one, format_result, output_path, find_output_collisions, collision_result
+from mmp_to_musicxml.utils.conversion_cache import ConversionCache
+
+"""
+..module:: for converting .mmp files again whenever they change
+"""
+
+class ProjectWatcher:
+	"""Keeps track of which project files changed by polling their modification time and size
+
+	 Works the same everywhere since it only needs os.stat(). A file is only reported once it
+	 has stopped changing for a while (so a burst of saves gets converted once), and only if its
+	 contents are actually different from the last time it was reported.
+	"""
+
+	def __init__(self, paths: List[str], debounce=0.5, convert_existing=True):
+		"""
+		 Arguments:
+			- paths (list): file paths, directory paths or glob patterns to watch (see batch.expand_paths())
+			- debounce (float): number of seconds a file has to stay the same before it's reported
+			- convert_existing (bool): whether the files that are already there get reported by the first check()
+		"""
+		self.paths = paths
+		self.debounce = debounce
+
+		self.files = {} # file path -> (mtime, size) from the last check
+		self.hashes = {} # file path -> hash of the contents when it was last reported
+		self.pending = {} # file path -> time it was last seen changing
+		self.converting = set() # files that have been reported but aren't done converting yet
+
+		if not convert_existing:
+			self.files = self.scan()
+			for filepath in self.files:
+				self.hashes[filepath] = self.hash(filepath)
+
+	def scan(self) -> dict:
+		"""Get the modification time and size of every project file being watched
+
+		 Returns a dict of file path -> (mtime, size)
+		"""
+		files = {}
+
+		for filepath in expand_paths(self.paths):
+			try:
+				stat = os.stat(filepath)
+			except OSError:
+				# removed since it was found
+				continue
+			files[filepath] = (stat.st_mtime_ns, stat.st_size)
+
+		return files
+
+	def hash(self, filepath: str):
+		try:
+			return ConversionCache.hash_file(filepath)
+		except OSError:
+			return None
+
+	def check(self, now=None) -> List[str]:
+		"""Look for changes
+
+		 Arguments:
+			- now (float): the current time.monotonic(), mostly for testing
+
+		 Returns a list of files that should be converted
+		"""
+		if now is None:
+			now = time.monotonic()
+
+		files = self.scan()
+
+		for filepath, stat in files.items():
+			if self.files.get(filepath) != stat:
+				self.pending[filepath] = now
+
+		for filepath in set(self.files) - set(files):
+			# removed, so forget about it (it gets converted again if it comes back)
+			self.hashes.pop(filepath, None)
+			self.pending.pop(filepath, None)
+
+		self.files = files
+
+		ready = []
+		for filepath, changed_at in list(self.pending.items()):
+			# files still being converted wait until they're done so their output doesn't get written twice at once
+			if now - changed_at < self.debounce or filepath in self.converting:
+				continue
+
+			del self.pending[filepath]
+
+			content_hash = self.hash(filepath)
+			if content_hash is None or content_hash == self.hashes.get(filepath):
+				# gone already, or saved again without changing anything
+				continue
+
+			self.hashes[filepath] = content_hash
+			self.converting.add(filepath)
+			ready.append(filepath)
+
+		return ready
+
+	def finished(self, filepath: str):
+		"""Mark a file reported by check() as done converting"""
+		self.converting.discard(filepath)
+
+def watch(
+	paths: List[str],
+	key_signature=None,
+	params=None,
+	jobs=2,
+	interval=1.0,
+	debounce=0.5,
+	convert_existing=True,
+	on_result=None,
+	stop=None,
+):
+	"""Convert project files whenever they change, until stopped
+
+	 Conversions happen in a small pool of worker processes. A conversion that fails
+	 gets reported like any other result and doesn't stop the watching. Like with
+	 batch.convert_many(), a file whose output would overwrite another watched file's
+	 (i.e. a/song.mmp and b/song.mmp) isn't converted and gets reported as failed.
+
+	 Arguments:
+		- paths (list): file paths, directory paths or glob patterns to watch
+		- key_signature (str): the key signature used for every file
+		- params (dict): passed to MMP_MusicXML_Converter for every file
+		- jobs (int): number of worker processes
+		- interval (float): number of seconds between checks for changes
+		- debounce (float): number of seconds a file has to stay the same before it's converted
+		- convert_existing (bool): whether to convert the files that are already there when starting
+		- on_result (function): called with a BatchResult after each conversion (the default prints it)
+		- stop (threading.Event): stops watching when set (otherwise this runs until interrupted)
+	"""
+	if on_result is None:
+		on_result = lambda result: print(format_result(result), flush=True)
+	if stop is None:
+		stop = threading.Event()
+
+	watcher = ProjectWatcher(paths, debounce=debounce, convert_existing=convert_existing)
+	executor = ProcessPoolExecutor(max_workers=jobs)
+	running = {}
+
+	try:
+		while not stop.is_set():
+			ready = watcher.check()
+
+			collisions = {}
+			if ready:
+				watched = list(watcher.files)
+				outputs = [output_path(f, params) for f in watched]
+				for i, others in find_output_collisions(outputs).items():
+					collisions[watched[i]] = collision_result(watched[i], outputs[i], [watched[j] for j in others])
+
+			for filepath in ready:
+				if filepath in collisions:
+					watcher.finished(filepath)
+					on_result(collisions[filepath])
+					continue
+
+				try:
+					running[filepath] = executor.submit(convert_one, filepath, key_signature, params)
+				except BrokenProcessPool:
+					# a worker process died (which convert_one() can't catch), so start over with a new pool
+					executor = ProcessPoolExecutor(max_workers=jobs)
+					running[filepath] = executor.submit(convert_one, filepath, key_signature, params)
+
+			for filepath, future in list(running.items()):
+				if not future.done():
+					continue
+
+				del running[filepath]
+				watcher.finished(filepath)
+
+				try:
+					result = future.result()
+				except BrokenProcessPool as e:
+					result = BatchResult(filepath, None, f"{type(e).__name__}: {e}", 0)
+				on_result(result)
+
+			stop.wait(interval)
+	finally:
+		# don't wait for conversions that haven't started yet
+		executor.shutdown(wait=True, cancel_futures=True)